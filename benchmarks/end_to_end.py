@@ -0,0 +1,46 @@
+from typing import Dict, List
+
+from harness import Recorder
+from fake_mail_server import FakeMailServer, Link, generate_mailbox
+from email_client import SendJob
+
+# Queries for search(): sender names and subject words the generated mailbox contains.
+QUERIES = ["Kathryn", "invoice", "Sean", "budget", "Okafor", "meeting"]
+
+
+def run_mailbox(size: int, rtt_ms: float, repeat: int = 5, seed: int = 0) -> List[Dict]:
+    """
+    The paths users hit all day, `repeat` times each, on a fresh client against a
+    `size`-message mailbox with `rtt_ms` of added latency. Headers aren't cached on
+    disk, so every listing goes to the server like a first start would.
+    """
+    mailbox = generate_mailbox(size, seed=seed)
+    with FakeMailServer(mailbox, link=Link(rtt=rtt_ms / 1000.0, seed=seed)) as srv:
+        rec = Recorder(srv)
+        mail = srv.client()
+        try:
+            unread = rec.measure("list_unread (first, with login)", mail.list_unread, limit=10)
+            for _ in range(repeat):
+                unread = rec.measure("list_unread", mail.list_unread, limit=10)
+            # a different message each time, so the body cache never answers
+            idents = [s.uid for s in unread][:repeat]
+            for ident in idents:
+                rec.measure("fetch_message", mail.fetch_message, ident)
+            for ident in idents:
+                rec.measure("fetch_message (cached)", mail.fetch_message, ident)
+            for ident in idents:
+                rec.measure("mark_seen", mail.mark_seen, ident)
+            for i in range(repeat):
+                rec.measure("search", mail.search, QUERIES[i % len(QUERIES)])
+            for i in range(repeat):
+                rec.measure("send", mail.send, "bench@example.com", f"Benchmark {i}", "Hello from the benchmark.")
+            jobs = [SendJob(f"bench{n}@example.com", f"Bulk {n}", "Hello.") for n in range(10)]
+            rec.measure("send_bulk (10 messages)", mail.send_bulk, jobs)
+            if mail.search_index is not None:
+                while rec.measure("index_pending (1000 headers)", mail.index_pending):
+                    pass
+                for i in range(repeat):
+                    rec.measure("search (local index)", mail.search, QUERIES[i % len(QUERIES)])
+        finally:
+            mail.close()
+    return rec.rows(suite="end_to_end", size=size, rtt_ms=rtt_ms)
@@ -0,0 +1,69 @@
+import os, statistics, sys, time
+from typing import Callable, Dict, List, Optional
+
+# The app's modules are flat files in voice_email_GUI/, imported by name.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "voice_email_GUI"))
+
+from fake_mail_server import FakeMailServer  # noqa: E402
+
+
+class Recorder:
+    """
+    Measures operations against a FakeMailServer. Per call it records wall time, the
+    round trips and bytes the servers saw, and CPU split into client and server: the
+    servers run in this process and count their own CPU, the rest is the client's.
+    """
+
+    def __init__(self, server: Optional[FakeMailServer] = None):
+        self.server = server
+        self.calls: Dict[str, List[Dict[str, float]]] = {}
+
+    def _net(self) -> Dict[str, float]:
+        if self.server is None:
+            return {"round_trips": 0, "bytes": 0, "connections": 0, "server_cpu": 0.0}
+        s = self.server.stats()
+        both = {k: s["imap"][k] + s["smtp"][k] for k in s["imap"]}
+        return {"round_trips": both["round_trips"], "bytes": both["bytes_in"] + both["bytes_out"],
+                "connections": both["connections"], "server_cpu": both["cpu_seconds"]}
+
+    def measure(self, name: str, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) once, record it under `name` and return its result."""
+        before = self._net()
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        result = fn(*args, **kwargs)
+        wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+        if self.server is not None:
+            time.sleep(0.005)  # let the servers account for the last reply before reading their counters
+        after = self._net()
+        server_cpu = after["server_cpu"] - before["server_cpu"]
+        self.calls.setdefault(name, []).append({
+            "wall": wall, "client_cpu": max(cpu - server_cpu, 0.0), "server_cpu": server_cpu,
+            "round_trips": after["round_trips"] - before["round_trips"], "bytes": after["bytes"] - before["bytes"],
+            "connections": after["connections"] - before["connections"]})
+        return result
+
+    def rows(self, **labels) -> List[Dict]:
+        """One JSON row per operation: per-call means, and wall time spread, in ms."""
+        out = []
+        for name, calls in self.calls.items():
+            walls = [c["wall"] * 1000 for c in calls]
+            mean = lambda k: statistics.fmean(c[k] for c in calls)
+            out.append({**labels, "operation": name, "calls": len(calls),
+                        "round_trips": round(mean("round_trips"), 2), "bytes": round(mean("bytes")),
+                        "connections": round(mean("connections"), 2),
+                        "wall_ms": {"median": round(statistics.median(walls), 3), "min": round(min(walls), 3),
+                                    "max": round(max(walls), 3)},
+                        "client_cpu_ms": round(mean("client_cpu") * 1000, 3),
+                        "server_cpu_ms": round(mean("server_cpu") * 1000, 3)})
+        return out
+
+
+def best_of(fn: Callable, repeat: int = 5, number: int = 1) -> float:
+    """Fastest of `repeat` timings of `number` calls, in seconds per call (like timeit)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
@@ -0,0 +1,158 @@
+import asyncio, email
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.header import Header
+from typing import Dict, List
+
+from harness import Recorder, best_of
+from fake_mail_server import FakeMailServer, Link, generate_mailbox
+from email_client import HEADER_FIELDS, LIST_HEADERS, PRIMARY_FIELDS, SUMMARY_FIELDS
+from header_parse import _decode_cached, _decode_words, decode_value
+
+# Before/after numbers for the listing-path optimizations. The "before" variants
+# reproduce the code they replaced, so each row pair shows what the change bought.
+
+
+# ---------- batched header FETCH ----------
+def header_fetch(rtt_ms: float = 20, count: int = 80) -> List[Dict]:
+    """`count` listing headers: one RFC822.HEADER FETCH per message vs the batched UID FETCH."""
+    mailbox = generate_mailbox(2000)
+    uids = mailbox.uids[-count:]
+    with FakeMailServer(mailbox, link=Link(rtt=rtt_ms / 1000.0)) as srv:
+        mail = srv.client(max_connections=1)
+        try:
+            mail.list_unread(limit=1)  # log in and select outside the measurements
+            rec = Recorder(srv)
+
+            def one_by_one(conn):
+                return [email.message_from_bytes(conn.imap.uid('FETCH', str(u), '(RFC822.HEADER)')[1][0][1])
+                        for u in uids]
+
+            rec.measure("one FETCH per message", mail._with_imap, one_by_one)
+            rec.measure("batched UID FETCH", mail._with_imap, lambda conn: mail._fetch_headers_for(conn, uids))
+        finally:
+            mail.close()
+    return rec.rows(suite="micro", benchmark=f"header_fetch ({count} messages)", rtt_ms=rtt_ms)
+
+
+# ---------- threads vs asyncio ----------
+def concurrency(rtt_ms: float = 40, repeat: int = 3) -> List[Dict]:
+    """
+    What the GUI does after "check inbox": list, then read five messages, mark three
+    as read and send a reply, overlapped. The threaded client runs the follow-ups on
+    a 4-worker pool (like QThreadPool); the async one gathers them on one loop.
+    Each run starts from a fresh client, so logins are included.
+    """
+    rows = []
+    for variant in ("threads (EmailClient)", "asyncio (AsyncEmailClient)"):
+        with FakeMailServer(generate_mailbox(2000, seed=1), link=Link(rtt=rtt_ms / 1000.0)) as srv:
+            rec = Recorder(srv)
+            for _ in range(repeat):
+                if variant.startswith("threads"):
+                    mail = srv.client()
+
+                    def work():
+                        unread = mail.list_unread(limit=10)
+                        with ThreadPoolExecutor(4) as pool:
+                            jobs = [pool.submit(mail.fetch_message, s.uid) for s in unread[:5]]
+                            jobs += [pool.submit(mail.mark_seen, s.uid) for s in unread[5:8]]
+                            jobs.append(pool.submit(mail.send, "bench@example.com", "Re: hello", "Thanks."))
+                            wait(jobs)
+                        for j in jobs:
+                            j.result()
+
+                    rec.measure(variant, work)
+                    mail.close()
+                else:
+                    amail = srv.async_client()
+
+                    async def work():
+                        unread = await amail.list_unread(limit=10)
+                        await asyncio.gather(*[amail.fetch_message(s.uid) for s in unread[:5]],
+                                             *[amail.mark_seen(s.uid) for s in unread[5:8]],
+                                             amail.send("bench@example.com", "Re: hello", "Thanks."))
+                        await amail.close()
+
+                    rec.measure(variant, asyncio.run, work())
+            rows += rec.rows(suite="micro", benchmark="list, then read 5 + mark 3 + send", rtt_ms=rtt_ms)
+    return rows
+
+
+# ---------- header parsing and decoding (CPU only) ----------
+_NAMES = ["José Álvarez", "Zoë Müller", "Søren Kierkegaard", "Łukasz Nowak", "Renée Dubois", "田中 太郎"]
+_SUBJECTS = ["Café meeting — Thursday", "Rückmeldung zum Angebot", "Résumé attached", "Ihre Bestellung ist unterwegs",
+             "Prix spéciaux cette semaine pour vous et votre famille", "会議の議事録"]
+
+
+def header_corpus(count: int = 5000) -> List[bytes]:
+    """
+    Listing header blocks (what BODY.PEEK[HEADER.FIELDS ...] returns) from a generated
+    mailbox; every fourth has an RFC 2047 encoded, folded sender and subject, drawn
+    from a small set the way newsletters and threads repeat.
+    """
+    out = []
+    for n, msg in enumerate(generate_mailbox(count, seed=3).messages):
+        lines = [(k, v) for k, v in msg.header_lines() if k.lower() in {f.lower() for f in HEADER_FIELDS}]
+        if n % 4 == 0:
+            name, subject = _NAMES[n % len(_NAMES)], _SUBJECTS[(n // 4) % len(_SUBJECTS)]
+            addr = msg.sender.rsplit("<", 1)[-1]
+            enc = lambda s, name: Header(s, "utf-8", header_name=name).encode(linesep="\r\n")
+            lines = [(k, f"{enc(name, 'From')} <{addr}" if k == "From" else enc(subject, k) if k == "Subject" else v)
+                     for k, v in lines]
+        out.append("".join(f"{k}: {v}\r\n" for k, v in lines).encode() + b"\r\n")
+    return out
+
+
+def header_parse(corpus: List[bytes]) -> List[Dict]:
+    """Parse every block and read the listing's fields: email.message_from_bytes vs HeaderParser."""
+    fields = SUMMARY_FIELDS + PRIMARY_FIELDS
+
+    def before():
+        for raw in corpus:
+            m = email.message_from_bytes(raw)
+            for f in fields:
+                m.get(f)
+
+    def after():
+        for raw in corpus:
+            h = LIST_HEADERS.parse(raw)
+            for f in fields:
+                h.get(f)
+
+    return _cpu_rows("header_parse", len(corpus), {"email.message_from_bytes": before, "HeaderParser": after})
+
+
+def header_decode(corpus: List[bytes], listing: int = 1000) -> List[Dict]:
+    """RFC 2047 decoding of From/Subject/Date for a `listing`-message inbox."""
+    values = [LIST_HEADERS.parse(raw).get(f) for raw in corpus[:listing] for f in SUMMARY_FIELDS]
+
+    def uncached():
+        for v in values:
+            _decode_words(v)
+
+    def first_listing():
+        _decode_cached.cache_clear()
+        for v in values:
+            decode_value(v)
+
+    def repeat_listing():
+        for v in values:
+            decode_value(v)
+
+    return _cpu_rows(f"header_decode ({listing} messages)", listing, {
+        "make_header(decode_header()) every time": uncached, "memoized, first listing": first_listing,
+        "memoized, repeat listing": repeat_listing})
+
+
+def _cpu_rows(benchmark: str, items: int, variants: Dict) -> List[Dict]:
+    rows = []
+    for name, fn in variants.items():
+        fn()  # warm up imports and caches the variant itself relies on
+        secs = best_of(fn, repeat=5)
+        rows.append({"suite": "micro", "benchmark": benchmark, "operation": name, "items": items,
+                     "total_ms": round(secs * 1000, 3), "per_item_us": round(secs * 1e6 / items, 3)})
+    return rows
+
+
+def run_all(rtt_ms: float = 20) -> List[Dict]:
+    corpus = header_corpus()
+    return header_fetch(rtt_ms) + concurrency(max(rtt_ms, 20)) + header_parse(corpus) + header_decode(corpus)
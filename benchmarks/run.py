@@ -0,0 +1,116 @@
+import argparse, json, platform, subprocess, sys, time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+import harness  # noqa: F401  (puts voice_email_GUI/ on the import path)
+import end_to_end, micro
+
+# Run the benchmarks against the local fake server and write the numbers as JSON.
+#
+#   python benchmarks/run.py                         full run: 100 / 10k / 100k messages at 0, 20, 80 ms
+#   python benchmarks/run.py --quick                 smaller, for a quick check
+#   python benchmarks/run.py --compare base.json     also fail (exit 1) on regressions against a saved run
+
+
+def _key(row: Dict) -> Tuple:
+    return row["suite"], row.get("benchmark"), row.get("size"), row.get("rtt_ms"), row["operation"]
+
+
+def compare(base: List[Dict], rows: List[Dict], time_tolerance: float) -> List[str]:
+    """
+    Regressions of `rows` against `base`: any extra round trip (the fake server is
+    deterministic, so these don't wobble), 10% more bytes, or wall/CPU time more than
+    `time_tolerance` (a fraction) slower. Times under a millisecond are ignored.
+    """
+    old = {_key(r): r for r in base}
+    found = []
+    for row in rows:
+        before = old.get(_key(row))
+        if before is None:
+            continue
+        label = " / ".join(str(k) for k in _key(row) if k is not None)
+        checks = [("round trips", row.get("round_trips"), before.get("round_trips"), 0.0, 0.5),
+                  ("bytes", row.get("bytes"), before.get("bytes"), 0.10, 0),
+                  ("wall ms", (row.get("wall_ms") or {}).get("median"), (before.get("wall_ms") or {}).get("median"),
+                   time_tolerance, 1.0),
+                  ("client CPU ms", row.get("client_cpu_ms"), before.get("client_cpu_ms"), time_tolerance, 1.0),
+                  ("ms", row.get("total_ms"), before.get("total_ms"), time_tolerance, 1.0)]
+        for what, now, then, rel, floor in checks:
+            if now is None or then is None:
+                continue
+            if now > then * (1 + rel) + floor:
+                found.append(f"{label}: {what} {then} -> {now}")
+    return found
+
+
+def _table(rows: List[Dict]) -> str:
+    out = []
+    for r in rows:
+        where = r.get("benchmark") or f"{r['size']:>6} msgs {r['rtt_ms']:>4g} ms"
+        if "wall_ms" in r:
+            out.append(f"{where:<36} {r['operation']:<34} {r['round_trips']:>7} rt {r['bytes']:>9} B "
+                       f"{r['wall_ms']['median']:>9.1f} ms  cpu {r['client_cpu_ms']:>7.1f} ms")
+        else:
+            out.append(f"{where:<36} {r['operation']:<40} {r['total_ms']:>9.2f} ms  {r['per_item_us']:>8.2f} us/item")
+    return "\n".join(out)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+
+def main():
+    p = argparse.ArgumentParser(description="End-to-end and micro benchmarks for the voice email client.")
+    p.add_argument("--sizes", default="100,10000,100000", help="mailbox sizes, comma separated")
+    p.add_argument("--rtts", default="0,20,80", help="added round-trip times in ms, comma separated")
+    p.add_argument("--repeat", type=int, default=5, help="calls per operation")
+    p.add_argument("--quick", action="store_true", help="100 and 10k messages at 0 and 20 ms, 3 calls each")
+    p.add_argument("--skip-micro", action="store_true")
+    p.add_argument("--skip-end-to-end", action="store_true")
+    p.add_argument("-o", "--output", default="benchmark_results.json", help="where to write the JSON")
+    p.add_argument("--compare", help="a previous JSON output to check for regressions")
+    p.add_argument("--time-tolerance", type=float, default=0.5,
+                   help="how much slower (fraction) wall/CPU time may get before --compare fails")
+    args = p.parse_args()
+    if args.quick:
+        args.sizes, args.rtts, args.repeat = "100,10000", "0,20", 3
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    rtts = [float(r) for r in args.rtts.split(",") if r]
+
+    started = time.time()
+    rows: List[Dict] = []
+    if not args.skip_end_to_end:
+        for size in sizes:
+            for rtt in rtts:
+                print(f"end to end: {size} messages, {rtt:g} ms RTT", file=sys.stderr)
+                rows += end_to_end.run_mailbox(size, rtt, repeat=args.repeat)
+    if not args.skip_micro:
+        print("micro benchmarks", file=sys.stderr)
+        rows += micro.run_all()
+    result = {"meta": {"date": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": _git_commit(),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "sizes": sizes, "rtts_ms": rtts, "repeat": args.repeat,
+                       "seconds": round(time.time() - started, 1)},
+              "results": rows}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=1)
+    print(_table(rows))
+    print(f"\nWrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)["results"]
+        found = compare(base, rows, args.time_tolerance)
+        for line in found:
+            print("REGRESSION " + line)
+        if found:
+            sys.exit(1)
+        print("No regressions against " + args.compare)
+
+
+if __name__ == "__main__":
+    main()
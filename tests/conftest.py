@@ -0,0 +1,4 @@
+import os, sys
+
+# The app's modules are flat files in voice_email_GUI/, imported by name.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "voice_email_GUI"))
@@ -0,0 +1,44 @@
+from fuzzy_terms import MAX_DISTANCE, TermDictionary, edit_distance, phonetic_keys
+from search_index import SearchIndex
+
+_VOCAB = [("sean", 12), ("shane", 3), ("kathryn", 5), ("receipt", 9), ("recipe", 2), ("meeting", 20),
+          ("invoice", 7), ("the", 500)]
+
+
+def test_shawn_sounds_like_sean():
+    assert set(phonetic_keys("Shawn")) & set(phonetic_keys("Sean"))
+    assert edit_distance("shawn", "sean") == 2
+    terms = TermDictionary(_VOCAB)
+    assert "sean" in [t for t, _ in terms.candidates("Shawn")]
+    assert ("kathryn", edit_distance("katherine", "kathryn", 10)) in terms.candidates("katherine")
+
+
+def test_transposed_letters_are_one_edit():
+    assert edit_distance("reciept", "receipt") == 1
+    assert edit_distance("meetnig", "meeting") == 1
+    assert edit_distance("invoice", "notice") == MAX_DISTANCE + 1  # past the limit it stops counting
+    terms = TermDictionary(_VOCAB)
+    assert terms.candidates("reciept")[0] == ("receipt", 1)
+    assert terms.candidates("meetnig")[0] == ("meeting", 1)
+
+
+def test_exact_word_comes_first_and_short_words_only_match_exactly():
+    terms = TermDictionary(_VOCAB)
+    assert terms.candidates("sean")[0] == ("sean", 0)
+    assert terms.candidates("the") == [("the", 0)]
+    assert terms.candidates("th") == []
+
+
+def test_fuzzy_search_ranks_exact_and_prefix_hits_first():
+    index = SearchIndex(":memory:")
+    index.add_headers("INBOX", 1, [
+        (1, "Sean Okafor <sean@example.com>", "me@example.com", "Sean: notes from Sean", "Mon, 1 Jan 2024"),
+        (2, "Shawn Miller <shawn.m@example.com>", "me@example.com", "Lunch", "Tue, 2 Jan 2024"),
+        (3, "Shawnee Travel <trips@example.com>", "me@example.com", "Offers", "Wed, 3 Jan 2024"),
+        (4, "Maria Garcia <maria@example.com>", "me@example.com", "Budget", "Thu, 4 Jan 2024"),
+    ])
+    assert [h.uid for h in index.search("shawn")] in ([2, 3], [3, 2])
+    hits = [h.uid for h in index.search("shawn", fuzzy=True)]
+    # "Sean" scores better on bm25 (twice in the subject), but it only sounds like the query
+    assert sorted(hits[:2]) == [2, 3] and hits[2:] == [1]
+    assert [h.uid for h in index.search("sean", fuzzy=True)][0] == 1
@@ -0,0 +1,51 @@
+import queue, time
+from email.message import EmailMessage
+
+from email_client import MessageId
+from fake_mail_server import FakeMailServer, MailMix, generate_mailbox
+from idle_listener import IdleListener
+
+
+def _raw(subject: str) -> bytes:
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "Sean Okafor <sean@example.com>", "me@fake.example", subject
+    msg.set_content("Hello.")
+    return msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+
+
+def _next_event(events: "queue.Queue", timeout: float = 10):
+    return events.get(timeout=timeout)
+
+
+def test_pushed_changes_reach_the_client_once():
+    mailbox = generate_mailbox(20, MailMix(newsletters=0, automated=0, unseen=0.5), seed=9)
+    with FakeMailServer(mailbox) as srv:
+        mail = srv.client()
+        events = queue.Queue()
+        listener = IdleListener(mail, events.put, primary_only=False)
+        listener.start()
+        try:
+            assert _next_event(events).reset  # first sync: nothing known yet
+            victim = MessageId("INBOX", mailbox.uidvalidity, mailbox.uids[3])
+            mail.fetch_message(victim)
+            assert mail.cached_body(victim) is not None
+
+            mailbox.expunge([victim.uid])
+            ev = _next_event(events)
+            assert ev.vanished == [victim] and not ev.new
+            # the client's own cache dropped the body: there is only one sync state
+            assert mail.cached_body(victim) is None
+            assert victim.uid not in mail._sync_state["INBOX"].uids
+
+            # new mail a listing finds first is still reported, once
+            uid = mailbox.append(_raw("Coffee?")).uid
+            mail.list_unread(limit=5, primary_only=False)
+            ev = _next_event(events)
+            assert [s.uid.uid for s in ev.new] == [uid]
+            time.sleep(1.5)
+            assert events.empty()
+        finally:
+            listener.stop()
+            listener.join(10)
+            mail.close()
+    assert not listener.is_alive()
@@ -0,0 +1,59 @@
+import base64, random
+
+from email.message import EmailMessage
+
+from email_client import MessageId
+from fake_mail_server import FakeMailServer, generate_mailbox
+from imap_body import BODY_PREVIEW_BYTES, PartDecoder, TextPart, decode_part
+
+
+def _text(size: int) -> str:
+    rng = random.Random(7)
+    words = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda".split()
+    out = []
+    while sum(len(w) + 1 for w in out) < size:
+        out.append(rng.choice(words) + ("." if rng.random() < 0.1 else ""))
+    return " ".join(out)
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.split())
+
+
+def test_truncated_base64_stream_matches_decode_part():
+    part = TextPart("1", "plain", "base64", "utf-8", 0)
+    encoded = base64.encodebytes(_text(8000).encode())   # 76-char lines
+    raw = encoded[:5003]                                  # stops inside a 4-character group
+    decoder = PartDecoder(part)
+    chunks = [raw[i:i + 1024] for i in range(0, len(raw), 1024)]
+    streamed = "".join(decoder.feed(c, final=n == len(chunks) - 1, truncated=True) for n, c in enumerate(chunks))
+    assert streamed == decode_part(raw, part, truncated=True)
+    assert len(streamed) > 3700
+    assert decoder.errors == 0
+
+
+def test_streamed_preview_of_base64_body():
+    body = _text(12000)
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "Sean <sean@example.com>", "me@fake.example", "Long one"
+    msg.set_content(body, cte="base64")
+    mailbox = generate_mailbox(0)
+    uid = mailbox.append(msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))).uid
+    with FakeMailServer(mailbox) as srv:
+        mail = srv.client()
+        try:
+            ident = MessageId("INBOX", mailbox.uidvalidity, uid)
+            _, _, sentences = mail.stream_message(ident, max_bytes=BODY_PREVIEW_BYTES).result(10)
+            streamed = _norm(" ".join(sentences))
+            # a cut-off stream must not stand in for a real preview fetch
+            assert mail.cached_body(ident, BODY_PREVIEW_BYTES) is None
+            fetched = _norm(mail.fetch_message(ident, max_bytes=BODY_PREVIEW_BYTES)[2])
+            assert len(fetched) > 5000
+            assert streamed.startswith(fetched)
+            assert _norm(body).startswith(streamed)
+            # read in full, the stream is cached
+            _, _, sentences = mail.stream_message(ident).result(10)
+            assert _norm(" ".join(sentences)) == _norm(body)
+            assert _norm(mail.cached_body(ident)[2]) == _norm(body)
+        finally:
+            mail.close()
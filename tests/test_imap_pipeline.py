@@ -0,0 +1,40 @@
+import functools, sys, threading
+from concurrent.futures import wait
+
+import email_client
+from email_client import MessageId
+from fake_mail_server import FakeMailServer, generate_mailbox
+from imap_pipeline import ImapPipeline
+
+
+def test_concurrent_async_fetches_with_the_pipeline_full(monkeypatch):
+    # Two slots for eight threads: the body FETCH that follows each BODYSTRUCTURE reply is
+    # queued from the reader thread while every slot is wanted by a submitting thread.
+    monkeypatch.setattr(email_client, "ImapPipeline", functools.partial(ImapPipeline, max_in_flight=2))
+    mailbox = generate_mailbox(200, seed=2)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often, so the slot freed before a callback gets taken
+    try:
+        with FakeMailServer(mailbox) as srv:
+            mail = srv.client()
+            futures, lock = [], threading.Lock()
+
+            def read(uids):
+                for uid in uids:
+                    f = mail.fetch_message_async(MessageId("INBOX", mailbox.uidvalidity, uid), max_bytes=2000)
+                    with lock:
+                        futures.append(f)
+
+            threads = [threading.Thread(target=read, args=(mailbox.uids[n::8],), daemon=True) for n in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(20)
+            _, hung = wait(futures, timeout=20)
+            assert not any(t.is_alive() for t in threads)
+            assert not hung
+            assert len(futures) == 200
+            assert all(f.result()[2] for f in futures)
+            mail.close()
+    finally:
+        sys.setswitchinterval(interval)
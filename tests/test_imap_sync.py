@@ -0,0 +1,65 @@
+from email.message import EmailMessage
+
+import pytest
+
+import imap_sync
+from fake_mail_server import FakeMailServer, MailMix, generate_mailbox
+
+
+def _raw(subject: str) -> bytes:
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "Sean Okafor <sean@example.com>", "me@fake.example", subject
+    msg.set_content("Hello.")
+    return msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+
+
+def _record_paths(monkeypatch) -> list:
+    taken = []
+    for name in ("_condstore_sync", "_search_sync"):
+        def spy(*args, _name=name, _fn=getattr(imap_sync, name)):
+            taken.append(_name)
+            return _fn(*args)
+        monkeypatch.setattr(imap_sync, name, spy)
+    return taken
+
+
+@pytest.mark.parametrize("server, path", [
+    (dict(qresync=True), "_condstore_sync"),                 # VANISHED reports the expunge
+    (dict(condstore=True), "_condstore_sync"),               # CHANGEDSINCE, expunge found from EXISTS
+    (dict(condstore=False, qresync=False), "_search_sync"),  # UID SEARCH
+], ids=["qresync", "condstore", "search"])
+def test_incremental_sync(monkeypatch, server, path):
+    mailbox = generate_mailbox(30, MailMix(unseen=0.3), seed=4)
+    unread = [m for m in mailbox.messages if m.unseen]
+    read = [m for m in mailbox.messages if not m.unseen]
+    with FakeMailServer(mailbox, **server) as srv:
+        mail = srv.client()
+        try:
+            first = mail.sync()
+            assert first.full and first.new == mailbox.uids
+            taken = _record_paths(monkeypatch)
+
+            # nothing happened: nothing to report
+            assert mail.sync() == ([], [], [], False)
+
+            mailbox.set_flags(unread[0], add=["\\Seen"])
+            mailbox.set_flags(read[0], remove=["\\Seen"])
+            new = mailbox.append(_raw("Lunch tomorrow?")).uid
+            gone = read[-1].uid
+            mailbox.expunge([gone])
+
+            result = mail.sync()
+        finally:
+            mail.close()
+
+    assert taken == [path, path]
+    assert not result.full
+    assert result.new == [new]
+    assert sorted(result.changed) == sorted([unread[0].uid, read[0].uid])
+    assert result.vanished == [gone]
+    state = mail._sync_state["INBOX"]
+    assert state.uidvalidity == mailbox.uidvalidity
+    assert state.uids == set(mailbox.uids)
+    assert state.unseen == {m.uid for m in mailbox.messages if m.unseen}
+    assert new in state.unseen and gone not in state.uids and unread[0].uid not in state.unseen
+    assert state.highestmodseq == (mailbox.modseq if server.get("condstore", True) else 0)
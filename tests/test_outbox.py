@@ -0,0 +1,99 @@
+import threading, time
+
+from fake_mail_server import FakeMailServer, generate_mailbox
+from outbox import Outbox, OutboxSender
+from smtp_session import Delivery
+
+
+class _Busy:
+    """Stands in for EmailClient: every recipient gets a 451."""
+
+    def __init__(self):
+        self.batches = []
+
+    def send_bulk(self, jobs):
+        jobs = list(jobs)
+        self.batches.append(jobs)
+        return [Delivery(n, job.to, 451, "4.3.0 try again later") for n, job in enumerate(jobs)]
+
+
+def _wait_for(sender: OutboxSender, kind: str):
+    got, done = [], threading.Event()
+    def on_event(k, item):
+        got.append((k, item))
+        if k == kind:
+            done.set()
+    sender.on_event = on_event
+    return got, done
+
+
+def test_temporary_failure_is_retried_with_growing_backoff():
+    outbox = Outbox(":memory:")
+    item = outbox.add("ann@example.com", "Hello", "Hi Ann.")
+    mail = _Busy()
+    sender = OutboxSender(mail, outbox, retry_base=10, retry_max=1000, max_attempts=4)
+    got, _ = _wait_for(sender, "dead")
+    delays = []
+    for _ in range(4):
+        due = outbox.due(now=float("inf"))  # don't sit out the backoff
+        assert [it.id for it in due] == [item.id]
+        before = time.time()
+        sender._deliver(due)
+        delays.append(outbox.get(item.id).next_try - before)
+    assert [k for k, _ in got] == ["retry", "retry", "retry", "dead"]
+    # 10, 20 and 40 seconds, each with up to a quarter taken off as jitter
+    for n, delay in enumerate(delays[:3]):
+        assert 10 * 2 ** n * 0.75 - 1 <= delay <= 10 * 2 ** n
+    assert delays[0] < delays[1] < delays[2]
+    left = outbox.get(item.id)
+    assert left.state == "dead" and left.attempts == 4 and left.last_error.startswith("451")
+    # every try resent the same message
+    assert {batch[0].message_id for batch in mail.batches} == {item.message_id}
+    outbox.close()
+
+
+def test_permanent_refusal_is_dead_lettered():
+    outbox = Outbox(":memory:")
+    with FakeMailServer(generate_mailbox(0)) as srv:
+        mail = srv.client()
+        sender = OutboxSender(mail, outbox)
+        got, done = _wait_for(sender, "dead")
+        sender.start()
+        try:
+            item = sender.enqueue("reject@example.com", "Hello", "Hi.")
+            assert done.wait(10)
+        finally:
+            sender.stop()
+            sender.join(10)
+            mail.close()
+    assert [k for k, _ in got] == ["dead"]
+    left = outbox.get(item.id)
+    assert left.state == "dead" and left.attempts == 1 and left.last_error.startswith("550")
+    assert srv.smtp.messages == []
+    outbox.close()
+
+
+def test_queued_mail_survives_reopening_the_outbox(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path)
+    item = outbox.add("ann@example.com", "Hello", "Hi Ann.")
+    outbox.close()
+
+    outbox = Outbox(path)
+    assert outbox.items() == [item]
+    with FakeMailServer(generate_mailbox(0)) as srv:
+        mail = srv.client()
+        sender = OutboxSender(mail, outbox)
+        _, done = _wait_for(sender, "sent")
+        sender.start()  # left over from the last run: sent without being asked
+        try:
+            assert done.wait(10)
+        finally:
+            sender.stop()
+            sender.join(10)
+            mail.close()
+    assert outbox.items() == []
+    [msg] = srv.smtp.messages
+    assert msg.recipients == ["ann@example.com"]
+    assert item.message_id.encode() in msg.data
+    outbox.close()
@@ -0,0 +1,41 @@
+from fake_mail_server import FakeMailServer, MailMix, generate_mailbox
+from paging import Pager
+
+
+def _page_through(pager):
+    seen = [s.uid.uid for s in pager.current]
+    while pager.next_page() is not None:
+        seen += [s.uid.uid for s in pager.current]
+    return seen
+
+
+def test_paging_goes_on_from_unread_into_older_read_mail():
+    mailbox = generate_mailbox(120, MailMix(newsletters=0, automated=0, unseen=0.2), seed=5)
+    unread = {m.uid for m in mailbox.messages if m.unseen}
+    with FakeMailServer(mailbox) as srv:
+        mail = srv.client()
+        try:
+            first = mail.list_unread(limit=10)
+            pager = Pager(mail, first, page_size=10)
+            assert pager.unseen_only
+            seen = _page_through(pager)
+        finally:
+            mail.close()
+    assert len(seen) == len(set(seen)) == 120
+    # all the unread mail first, then the rest newest first
+    assert set(seen[:len(unread)]) == unread
+    rest = seen[len(unread):]
+    assert rest == sorted(rest, reverse=True)
+
+
+def test_paging_a_read_inbox_stays_in_order():
+    mailbox = generate_mailbox(35, MailMix(newsletters=0, automated=0, unseen=0), seed=6)
+    with FakeMailServer(mailbox) as srv:
+        mail = srv.client()
+        try:
+            pager = Pager(mail, mail.list_unread(limit=10), page_size=10)
+            assert not pager.unseen_only
+            seen = _page_through(pager)
+        finally:
+            mail.close()
+    assert seen == sorted(mailbox.uids, reverse=True)
@@ -0,0 +1,66 @@
+from fake_mail_server import FakeMailServer, MailMix, generate_mailbox
+from search_index import SearchIndex
+
+_FILLER = " ".join(["the weather was fine and the train was on time"] * 6)
+
+
+def _index() -> SearchIndex:
+    index = SearchIndex(":memory:")
+    index.add_headers("INBOX", 1, [
+        (1, "Kathryn Smith <kathryn@example.com>", "me@example.com", "Lunch on Friday", "Mon, 1 Jan 2024"),
+        (2, "Billing <billing@example.com>", "me@example.com", "Invoice 2024-17", "Tue, 2 Jan 2024"),
+        (3, "Sean Okafor <sean@example.com>", "me@example.com", "Trip notes", "Wed, 3 Jan 2024"),
+        (4, "Maria Garcia <maria@example.com>", "me@example.com", "Budget", "Thu, 4 Jan 2024"),
+    ])
+    index.add_body("INBOX", 1, 3, f"{_FILLER}. Please pay the invoice from the hotel before Monday. {_FILLER}.")
+    index.add_body("INBOX", 1, 4, "The budget meeting moved to Friday afternoon.")
+    return index
+
+
+def test_word_prefixes_match():
+    index = _index()
+    assert [h.uid for h in index.search("invo")] == [2, 3]
+    assert [h.uid for h in index.search("kath")] == [1]
+    assert index.search("zebra") == []
+
+
+def test_subject_matches_rank_above_body_matches():
+    index = _index()
+    # "invoice" is uid 2's subject but only in uid 3's (long) body
+    assert [h.uid for h in index.search("invoice")] == [2, 3]
+    # "friday": uid 1's subject, uid 4's body
+    assert [h.uid for h in index.search("friday")] == [1, 4]
+    # all the words beat some of them; with none having all, any will do
+    assert [h.uid for h in index.search("budget friday")] == [4]
+    assert sorted(h.uid for h in index.search("lunch hotel")) == [1, 3]
+
+
+def test_hits_carry_a_snippet_of_the_body_around_the_match():
+    index = _index()
+    hit = next(h for h in index.search("hotel") if h.uid == 3)
+    assert "hotel" in hit.snippet
+    assert hit.snippet.startswith("…") and hit.snippet.endswith("…")
+    assert len(hit.snippet.split()) <= 14
+    # header-only messages have nothing to quote
+    assert index.search("kathryn")[0].snippet == ""
+
+
+def test_server_answers_until_the_index_is_complete():
+    mailbox = generate_mailbox(300, MailMix(newsletters=0, automated=0), seed=8)
+    with FakeMailServer(mailbox) as srv:
+        mail = srv.client()
+        try:
+            mail.list_unread(limit=5)  # indexes a few headers; the index isn't complete yet
+            srv.reset_stats()
+            from_server = mail.search("Okafor", limit=100)
+            assert srv.stats()["imap"]["commands"] > 0
+            assert len(from_server) and all("Okafor" in s.sender for s in from_server)
+
+            while mail.index_pending(batch=100):
+                pass
+            srv.reset_stats()
+            local = mail.search("Okafor", limit=100)
+            assert srv.stats()["imap"]["commands"] == 0
+        finally:
+            mail.close()
+    assert {s.uid for s in local} == {s.uid for s in from_server}
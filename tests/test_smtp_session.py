@@ -0,0 +1,29 @@
+import pytest
+
+from email_client import SendJob
+from fake_mail_server import FakeMailServer, generate_mailbox
+
+
+@pytest.mark.parametrize("pipelining", [True, False], ids=["pipelined", "one-by-one"])
+def test_batch_with_a_refused_recipient(pipelining):
+    jobs = [SendJob("ann@example.com", "First", "One."),
+            SendJob("bob@example.com, reject@example.com", "Second", "Two."),
+            SendJob("cat@example.com", "Third", "Three.")]
+    with FakeMailServer(generate_mailbox(0), pipelining=pipelining) as srv:
+        mail = srv.client()
+        try:
+            srv.reset_stats()
+            results = mail.send_bulk(jobs)
+            connections = srv.stats()["smtp"]["connections"]
+        finally:
+            mail.close()
+        delivered = [(m.recipients, m.data) for m in srv.smtp.messages]
+
+    assert [(d.job, d.recipient, d.ok) for d in results] == [
+        (0, "ann@example.com", True), (1, "bob@example.com", True), (1, "reject@example.com", False),
+        (2, "cat@example.com", True)]
+    refused = results[2]
+    assert refused.code == 550 and "no such user" in refused.reply
+    assert [rcpts for rcpts, _ in delivered] == [["ann@example.com"], ["bob@example.com"], ["cat@example.com"]]
+    assert b"Subject: Second" in delivered[1][1]
+    assert connections == 1
@@ -1,9 +1,17 @@
-import os, re, sys, difflib, csv
-from typing import List, Dict
+import os, re, sys, difflib, csv, queue, threading
+from typing import Dict, Optional
 from dotenv import load_dotenv
 
 from voice_io import VoiceIO
+from body_cache import cache_summary
 from email_client import EmailClient
+from imap_body import BODY_PREVIEW_BYTES
+from idle_listener import IdleListener
+from indexer import SearchIndexer
+from message_summary import MessageSummary, SummaryList
+from outbox import Outbox, OutboxSender, outbox_summary
+from paging import Pager
+from prefetch import BodyPrefetcher
 
 # -------- Helpers --------
 WORD_NUM = {
@@ -18,7 +26,12 @@ ORDINAL_NUM = {
 }
 
 def load_contacts(path: str = 'contacts.csv') -> Dict[str, str]:
-    m = {}
+    """
+    name -> address from contacts.csv rows "name,email[,groups]". The optional third
+    column puts a contact in groups ("team;family"); each group name maps to all its
+    members' addresses, comma-separated, so "send this to the team" is one message.
+    """
+    m, groups = {}, {}
     if not os.path.exists(path): return m
     with open(path, newline='', encoding='utf-8') as f:
         for row in csv.reader(f):
@@ -26,20 +39,31 @@ def load_contacts(path: str = 'contacts.csv') -> Dict[str, str]:
             name, email = row[0].strip(), row[1].strip()
             if name and email:
                 m[name.lower()] = email
+                for g in (row[2].split(';') if len(row) > 2 else []):
+                    if g.strip():
+                        groups.setdefault(g.strip().lower(), []).append(email)
+    for g, emails in groups.items():
+        m.setdefault(g, ", ".join(emails))
     return m
 
 def resolve_contact(name: str, contacts: Dict[str, str]) -> str:
-    email = contacts.get(name.lower())
+    name = re.sub(r"^(?:the|my|our)\s+", "", name.lower().strip())
+    email = contacts.get(name)
     if email: return email
-    choices = difflib.get_close_matches(name.lower(), list(contacts.keys()), n=1, cutoff=0.6)
+    choices = difflib.get_close_matches(name, list(contacts.keys()), n=1, cutoff=0.6)
     return contacts.get(choices[0], '') if choices else ''
 
-def summarize_list(items: List[Dict]) -> str:
+def forward_text(frm: str, subj: str, body: str) -> str:
+    return (f"---------- Forwarded message ----------\nFrom: {frm}\nSubject: {subj or '(no subject)'}\n\n"
+            f"{body or ''}")
+
+def summarize_list(items: SummaryList) -> str:
     lines = []
     for it in items:
-        who = it['from']
-        subj = it['subject'] or '(no subject)'
-        lines.append(f"{it['index']}. {who} — {subj}")
+        who = it.sender
+        subj = it.subject or '(no subject)'
+        snippet = " ".join(it.snippet.split())  # search results: words around the match
+        lines.append(f"{it.index}. {who} — {subj}" + (f": {snippet}" if snippet else ""))
     return " | ".join(lines) if lines else "No messages found."
 
 def extract_index(text: str) -> int:
@@ -62,6 +86,77 @@ def extract_index(text: str) -> int:
             return n
     return -1
 
+def apply_mail_events(v: VoiceIO, events: "queue.Queue", cache: Dict):
+    """Fold pushed IdleListener events into the cached list and announce new mail."""
+    new_count, first = 0, None
+    while True:
+        try:
+            ev = events.get_nowait()
+        except queue.Empty:
+            break
+        known = set(cache['list'].uids)
+        fresh = [it for it in ev.new if it.uid not in known]
+        cache['list'] = cache['list'].merged(ev.new, ev.vanished, prepend=cache.get('kind', 'inbox') == 'inbox')
+        if cache.get('current') in ev.vanished:
+            cache['current'] = None
+        new_count += len(fresh)
+        first = fresh[0] if fresh else first
+    if first:
+        more = f"{new_count} new messages. " if new_count > 1 else ""
+        v.speak(f"{more}New message from {first.sender}: {first.subject or 'no subject'}.")
+
+def apply_outbox_events(v: VoiceIO, events: "queue.Queue"):
+    """Announce what the background sender did since the last command."""
+    while True:
+        try:
+            kind, item = events.get_nowait()
+        except queue.Empty:
+            break
+        if kind == 'sent' and item.last_error:
+            v.speak(f"Your message to {item.to} was sent, but some addresses refused it: {item.last_error}.")
+        elif kind == 'sent':
+            v.speak(f"Your message to {item.to} was sent.")
+        elif kind == 'retry' and item.attempts == 1:
+            v.speak(f"Your message to {item.to} could not be sent yet. I will keep trying.")
+        elif kind == 'dead':
+            v.speak(f"Your message to {item.to} could not be sent: {item.last_error}. Say what's in my outbox to hear more.")
+
+def _drain(iterable):
+    """Run an iterator to the end, discarding what it yields (for its side effects)."""
+    for _ in iterable:
+        pass
+
+def read_aloud(v: VoiceIO, mail: EmailClient, uid, item: Optional[MessageSummary] = None):
+    """
+    Speak one message. The body request is queued first so it overlaps with announcing
+    From/Subject from the listing; the body is then spoken sentence by sentence while
+    the rest downloads, and the \\Seen update overlaps with the confirmation.
+    """
+    stream = mail.stream_message(uid, max_bytes=BODY_PREVIEW_BYTES)
+    if item is not None:
+        v.speak(f"From {item.sender}. Subject: {item.subject or 'no subject'}. Here is the message:")
+    frm, subj, sentences = stream.result()
+    if item is None:
+        v.speak(f"From {frm}. Subject: {subj or 'no subject'}. Here is the message:")
+    if not v.speak_stream(sentences, max_chars=1200):
+        v.speak("(no readable body)")
+    # finish the (bounded) preview download so "reply" or reading it again hit the body cache
+    threading.Thread(target=_drain, args=(sentences,), daemon=True).start()
+    if confirm(v, "Mark this as read?"):
+        done = mail.mark_seen_async(uid)
+        v.speak("Marked as read.")
+        done.result()
+
+def queue_send(v: VoiceIO, sender: OutboxSender, to_email: str, subject: str, body: str):
+    """Put a message in the outbox; the user hears back once it is on disk, not after SMTP."""
+    try:
+        sender.enqueue(to_email, subject, body)
+    except Exception as e:
+        v.speak("I could not save the message to the outbox. It was not sent.")
+        print(e)
+        return
+    v.speak("Saved to your outbox. It is being sent now.")
+
 def hear_or_retry(v: VoiceIO, prompt: str, retries: int = 2) -> str:
     for i in range(retries + 1):
         txt = v.listen(prompt if i == 0 else "Sorry, I didn't catch that. " + prompt)
@@ -98,14 +193,51 @@ def main():
         print("Missing EMAIL_USER or EMAIL_PASS in .env")
         sys.exit(1)
 
-    mail = EmailClient(imap_host, imap_port, smtp_host, smtp_port, user, pw)
+    header_cache = os.getenv('HEADER_CACHE', '.header_cache.db')  # empty disables the on-disk cache
+    mail = EmailClient(imap_host, imap_port, smtp_host, smtp_port, user, pw,
+                       cache_path=header_cache or None,
+                       body_cache_bytes=int(float(os.getenv('BODY_CACHE_MB', '8')) * 1024 * 1024),
+                       smtp_idle_timeout=float(os.getenv('SMTP_KEEPALIVE', '60')),
+                       use_ssl=os.getenv('MAIL_SSL', '1') == '1')
     contacts = load_contacts()
 
+    # Sends go to a durable outbox and are delivered in the background, with retries.
+    outbox_events = queue.Queue()
+    outbox = Outbox(os.getenv('OUTBOX_PATH', '.outbox.db') or ":memory:")
+    sender = OutboxSender(mail, outbox, on_event=lambda kind, item: outbox_events.put((kind, item)))
+    sender.start()
+
+    # Download the bodies the user is likely to read next while they listen to the list.
+    prefetcher = None
+    prefetch_depth = int(os.getenv('PREFETCH_BODIES', '3'))
+    if prefetch_depth > 0:
+        prefetcher = BodyPrefetcher(mail, depth=prefetch_depth)
+        prefetcher.start()
+    prefetch = prefetcher.schedule if prefetcher else (lambda items: None)
+
+    # Build the local search index in the background so "search for" works offline, in milliseconds.
+    indexer = None
+    if os.getenv('SEARCH_INDEX', '1') == '1' and mail.search_index is not None:
+        indexer = SearchIndexer(mail, bodies=int(os.getenv('SEARCH_INDEX_BODIES', '200')))
+        indexer.start()
+
     v.speak("Welcome to your voice email. Say a command: check inbox, compose, search, help, or quit.")
 
-    cache = { 'list': [], 'map': {} }  # index->uid
+    cache = { 'list': SummaryList(), 'kind': 'inbox', 'pager': None,  # numbers -> MessageIds via list.uid_at()
+              'current': None }  # MessageId of the message read last: what "send this to ..." forwards
+    page_size = int(os.getenv('PAGE_SIZE', '10'))
+
+    events = queue.Queue()
+    if os.getenv('PUSH_MAIL', '1') == '1':
+        def on_event(ev):
+            events.put(ev)
+            if indexer and ev.new:
+                indexer.notify()
+        IdleListener(mail, on_event, primary_only=True).start()
 
     while True:
+        apply_mail_events(v, events, cache)
+        apply_outbox_events(v, outbox_events)
         cmd = v.listen()
         cmd = (cmd or "").lower().strip()
 
@@ -115,19 +247,30 @@ def main():
 
         # ---- HELP ----
         if 'help' in cmd or 'what can' in cmd:
-            v.speak("Commands are: check inbox, read number N, read next, compose, search for WORDS, reply, mark as read, or quit.")
+            v.speak("Commands are: check inbox, read number N, read next, next page, previous page, compose, search for WORDS, reply, send this to a contact or group, mark as read, what's in my outbox, retry outbox, cache stats, or quit.")
             continue
 
         # ---- QUIT ----
         if 'quit' in cmd or 'exit' in cmd or 'close' in cmd:
             v.speak("Goodbye.")
+            if prefetcher:
+                prefetcher.stop()
+            if indexer:
+                indexer.stop()
+            sender.stop()
+            waiting = sum(it.state == 'queued' for it in outbox.items())
+            if waiting:
+                v.speak(f"{waiting} message{'s are' if waiting > 1 else ' is'} still in the outbox and will be sent next time.")
+            mail.close()
             break
 
         # ---- CHECK INBOX ----
         if 'check inbox' in cmd or 'check my inbox' in cmd or 'unread' in cmd:
-            msgs = mail.list_unread(limit=10)
-            cache['list'] = msgs
-            cache['map'] = { it['index']: it['uid'] for it in msgs }
+            msgs = mail.list_unread(limit=page_size)
+            cache['kind'] = 'inbox'
+            cache['list'] = msgs[:]  # "read next" consumes this copy, not the pager's page
+            cache['pager'] = Pager(mail, msgs, page_size=page_size)
+            prefetch(msgs)
 
             if not msgs:
                 v.speak("I didn't find any messages in your Inbox. You can say 'compose' to send a new email or 'search for ...'.")
@@ -137,11 +280,28 @@ def main():
             v.speak(summarize_list(msgs))
             continue
 
+        # ---- NEXT / PREVIOUS PAGE ----
+        if 'next page' in cmd or 'more messages' in cmd or 'previous page' in cmd:
+            pager = cache['pager']
+            if pager is None:
+                v.speak("No list yet. Say check inbox or search first.")
+                continue
+            forward = 'next page' in cmd or 'more messages' in cmd
+            msgs = pager.next_page() if forward else pager.previous_page()
+            if msgs is None:
+                v.speak("There are no more messages." if forward else "This is the first page.")
+                continue
+            cache['list'] = msgs[:]
+            prefetch(msgs)
+            v.speak(f"Page {pager.page + 1}. {len(msgs)} messages. Say 'read number 1' or just say the number.")
+            v.speak(summarize_list(msgs))
+            continue
+
         # ---- DIRECT NUMBER after listing (e.g., just "one", "first") ----
         if cache['list']:
             # If user just says a number/ordinal without "read"
             idx_only = extract_index(cmd)
-            if idx_only != -1 and ('read' not in cmd and 'open' not in cmd):
+            if idx_only != -1 and not any(w in cmd for w in ('read', 'open', 'send', 'forward')):
                 cmd = f"read number {idx_only}"
 
         # ---- READ NUMBER N ----
@@ -153,16 +313,13 @@ def main():
             if n == -1:
                 v.speak("Please say the message number, like 'read number two' or 'read number 2'.")
                 continue
-            uid = cache['map'].get(n)
-            if not uid:
+            item = cache['list'].at(n)
+            if not item:
                 v.speak("That number isn't in the current list. Say 'check inbox' or 'search' first.")
                 continue
-            frm, subj, body = mail.fetch_message(uid)
-            v.speak(f"From {frm}. Subject: {subj or 'no subject'}. Here is the message:")
-            v.speak((body or "(no readable body)")[:1200])
-            if confirm(v, "Mark this as read?"):
-                mail.mark_seen(uid)
-                v.speak("Marked as read.")
+            prefetch(it for it in cache['list'] if it.index > n)  # the ones "read next" will want
+            cache['current'] = item.uid
+            read_aloud(v, mail, item.uid, item)
             continue
 
         # ---- READ NEXT ----
@@ -170,25 +327,24 @@ def main():
             if not cache['list']:
                 v.speak("No list yet. Say check inbox first.")
                 continue
-            it = cache['list'].pop(0)
-            uid = it['uid']
-            frm, subj, body = mail.fetch_message(uid)
-            v.speak(f"From {frm}. Subject: {subj or 'no subject'}. Here is the message:")
-            v.speak((body or "(no readable body)")[:1200])
-            if confirm(v, "Mark this as read?"):
-                mail.mark_seen(uid)
-                v.speak("Marked as read.")
+            it = cache['list'].popleft()
+            prefetch(cache['list'])
+            cache['current'] = it.uid
+            read_aloud(v, mail, it.uid, it)
             continue
 
         # ---- SEARCH ----
         if 'search for' in cmd or cmd.startswith('search '):
-            q = cmd.split('search', 1)[1].replace('for', '').strip()
+            q = re.sub(r"^\s*for\b", "", cmd.split('search', 1)[1]).strip()
             if not q:
                 v.speak("Say search for, then a keyword.")
                 continue
-            msgs = mail.search(q, limit=10)
-            cache['list'] = msgs
-            cache['map'] = { it['index']: it['uid'] for it in msgs }
+            # spoken words come as the recognizer heard them: also match what sounds alike
+            msgs = mail.search(q, limit=page_size, fuzzy=True)
+            cache['kind'] = 'search'
+            cache['list'] = msgs[:]
+            cache['pager'] = Pager(mail, msgs, query=q, primary_only=False, page_size=page_size, fuzzy=True)
+            prefetch(msgs)
 
             if not msgs:
                 v.speak(f"I didn't find any messages for '{q}'.")
@@ -198,6 +354,39 @@ def main():
             v.speak(summarize_list(msgs))
             continue
 
+        # ---- CACHE STATS ----
+        if 'cache' in cmd and 'stat' in cmd:
+            v.speak(cache_summary(mail.body_cache_stats()))
+            continue
+
+        # ---- OUTBOX ----
+        if 'outbox' in cmd:
+            if 'retry' in cmd or 'try again' in cmd or 'resend' in cmd:
+                n = sender.retry_now()
+                v.speak(f"Retrying {n} message{'s' if n != 1 else ''}." if n else "There is nothing to retry.")
+            else:
+                v.speak(outbox_summary(outbox.items()))
+            continue
+
+        # ---- FORWARD ("send this to the team") ----
+        m = re.search(r"\b(?:send|forward) (?:this|it|that)(?: message| email)? to (.+)", cmd)
+        if m:
+            if cache['current'] is None:
+                v.speak("No message selected. Say read number N first.")
+                continue
+            who = m.group(1).strip()
+            to_email = resolve_contact(who, contacts)
+            if not to_email:
+                v.speak(f"I could not find {who} in your contacts.")
+                continue
+            frm, subj, body = mail.fetch_message(cache['current'], max_bytes=BODY_PREVIEW_BYTES)
+            n = to_email.count('@')
+            if confirm(v, f"Forward {subj or 'this message'} to {who}" + (f", {n} people?" if n > 1 else "?")):
+                queue_send(v, sender, to_email, "Fwd: " + (subj or "(no subject)"), forward_text(frm, subj, body))
+            else:
+                v.speak("Cancelled.")
+            continue
+
         # ---- COMPOSE ----
         if 'compose' in cmd or 'new email' in cmd or 'send email' in cmd:
             who = hear_or_retry(v, "Who do you want to email? You can say a name in your contacts or spell an address.")
@@ -239,12 +428,7 @@ def main():
             v.speak("Here is your message:")
             v.speak(body[:1000])
             if confirm(v, f"Send to {to_email}?"):
-                try:
-                    mail.send(to_email, subject, body)
-                    v.speak("Sent.")
-                except Exception as e:
-                    v.speak("Sending failed. Check your SMTP settings.")
-                    print(e)
+                queue_send(v, sender, to_email, subject, body)
             else:
                 v.speak("Cancelled.")
             continue
@@ -254,7 +438,7 @@ def main():
             if not cache['list']:
                 v.speak("No current message to mark. Say read number N first.")
                 continue
-            uid = cache['list'][0]['uid']
+            uid = cache['list'][0].uid
             try:
                 mail.mark_seen(uid)
                 v.speak("Marked as read.")
@@ -267,8 +451,8 @@ def main():
             if not cache['list']:
                 v.speak("No message selected. Say read number N first.")
                 continue
-            uid = cache['list'][0]['uid']
-            frm, subj, _ = mail.fetch_message(uid)
+            uid = cache['list'][0].uid
+            frm, subj, _ = mail.fetch_message(uid, max_bytes=BODY_PREVIEW_BYTES)  # usually a body-cache hit
             m = re.search(r"<([^>]+)>", frm)
             to_email = m.group(1) if m else frm.split()[-1]
             if '@' not in to_email:
@@ -286,12 +470,7 @@ def main():
             body = "\n".join(lines)
             subject = "Re: " + (subj or "(no subject)")
             if confirm(v, f"Send reply to {to_email}?"):
-                try:
-                    mail.send(to_email, subject, body)
-                    v.speak("Reply sent.")
-                except Exception as e:
-                    v.speak("Sending failed.")
-                    print(e)
+                queue_send(v, sender, to_email, subject, body)
             else:
                 v.speak("Cancelled.")
             continue
@@ -0,0 +1,402 @@
+import asyncio, email, ssl
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from body_cache import BodyCache
+from email_client import (EmailClient, MessageId, FETCH_CHUNK, HEADER_ITEM, LIST_HEADERS, _UIDVALIDITY_RE,
+                          _is_probably_primary, hits_to_summaries)
+from header_parse import HeaderFields
+from imap_body import STRUCTURE_ITEMS, body_item, body_literals
+from imap_pipeline import Pending, route_untagged
+from imap_util import sequence_set, parse_fetch_response, literal_size, split_untagged, split_tagged
+from message_summary import SummaryList
+from search_index import SearchIndex
+from smtp_session import SMTP_IDLE_SECONDS, Delivery
+
+# Errors that mean the stream itself is gone.
+STREAM_ERRORS = (ConnectionError, OSError, EOFError, asyncio.IncompleteReadError)
+
+
+class ImapError(Exception):
+    """A tagged NO/BAD reply."""
+
+
+class ImapAbort(ImapError):
+    """The connection is unusable (closed, reset, or the server broke protocol)."""
+
+
+def _quote(arg: str) -> str:
+    return '"' + arg.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class AsyncImapConnection:
+    """
+    IMAP4rev1 client on asyncio streams, with its own response reader.
+
+    Commands may be issued concurrently: each gets a tag and an asyncio Future, and a
+    reader task routes the replies (same rules as ImapPipeline). At most `max_in_flight`
+    commands are on the wire at once.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_in_flight: int = 16):
+        self.reader = reader
+        self.writer = writer
+        self.capabilities: List[str] = []
+        self.mailbox: Optional[str] = None
+        self.uidvalidity: Optional[int] = None
+        self.exists = 0
+        self.broken: Optional[BaseException] = None
+        self._select_info: Optional[Dict[str, int]] = None  # filled from untagged replies during SELECT
+        self._pending: "OrderedDict[bytes, Pending]" = OrderedDict()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tagnum = 0
+        self._reader_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def open(cls, host: str, port: int, user: str, password: str, use_ssl: bool = True,
+                   timeout: float = 30, max_in_flight: int = 16) -> "AsyncImapConnection":
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=ssl.create_default_context() if use_ssl else None),
+            timeout)
+        conn = cls(reader, writer, max_in_flight)
+        greeting = await asyncio.wait_for(reader.readline(), timeout)
+        if not greeting.startswith(b'* OK') and not greeting.startswith(b'* PREAUTH'):
+            writer.close()
+            raise ImapAbort(f"unexpected greeting: {greeting[:80]!r}")
+        conn._reader_task = asyncio.ensure_future(conn._read_loop())
+        if not greeting.startswith(b'* PREAUTH'):
+            await conn.command('LOGIN', _quote(user), _quote(password))
+        typ, data = await conn.command('CAPABILITY')
+        conn.capabilities = (data[0] or b'').decode().upper().split()
+        return conn
+
+    # ---------- commands ----------
+    async def command(self, name: str, *args, untagged: Optional[str] = None,
+                      uids=None, check: bool = True) -> Tuple[str, List]:
+        """Send one command and wait for its completion: (typ, data) shaped like imaplib's."""
+        async with self._slots:
+            if self.broken is not None:
+                raise ImapAbort(f"connection lost: {self.broken}")
+            self._tagnum += 1
+            tag = b'A%04d' % self._tagnum
+            fut = asyncio.get_running_loop().create_future()
+            self._pending[tag] = Pending(fut, (untagged or name.split()[-1]).upper(),
+                                         set(uids) if uids is not None else None)
+            line = ' '.join([name] + [str(a) for a in args if a is not None])
+            try:
+                self.writer.write(tag + b' ' + line.encode() + b'\r\n')
+                await self.writer.drain()
+            except STREAM_ERRORS as e:
+                self._fail_all(e)
+            typ, data = await fut
+        if check and typ != 'OK':
+            raise ImapError(f"{name} failed: {typ} {data[-1]!r}")
+        return typ, data
+
+    async def select(self, mailbox: str = "INBOX"):
+        self.mailbox = None
+        self._select_info = info = {}
+        try:
+            await self.command('SELECT', _quote(mailbox), untagged='OK')
+        finally:
+            self._select_info = None
+        self.mailbox = mailbox
+        self.uidvalidity = info.get('UIDVALIDITY')
+        self.exists = info.get('EXISTS', 0)
+
+    async def uid_search(self, *criteria) -> List[int]:
+        typ, data = await self.command('UID SEARCH', *criteria, untagged='SEARCH')
+        return [int(x) for x in b' '.join(d for d in data if d).split()]
+
+    async def uid_fetch(self, uids: List[int], items: str) -> Dict[int, bytes]:
+        typ, data = await self.command('UID FETCH', sequence_set(uids), items, untagged='FETCH', uids=uids)
+        return parse_fetch_response(data)
+
+    async def logout(self):
+        try:
+            await asyncio.wait_for(self.command('LOGOUT', check=False), 5)
+        except Exception:
+            pass
+        self.close()
+
+    def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+    # ---------- reading ----------
+    async def _read_response(self) -> List:
+        items: List = []
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("socket closed by server")
+        head = line.rstrip(b'\r\n')
+        while True:
+            n = literal_size(head)
+            if n is None:
+                items.append(head)
+                return items
+            items.append((head, await self.reader.readexactly(n)))
+            head = (await self.reader.readline()).rstrip(b'\r\n')
+
+    async def _read_loop(self):
+        try:
+            while True:
+                self._dispatch(await self._read_response())
+        except asyncio.CancelledError:
+            self._fail_all(ConnectionError("connection closed"))
+            raise
+        except BaseException as e:
+            self._fail_all(e)
+
+    def _dispatch(self, items: List):
+        first = items[0][0] if isinstance(items[0], tuple) else items[0]
+        if first.startswith(b'* '):
+            parsed = split_untagged(items)
+            if parsed is None:
+                return
+            typ, data = parsed
+            self._note_untagged(typ, data)
+            target = route_untagged(self._pending.values(), typ, data)
+            if target is not None:
+                target.data.extend(data)
+            return
+        if first.startswith(b'+'):
+            raise ImapAbort("unexpected continuation request")
+        tagged = split_tagged(first)
+        if tagged is None:
+            raise ImapAbort(f"unparseable response: {first[:80]!r}")
+        p = self._pending.pop(tagged[0], None)
+        if p is not None and not p.future.done():
+            # like imaplib: untagged data on success, the completion text on NO/BAD
+            p.future.set_result((tagged[1], (p.data or [None]) if tagged[1] == 'OK' else [first]))
+
+    def _note_untagged(self, typ: str, data: List):
+        info = self._select_info
+        if info is None:
+            return
+        line = data[0][0] if isinstance(data[0], tuple) else data[0]
+        if typ == 'EXISTS':
+            info['EXISTS'] = int(line.split()[0])
+        elif typ == 'OK':
+            m = _UIDVALIDITY_RE.search(line)
+            if m:
+                info['UIDVALIDITY'] = int(m.group(1))
+
+    def _fail_all(self, exc: BaseException):
+        self.broken = exc
+        pending, self._pending = list(self._pending.values()), OrderedDict()
+        for p in pending:
+            if not p.future.done():
+                p.future.set_exception(ImapAbort(f"connection lost: {exc}"))
+
+
+class AsyncEmailClient:
+    """
+    asyncio counterpart of EmailClient with the same surface (list_unread, fetch_message,
+    mark_seen, search, send), for callers that want to overlap mail work on one thread.
+
+    - Up to `max_connections` IMAP connections; each operation checks one out, and
+      a multi-chunk header fetch pipelines its chunks (at most `max_in_flight` at once).
+    - `send` and `send_bulk` run EmailClient's in the loop's executor, at most
+      `max_sends` at a time; they share that client's warm SMTP session.
+    - No header cache or sync state: listings always come from the server. search()
+      uses a `search_index` shared by a threaded client once it covers the inbox.
+    """
+
+    def __init__(self, imap_host: str, imap_port: int, smtp_host: str, smtp_port: int, user: str, password: str,
+                 max_connections: int = 4, max_in_flight: int = 16, max_sends: int = 2, use_ssl: bool = True,
+                 body_cache: Optional[BodyCache] = None, search_index: Optional[SearchIndex] = None,
+                 smtp_idle_timeout: float = SMTP_IDLE_SECONDS):
+        self.imap_host = imap_host
+        self.imap_port = imap_port
+        self.user = user
+        self.password = password
+        self.max_connections = max(1, int(max_connections))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_sends = max(1, int(max_sends))
+        self.use_ssl = use_ssl
+        # SMTP and MIME body extraction are shared with the threaded client
+        self._sync = EmailClient(imap_host, imap_port, smtp_host, smtp_port, user, password, max_connections=1,
+                                 smtp_idle_timeout=smtp_idle_timeout, use_ssl=use_ssl)
+        # pass EmailClient.body_cache to share bodies with a threaded client
+        self.body_cache = body_cache if body_cache is not None else self._sync.body_cache
+        # pass EmailClient.search_index to answer searches locally
+        self.search_index = search_index
+        self._idle: List[AsyncImapConnection] = []
+        self._total = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._send_slots: Optional[asyncio.Semaphore] = None
+
+    # ---------- connections ----------
+    @asynccontextmanager
+    async def _connection(self, mailbox: Optional[str] = "INBOX"):
+        if self._cond is None:
+            self._cond = asyncio.Condition()  # created lazily so it binds to the loop the client runs on
+        async with self._cond:
+            # connections whose reader already saw EOF/reset are dropped, not handed out
+            dead = [c for c in self._idle if c.broken is not None]
+            self._idle = [c for c in self._idle if c.broken is None]
+            self._total -= len(dead)
+            await self._cond.wait_for(lambda: self._idle or self._total < self.max_connections)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._total += 1
+        for c in dead:
+            c.close()
+        healthy = False
+        try:
+            if conn is None:
+                conn = await AsyncImapConnection.open(self.imap_host, self.imap_port, self.user, self.password,
+                                                      self.use_ssl, max_in_flight=self.max_in_flight)
+            try:
+                if mailbox is not None and conn.mailbox != mailbox:
+                    await conn.select(mailbox)
+                yield conn
+            finally:
+                healthy = conn.broken is None
+        finally:
+            async with self._cond:
+                if healthy:
+                    self._idle.append(conn)
+                else:
+                    self._total -= 1
+                    if conn is not None:
+                        conn.close()
+                self._cond.notify()
+
+    async def _with_imap(self, fn, mailbox: Optional[str] = "INBOX"):
+        """Run `fn(conn)`, retrying once on a fresh connection if the first one was dead."""
+        for attempt in (1, 2):
+            try:
+                async with self._connection(mailbox) as conn:
+                    return await fn(conn)
+            except (ImapAbort, *STREAM_ERRORS):
+                if attempt == 2:
+                    raise
+
+    async def close(self):
+        self._sync.close()
+        if self._cond is None:
+            return
+        async with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        await asyncio.gather(*(c.logout() for c in idle))
+
+    # ---------- IMAP ----------
+    async def _fetch_headers_for(self, conn: AsyncImapConnection, uids: List[int]) -> List[Tuple[int, HeaderFields]]:
+        chunks = [uids[i:i + FETCH_CHUNK] for i in range(0, len(uids), FETCH_CHUNK)]
+        fetched: Dict[int, bytes] = {}
+        for part in await asyncio.gather(*(conn.uid_fetch(c, HEADER_ITEM) for c in chunks)):
+            fetched.update(part)
+        return [(uid, LIST_HEADERS.parse(fetched[uid])) for uid in uids if uid in fetched]
+
+    def _summarize(self, conn: AsyncImapConnection, pairs, unread: Optional[bool] = None) -> SummaryList:
+        out = SummaryList()
+        for uid, msg in pairs:
+            out.append(MessageId(conn.mailbox or "INBOX", conn.uidvalidity or 0, uid),
+                       msg.decoded('From'), msg.decoded('Subject'), msg.decoded('Date'), unread)
+        return out
+
+    async def list_unread(self, limit: int = 10, primary_only: bool = True) -> SummaryList:
+        """Same listing rules as EmailClient.list_unread without sync state (UNSEEN, else last 60 days)."""
+        async def run(conn):
+            uids = await conn.uid_search('UNSEEN')
+            unread = True if uids else None
+            if uids:
+                uids = list(reversed(uids))[: max(limit * 3, 40)]
+            else:
+                since_dt = (datetime.utcnow() - timedelta(days=60)).strftime("%d-%b-%Y")
+                uids = await conn.uid_search(f'(SINCE {since_dt})') or await conn.uid_search('ALL')
+                uids = list(reversed(uids))[: max(limit * 3, 80)]
+            if not uids:
+                return SummaryList()
+            pairs = await self._fetch_headers_for(conn, uids)
+            if primary_only:
+                filtered = [(u, m) for (u, m) in pairs if _is_probably_primary(m)]
+                pairs = filtered or pairs
+            return self._summarize(conn, pairs[:limit], unread)
+        return await self._with_imap(run)
+
+    async def fetch_message(self, ident, max_bytes: Optional[int] = None) -> Tuple[str, str, str]:
+        """Like EmailClient.fetch_message: only the best text part, without setting \\Seen."""
+        if isinstance(ident, MessageId):
+            hit = self.body_cache.get(ident, max_bytes)
+            if hit is not None:
+                return hit
+        async def run(conn):
+            uid = self._uid_for(conn, ident)
+            if uid is None:
+                return ("", "", "")
+            typ, d = await conn.command('UID FETCH', str(uid), STRUCTURE_ITEMS, untagged='FETCH', uids=[uid])
+            frm, subj, part, parsed = self._sync._structure_reply(d)
+            if parsed and part is None:
+                return (frm, subj, "(no readable body)")
+            item = body_item(part, max_bytes) if part is not None else 'BODY.PEEK[]'
+            typ, d = await conn.command('UID FETCH', str(uid), f'({item})', untagged='FETCH', uids=[uid])
+            if part is not None:
+                return (frm, subj, self._sync._part_body(d, part, max_bytes))
+            raw = body_literals(d).get('')
+            return (frm, subj, self._sync._extract_body(email.message_from_bytes(raw)) if raw is not None else "")
+        res = await self._with_imap(run, self._mailbox_of(ident))
+        if isinstance(ident, MessageId) and (res[0] or res[1] or res[2]):
+            self.body_cache.put(ident, res, max_bytes)
+        return res
+
+    async def mark_seen(self, ident):
+        async def run(conn):
+            uid = self._uid_for(conn, ident)
+            if uid is not None:
+                await conn.command('UID STORE', str(uid), '+FLAGS', '(\\Seen)', untagged='FETCH', uids=[uid])
+        await self._with_imap(run, self._mailbox_of(ident))
+
+    async def search(self, query: str, limit: int = 10, offset: int = 0, fuzzy: bool = False) -> SummaryList:
+        """Like EmailClient.search: the local index once it covers INBOX, else the server."""
+        index = self.search_index
+        if index is not None and index.complete("INBOX") is not None:
+            return hits_to_summaries(index.search(query, "INBOX", limit, offset, fuzzy), "INBOX")
+
+        async def run(conn):
+            uids = await conn.uid_search(f'(OR SUBJECT "{query}" FROM "{query}")')
+            if not uids:
+                return SummaryList()
+            uids = list(reversed(uids))[offset:offset + limit]
+            return self._summarize(conn, await self._fetch_headers_for(conn, uids))
+        try:
+            return await self._with_imap(run)
+        except (ImapAbort, *STREAM_ERRORS):
+            if index is None:
+                raise
+            return hits_to_summaries(index.search(query, "INBOX", limit, offset, fuzzy), "INBOX")
+
+    def _mailbox_of(self, ident) -> str:
+        return ident.mailbox if isinstance(ident, MessageId) else "INBOX"
+
+    def _uid_for(self, conn: AsyncImapConnection, ident) -> Optional[int]:
+        if isinstance(ident, MessageId):
+            if conn.uidvalidity is not None and conn.uidvalidity != ident.uidvalidity:
+                return None
+            return ident.uid
+        return int(ident)
+
+    # ---------- SMTP ----------
+    async def send(self, to_email: str, subject: str, body: str, message_id: Optional[str] = None):
+        if self._send_slots is None:
+            self._send_slots = asyncio.Semaphore(self.max_sends)
+        async with self._send_slots:
+            await asyncio.get_running_loop().run_in_executor(None, self._sync.send, to_email, subject, body,
+                                                             message_id)
+
+    async def send_bulk(self, jobs) -> List[Delivery]:
+        """EmailClient.send_bulk: many messages on one pipelined SMTP session."""
+        jobs = list(jobs)
+        if self._send_slots is None:
+            self._send_slots = asyncio.Semaphore(self.max_sends)
+        async with self._send_slots:
+            return await asyncio.get_running_loop().run_in_executor(None, self._sync.send_bulk, jobs)
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+# Default memory budget for cached bodies.
+BODY_CACHE_BYTES = 8 * 1024 * 1024
+
+
+class CachedBody(NamedTuple):
+    message: Tuple[str, str, str]   # (from, subject, body) as fetch_message returns it
+    max_bytes: Optional[int]        # None: whole text part; else only its first max_bytes were fetched
+    size: int
+
+
+class BodyCache:
+    """
+    LRU cache of fetched message bodies keyed by MessageId, bounded by `max_bytes`
+    (sizes are counted in characters, close enough to bytes for mostly-ASCII mail).
+
+    Entries cut at a byte limit only answer requests for at most that many bytes.
+    A MessageId includes UIDVALIDITY, so a stale entry can never be returned;
+    forget_other_epochs() just frees their memory early. Thread-safe.
+    """
+
+    def __init__(self, max_bytes: int = BODY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[object, CachedBody]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, ident, max_bytes: Optional[int] = None, count: bool = True) -> Optional[Tuple[str, str, str]]:
+        """The cached (from, subject, body) if it covers a `max_bytes` request (None = whole part)."""
+        with self._lock:
+            entry = self._entries.get(ident)
+            usable = entry is not None and (entry.max_bytes is None or
+                                            (max_bytes is not None and max_bytes <= entry.max_bytes))
+            if count:
+                if usable:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if not usable:
+                return None
+            self._entries.move_to_end(ident)
+            return entry.message
+
+    def put(self, ident, message: Tuple[str, str, str], max_bytes: Optional[int] = None):
+        size = sum(len(x or "") for x in message)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.get(ident)
+            if old is not None:
+                if max_bytes is not None and (old.max_bytes is None or old.max_bytes > max_bytes):
+                    return  # never replace a body with a shorter preview of it
+                self._size -= old.size
+            self._entries[ident] = CachedBody(message, max_bytes, size)
+            self._entries.move_to_end(ident)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+                self.evictions += 1
+
+    def discard(self, idents: Iterable):
+        with self._lock:
+            for ident in idents:
+                old = self._entries.pop(ident, None)
+                if old is not None:
+                    self._size -= old.size
+
+    def forget_other_epochs(self, mailbox: str, uidvalidity: int):
+        """Drop entries of `mailbox` from any other UIDVALIDITY."""
+        with self._lock:
+            stale = [k for k in self._entries if k.mailbox == mailbox and k.uidvalidity != uidvalidity]
+            for k in stale:
+                self._size -= self._entries.pop(k).size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._size}
+
+
+def cache_summary(stats: Dict[str, int]) -> str:
+    """A spoken answer to "cache stats", from BodyCache.stats()."""
+    reads = stats["hits"] + stats["misses"]
+    kb = stats["bytes"] // 1024
+    text = f"{stats['entries']} message{'s' if stats['entries'] != 1 else ''} kept in memory, {kb} kilobytes."
+    if not reads:
+        return text + " No messages have been read yet."
+    text += f" {stats['hits']} of {reads} reads came from memory, {round(100 * stats['hits'] / reads)} percent."
+    if stats["evictions"]:
+        text += f" {stats['evictions']} older messages were dropped to make room."
+    return text
@@ -1,16 +1,30 @@
-import imaplib, smtplib, ssl, email, re
+import imaplib, smtplib, sqlite3, ssl, email, re, threading, time
 from email.message import EmailMessage
-from typing import List, Dict, Tuple
-from email.header import decode_header, make_header
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import Callable, Iterable, List, Dict, Iterator, Tuple, NamedTuple, Optional
 from datetime import datetime, timedelta
 
-def _decode(h):
-    if not h:
-        return ""
-    try:
-        return str(make_header(decode_header(h)))
-    except Exception:
-        return h
+from body_cache import BODY_CACHE_BYTES, BodyCache
+from header_parse import HeaderFields, HeaderParser, decode_value as _decode
+from header_store import HeaderStore
+from imap_body import (BODY_PREVIEW_BYTES, STREAM_CHUNK_BYTES, STRUCTURE_ITEMS, PartDecoder, TextPart,
+                       body_item, body_literals, decode_part, header_message, iter_sentences,
+                       parse_bodystructure, pick_text_part)
+from imap_pipeline import ImapPipeline
+from imap_pool import ImapConnection, ImapPool, CONNECTION_ERRORS
+from imap_sync import MailboxState, SyncResult, sync_mailbox
+from imap_util import sequence_set, parse_fetch_response, uid_search
+from message_summary import SummaryList
+from search_index import SearchHit, SearchIndex
+from smtp_session import SMTP_IDLE_SECONDS, Delivery, SmtpSession
+
+# Header fields each consumer of list headers reads. Only these are fetched for listings
+# (see HEADER_ITEM), so anything new that reads a header must declare it here.
+SUMMARY_FIELDS = ('From', 'Subject', 'Date')
+PRIMARY_FIELDS = ('List-Unsubscribe', 'List-Id', 'Precedence', 'Auto-Submitted', 'X-Mailer')
+INDEX_FIELDS = ('To', 'Cc')  # recipients, for the local search index
 
 def _msg_has(header_name: str, msg) -> bool:
     v = msg.get(header_name)
@@ -38,88 +52,370 @@ def _is_probably_primary(msg) -> bool:
     # If it passed the bulk checks, treat as Primary-ish
     return True
 
+HEADER_FIELDS = tuple(dict.fromkeys(SUMMARY_FIELDS + PRIMARY_FIELDS + INDEX_FIELDS))
+# BODY.PEEK[HEADER.FIELDS] instead of RFC822.HEADER skips the DKIM/ARC/Received bulk.
+HEADER_ITEM = '(BODY.PEEK[HEADER.FIELDS (%s)])' % ' '.join(f.upper() for f in HEADER_FIELDS)
+# Listings parse those blocks with this instead of email.message_from_bytes.
+LIST_HEADERS = HeaderParser(HEADER_FIELDS)
+
+class MessageId(NamedTuple):
+    """
+    Stable identity of a message: (mailbox, UIDVALIDITY, UID).
+    Unlike sequence numbers it survives expunges; it only goes stale when the
+    server changes the mailbox's UIDVALIDITY.
+    """
+    mailbox: str
+    uidvalidity: int
+    uid: int
+
+    def __str__(self):
+        return f"{self.mailbox}/{self.uidvalidity}/{self.uid}"
+
+
+class SendJob(NamedTuple):
+    """One message for EmailClient.send_bulk; `to` may list several addresses ("a@x.com, b@y.com")."""
+    to: str
+    subject: str
+    body: str
+    message_id: Optional[str] = None
+
+
+def hits_to_summaries(hits: List[SearchHit], mailbox: str, unseen: Optional[set] = None) -> SummaryList:
+    """SearchIndex hits as a listing, in rank order; unread flags only when `unseen` is known."""
+    out = SummaryList()
+    for h in hits:
+        out.append(MessageId(mailbox, h.uidvalidity, h.uid), h.sender, h.subject, h.date,
+                   h.uid in unseen if unseen is not None else None, h.snippet)
+    return out
+
+# Max UIDs per FETCH command; keeps command lines well under server limits.
+FETCH_CHUNK = 200
+
+# Most UIDs one list_page call looks at while the Primary filter keeps rejecting mail;
+# the page then comes back short and the next one carries on from there.
+PAGE_SCAN_LIMIT = 400
+
+# Messages whose headers index_pending() adds to the search index per call.
+INDEX_BATCH = 1000
+
+_UIDVALIDITY_RE = re.compile(rb'UIDVALIDITY (\d+)')
+
+def _resolved(value) -> Future:
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+def _then(fut: Future, fn) -> Future:
+    """Future of fn(fut.result()); exceptions from either side are passed through."""
+    out: Future = Future()
+    def done(f):
+        try:
+            out.set_result(fn(f.result()))
+        except BaseException as e:
+            out.set_exception(e)
+    fut.add_done_callback(done)
+    return out
+
 class EmailClient:
-    def __init__(self, imap_host: str, imap_port: int, smtp_host: str, smtp_port: int, user: str, password: str):
+    def __init__(self, imap_host: str, imap_port: int, smtp_host: str, smtp_port: int, user: str, password: str,
+                 cache_path: Optional[str] = None, max_connections: int = 4,
+                 body_cache_bytes: int = BODY_CACHE_BYTES, search_index: Optional[SearchIndex] = None,
+                 smtp_idle_timeout: float = SMTP_IDLE_SECONDS, use_ssl: bool = True):
         self.imap_host = imap_host
         self.imap_port = int(imap_port)
         self.smtp_host = smtp_host
         self.smtp_port = int(smtp_port)
         self.user = user
         self.password = password
-        self._imap = None
+        # False talks plain IMAP/SMTP, for a local test server (fake_mail_server)
+        self.use_ssl = use_ssl
+        self.max_connections = max_connections
+        # Workers run in parallel, so every operation borrows its own connection.
+        self._pool = ImapPool(self._open_connection, max_size=max_connections)
+        self._sync_lock = threading.Lock()
+        self._pipeline: Optional[ImapPipeline] = None
+        self._pipeline_lock = threading.Lock()
+        self._sync_state: Dict[str, MailboxState] = {}
+        # called with (mailbox, state, result) after every sync that found something
+        self._sync_listeners: List[Callable[[str, MailboxState, SyncResult], None]] = []
+        # Bodies already read or prefetched; see body_cache_stats()
+        self._bodies = BodyCache(body_cache_bytes)
+        # interactive IMAP work in progress / last started, so background work can yield
+        self._foreground = 0
+        self._foreground_at = 0.0
+        self._activity_lock = threading.Lock()
+        # Optional on-disk header cache; None keeps everything in memory only.
+        self.cache_path = cache_path
+        self._store = HeaderStore(cache_path, fields=HEADER_FIELDS) if cache_path else None
+        # Local full-text index behind search(): in the cache file, else in memory; None without FTS5
+        self._index = search_index if search_index is not None else self._open_index(cache_path)
+        # One SMTP connection kept logged in between sends (closed after smtp_idle_timeout seconds)
+        self._smtp = SmtpSession(self._open_smtp, idle_timeout=smtp_idle_timeout)
+
+    @staticmethod
+    def _open_index(path: Optional[str]) -> Optional[SearchIndex]:
+        try:
+            return SearchIndex(path or ":memory:")
+        except sqlite3.Error:
+            return None
+
+    @property
+    def search_index(self) -> Optional[SearchIndex]:
+        """The local search index; AsyncEmailClient can share it."""
+        return self._index
+
+    def close(self):
+        """Log out all idle IMAP connections and the SMTP session; the client can't be used afterwards."""
+        with self._pipeline_lock:
+            self._drop_pipeline()
+        self._pool.close()
+        self._smtp.close()
 
     # ---------- IMAP ----------
-    def _imap_connect(self):
-        if self._imap is None:
-            self._imap = imaplib.IMAP4_SSL(self.imap_host, self.imap_port)
-            self._imap.login(self.user, self.password)
-        return self._imap
+    def _open_connection(self) -> ImapConnection:
+        if self.use_ssl:
+            imap = imaplib.IMAP4_SSL(self.imap_host, self.imap_port)
+        else:
+            imap = imaplib.IMAP4(self.imap_host, self.imap_port)
+        imap.login(self.user, self.password)
+        conn = ImapConnection(imap)
+        self._enable_extensions(conn)
+        return conn
 
-    def _fetch_headers_for(self, imap, uids: List[bytes]) -> List[Tuple[bytes, email.message.Message]]:
-        out = []
-        for uid in uids:
+    def _with_imap(self, fn, background: bool = False):
+        """
+        Run fn(conn) on a pooled connection, retrying once on a fresh one if the link dropped.
+        Calls not marked `background` count as interactive for is_busy().
+        """
+        if not background:
+            with self._activity_lock:
+                self._foreground += 1
+                self._foreground_at = time.monotonic()
+        try:
+            for attempt in range(2):
+                try:
+                    with self._pool.connection() as conn:
+                        return fn(conn)
+                except CONNECTION_ERRORS:
+                    if attempt:
+                        raise
+        finally:
+            if not background:
+                with self._activity_lock:
+                    self._foreground -= 1
+
+    def _enable_extensions(self, conn: ImapConnection):
+        """Turn on QRESYNC (or plain CONDSTORE) when the server advertises it after login."""
+        imap = conn.imap
+        try:
+            typ, data = imap.capability()
+            if typ == 'OK' and data and data[0]:
+                imap.capabilities = tuple(data[0].decode(errors='ignore').upper().split())
+            caps = set(imap.capabilities)
+            if 'ENABLE' in caps and 'QRESYNC' in caps:
+                imap.enable('QRESYNC')
+                conn.condstore = conn.qresync = True
+            elif 'ENABLE' in caps and 'CONDSTORE' in caps:
+                imap.enable('CONDSTORE')
+                conn.condstore = True
+        except CONNECTION_ERRORS:
+            raise
+        except Exception:
+            pass  # plain IMAP4rev1 is fine; sync falls back to UID SEARCH
+
+    @contextmanager
+    def idle_connection(self, mailbox: str = "INBOX"):
+        """
+        A connection of its own (outside the pool) with `mailbox` selected, for a
+        long-running IDLE; logged out afterwards. Syncing still goes through sync().
+        """
+        conn = self._open_connection()
+        try:
+            self._select(conn, mailbox)
+            if conn.mailbox != mailbox:
+                raise imaplib.IMAP4.error(f"can't select {mailbox}")
+            yield conn
+        finally:
+            conn.logout()
+
+    def _select(self, conn: ImapConnection, mailbox: str = "INBOX") -> Optional[int]:
+        """SELECT `mailbox` on `conn` and remember its UIDVALIDITY (None if the server didn't report one)."""
+        imap = conn.imap
+        typ, count = imap.select(mailbox)
+        if typ != 'OK':
+            conn.mailbox = conn.uidvalidity = None
+            return None
+        try:
+            conn.exists = int(count[0])
+        except (TypeError, ValueError, IndexError):
+            conn.exists = 0
+        _, modseq = imap.response('HIGHESTMODSEQ')
+        try:
+            conn.highestmodseq = int(modseq[0]) if modseq and modseq[0] else 0
+        except (TypeError, ValueError):
+            conn.highestmodseq = 0
+        _, data = imap.response('UIDVALIDITY')
+        validity = None
+        if data and data[0]:
+            try:
+                validity = int(data[0])
+            except (TypeError, ValueError):
+                m = _UIDVALIDITY_RE.search(data[0])
+                validity = int(m.group(1)) if m else None
+        conn.mailbox, conn.uidvalidity = mailbox, validity
+        if validity is not None:
+            self._bodies.forget_other_epochs(mailbox, validity)
+            if self._store is not None:
+                self._store.forget_other_epochs(mailbox, validity)
+            if self._index is not None:
+                self._index.forget_other_epochs(mailbox, validity)
+        return validity
+
+    def _uid_for(self, conn: ImapConnection, ident) -> Optional[int]:
+        """
+        Resolve a MessageId (or a bare UID) to a UID valid in the mailbox selected on `conn`.
+        Returns None if the identity belongs to an older UIDVALIDITY epoch.
+        """
+        if isinstance(ident, MessageId):
+            if conn.mailbox != ident.mailbox or conn.uidvalidity is None:
+                self._select(conn, ident.mailbox)
+            if conn.uidvalidity is not None and conn.uidvalidity != ident.uidvalidity:
+                return None
+            return ident.uid
+        if conn.mailbox is None:
+            self._select(conn)
+        return int(ident)
+
+    def _fetch_headers_for(self, conn: ImapConnection, uids: List[int]) -> List[Tuple[int, HeaderFields]]:
+        """
+        UID FETCH the HEADER_FIELDS headers, one command per FETCH_CHUNK UIDs (pipelined);
+        keeps the order of `uids`.
+        With a header store only the UIDs it hasn't seen go over the wire.
+        """
+        cacheable = self._store is not None and conn.uidvalidity is not None
+        raw: Dict[int, bytes] = self._store.get_many(conn.mailbox, conn.uidvalidity, uids) if cacheable else {}
+        missing = [u for u in uids if u not in raw]
+        chunks = [missing[i:i + FETCH_CHUNK] for i in range(0, len(missing), FETCH_CHUNK)]
+        fetched: Dict[int, bytes] = {}
+        if len(chunks) > 1:
+            # keep every chunk in flight at once instead of paying one round trip each
+            with ImapPipeline(conn) as pipe:
+                futures = [pipe.submit_fetch(chunk, HEADER_ITEM) for chunk in chunks]
+            replies = [f.result() for f in futures]
+        elif chunks:
             try:
-                typ, d = imap.fetch(uid, '(RFC822.HEADER)')
-                if typ == 'OK' and d and d[0]:
-                    msg = email.message_from_bytes(d[0][1])
-                    out.append((uid, msg))
+                replies = [conn.imap.uid('FETCH', sequence_set(chunks[0]), HEADER_ITEM)]
+            except CONNECTION_ERRORS:
+                raise
             except Exception:
-                continue
+                replies = []
+        else:
+            replies = []
+        for typ, d in replies:
+            if typ == 'OK':
+                fetched.update(parse_fetch_response(d))
+        if cacheable:
+            self._store.put_many(conn.mailbox, conn.uidvalidity, fetched)
+        raw.update(fetched)
+        out = []
+        for uid in uids:
+            hdr = raw.get(uid)
+            if hdr is not None:
+                out.append((uid, LIST_HEADERS.parse(hdr)))
+        if self._index is not None and conn.uidvalidity is not None:
+            self._index_headers(conn.mailbox, conn.uidvalidity, out)
         return out
 
-    def _summarize(self, pairs: List[Tuple[bytes, email.message.Message]]) -> List[Dict]:
-        results: List[Dict] = []
-        for i, (uid, msg) in enumerate(pairs, start=1):
-            frm = _decode(msg.get('From'))
-            subj = _decode(msg.get('Subject'))
-            date = _decode(msg.get('Date'))
-            results.append({"index": i, "uid": uid, "from": frm, "subject": subj, "date": date})
+    def _summarize(self, pairs: List[Tuple[int, HeaderFields]],
+                   mailbox: Optional[str], uidvalidity: Optional[int]) -> SummaryList:
+        mailbox = mailbox or "INBOX"
+        uidvalidity = uidvalidity or 0
+        state = self._sync_state.get(mailbox)
+        unseen = state.unseen if state is not None and state.uidvalidity == uidvalidity else None
+        results = SummaryList()
+        for uid, msg in pairs:
+            results.append(MessageId(mailbox, uidvalidity, uid), msg.decoded('From'), msg.decoded('Subject'),
+                           msg.decoded('Date'), uid in unseen if unseen is not None else None)
         return results
 
-    def list_unread(self, limit: int = 10, primary_only: bool = True) -> List[Dict]:
+    def summarize_uids(self, uids: List[int], mailbox: str = "INBOX", primary_only: bool = False) -> SummaryList:
+        """Summaries for UIDs of `mailbox` (e.g. the `new` list of a SyncResult), in the given order."""
+        def run(conn):
+            if conn.mailbox != mailbox:
+                self._select(conn, mailbox)
+            pairs = self._fetch_headers_for(conn, uids)
+            if primary_only:
+                pairs = [(uid, msg) for (uid, msg) in pairs if _is_probably_primary(msg)]
+            return self._summarize(pairs, conn.mailbox, conn.uidvalidity)
+        return self._with_imap(run)
+
+    def list_unread(self, limit: int = 10, primary_only: bool = True) -> SummaryList:
         """
         Inbox listing with Primary-like heuristic (no X-GM-RAW dependency).
 
         Steps:
-        1) Select INBOX.
+        1) Sync INBOX incrementally (see sync()); the unread/latest UIDs then come
+           from local state instead of fresh searches.
         2) Try UNSEEN first (new mail).
         3) If primary_only=True, filter out bulk/newsletters using headers.
-        4) If empty, fetch latest (SINCE 60 days) and apply same filter.
+        4) If empty, fetch latest (newest UIDs, or SINCE 60 days without sync state) and apply same filter.
         5) If still empty, return latest (unfiltered) so the UI isn't blank.
         """
-        imap = self._imap_connect()
-        imap.select("INBOX")
+        return self._with_imap(lambda conn: self._list_unread(conn, limit, primary_only))
+
+    def _list_unread(self, conn: ImapConnection, limit: int, primary_only: bool) -> SummaryList:
+        state = None
+        try:
+            if self._sync(conn, "INBOX") is not None:
+                state = self._sync_state.get("INBOX")
+        except CONNECTION_ERRORS:
+            raise
+        except Exception:
+            self._select(conn, "INBOX")
+
+        fetched_pairs: List[Tuple[int, HeaderFields]] = []
+        if state is not None:
+            with self._sync_lock:
+                uids = state.newest(unseen_only=True)[: max(limit * 3, 40)]
+                if not uids:
+                    uids = state.newest()[: max(limit * 3, 80)]
+            if uids:
+                fetched_pairs = self._fetch_headers_for(conn, uids)
+            return self._finish_listing(conn, fetched_pairs, limit, primary_only)
 
         # --- Step 2: get unread first
-        uids: List[bytes] = []
+        uids: List[int] = []
         try:
-            typ, data = imap.search(None, 'UNSEEN')
-            if typ == 'OK' and data and data[0]:
-                uids = data[0].split()
+            uids = uid_search(conn.imap, None, 'UNSEEN')
+        except CONNECTION_ERRORS:
+            raise
         except Exception:
             pass
 
         # If no unread, get last 60 days (or ALL as fallback)
-        fetched_pairs: List[Tuple[bytes, email.message.Message]] = []
         if uids:
             # newest first
             uids = list(reversed(uids))[: max(limit * 3, 40)]  # fetch a bit more for filtering headroom
-            fetched_pairs = self._fetch_headers_for(imap, uids)
+            fetched_pairs = self._fetch_headers_for(conn, uids)
         else:
             try:
                 since_dt = (datetime.utcnow() - timedelta(days=60)).strftime("%d-%b-%Y")
-                typ, data = imap.search(None, f'(SINCE {since_dt})')
-                if typ != 'OK' or not data or not data[0]:
-                    typ, data = imap.search(None, 'ALL')
-                if typ == 'OK' and data and data[0]:
-                    uids = data[0].split()
+                uids = uid_search(conn.imap, None, f'(SINCE {since_dt})')
+                if not uids:
+                    uids = uid_search(conn.imap, None, 'ALL')
+                if uids:
                     uids = list(reversed(uids))[: max(limit * 3, 80)]
-                    fetched_pairs = self._fetch_headers_for(imap, uids)
+                    fetched_pairs = self._fetch_headers_for(conn, uids)
+            except CONNECTION_ERRORS:
+                raise
             except Exception:
                 pass
+        return self._finish_listing(conn, fetched_pairs, limit, primary_only)
 
+    def _finish_listing(self, conn: ImapConnection, fetched_pairs: List[Tuple[int, HeaderFields]],
+                        limit: int, primary_only: bool) -> SummaryList:
         if not fetched_pairs:
-            return []
+            return SummaryList()
 
         # --- Step 3/4: apply Primary-like filter if requested
         if primary_only:
@@ -132,35 +428,501 @@ class EmailClient:
 
         # Keep newest first and cap to limit
         pairs = pairs[:limit]
+        if self._store is not None and conn.uidvalidity is not None:
+            self._store.save_listing(conn.mailbox, "unread", conn.uidvalidity, [uid for uid, _ in pairs])
 
         # Reindex 1..N for display order
-        return self._summarize(pairs)
+        return self._summarize(pairs, conn.mailbox, conn.uidvalidity)
+
+    def sync(self, mailbox: str = "INBOX", background: bool = False) -> Optional[SyncResult]:
+        """
+        Incrementally refresh what we know about `mailbox` (see imap_sync.sync_mailbox).
+        Uses CONDSTORE/QRESYNC when the server has them, plain UID SEARCH otherwise.
+        State survives restarts through the header store. Returns None when the
+        server reports no UIDVALIDITY (nothing can be cached safely then).
+        """
+        return self._with_imap(lambda conn: self._sync(conn, mailbox), background=background)
+
+    def add_sync_listener(self, fn: Callable[[str, MailboxState, SyncResult], None]):
+        """
+        Call fn(mailbox, state, result) after every sync that found a change, whichever
+        operation ran it (listings and the search indexer sync too). It runs in the
+        syncing thread with the sync lock held, so it should only hand the result on.
+        """
+        with self._sync_lock:
+            self._sync_listeners.append(fn)
+
+    def remove_sync_listener(self, fn: Callable[[str, MailboxState, SyncResult], None]):
+        with self._sync_lock:
+            if fn in self._sync_listeners:
+                self._sync_listeners.remove(fn)
+
+    def _sync(self, conn: ImapConnection, mailbox: str) -> Optional[SyncResult]:
+        validity = self._select(conn, mailbox)
+        if validity is None:
+            return None
+        # one sync at a time: the state object is shared by every connection
+        with self._sync_lock:
+            state = self._sync_state.get(mailbox)
+            if state is None and self._store is not None:
+                saved = self._store.load_sync_state(mailbox)
+                if saved:
+                    state = MailboxState(*saved)
+            state, result = sync_mailbox(conn.imap, state, validity, conn.exists, conn.highestmodseq, conn.qresync)
+            self._sync_state[mailbox] = state
+            if result.vanished:
+                self._bodies.discard(MessageId(mailbox, validity, uid) for uid in result.vanished)
+                if self._index is not None:
+                    self._index.remove(mailbox, validity, result.vanished)
+            if self._store is not None:
+                self._store.save_sync_state(mailbox, state.uidvalidity, state.highestmodseq, state.uids, state.unseen)
+            if result.full or result.new or result.changed or result.vanished:
+                for fn in self._sync_listeners:
+                    fn(mailbox, state, result)
+        return result
+
+    def cached_unread(self, mailbox: str = "INBOX") -> SummaryList:
+        """Last-known list_unread result straight from the header store (no network); empty if none."""
+        if self._store is None:
+            return SummaryList()
+        saved = self._store.load_listing(mailbox, "unread")
+        if not saved:
+            return SummaryList()
+        uidvalidity, uids = saved
+        raw = self._store.get_many(mailbox, uidvalidity, uids)
+        pairs = [(uid, LIST_HEADERS.parse(raw[uid])) for uid in uids if uid in raw]
+        return self._summarize(pairs, mailbox, uidvalidity)
 
-    def fetch_message(self, uid_bytes) -> Tuple[str, str, str]:
-        imap = self._imap_connect()
-        typ, d = imap.fetch(uid_bytes, '(RFC822)')
-        if typ != 'OK' or not d or not d[0]:
+    def fetch_message(self, ident, max_bytes: Optional[int] = None) -> Tuple[str, str, str]:
+        """
+        `ident` is a MessageId from list_unread/search (a bare UID is also accepted).
+        Only the best text part is downloaded (its first `max_bytes` if given), never
+        attachments, and the message is not marked \\Seen. Served from memory when the
+        body was read or prefetched before.
+        """
+        hit = self._bodies.get(ident, max_bytes) if isinstance(ident, MessageId) else None
+        if hit is not None:
+            return hit
+        res = self._with_imap(lambda conn: self._fetch_message(conn, ident, max_bytes))
+        self._remember_body(ident, res, max_bytes)
+        return res
+
+    def prefetch_message(self, ident) -> bool:
+        """Warm the body cache for `ident` as background work; True if it is cached now."""
+        if self.cached_body(ident) is not None:
+            return True
+        res = self._with_imap(lambda conn: self._fetch_message(conn, ident, None), background=True)
+        self._remember_body(ident, res)
+        return self.cached_body(ident) is not None
+
+    def is_busy(self, within: float = 0.0) -> bool:
+        """True while interactive IMAP work runs or started less than `within` seconds ago."""
+        with self._activity_lock:
+            return self._foreground > 0 or time.monotonic() - self._foreground_at < within
+
+    def cached_body(self, ident, max_bytes: Optional[int] = None) -> Optional[Tuple[str, str, str]]:
+        """The cached fetch_message(ident, max_bytes) result, or None; not counted in the stats."""
+        if not isinstance(ident, MessageId):
+            return None
+        return self._bodies.get(ident, max_bytes, count=False)
+
+    @property
+    def body_cache(self) -> BodyCache:
+        """The in-memory body cache; AsyncEmailClient can share it."""
+        return self._bodies
+
+    def body_cache_stats(self) -> Dict[str, int]:
+        """hits, misses, evictions, entries and bytes of the in-memory body cache."""
+        return self._bodies.stats()
+
+    def _remember_body(self, ident, res: Tuple[str, str, str], max_bytes: Optional[int] = None):
+        if isinstance(ident, MessageId) and (res[0] or res[1] or res[2]):
+            self._bodies.put(ident, res, max_bytes)
+            self._index_body(ident, res[2])
+
+    def _fetch_message(self, conn: ImapConnection, ident, max_bytes: Optional[int]) -> Tuple[str, str, str]:
+        uid = self._uid_for(conn, ident)
+        if uid is None:
+            return ("", "", "")
+        typ, d = conn.imap.uid('FETCH', str(uid), STRUCTURE_ITEMS)
+        if typ != 'OK' or not d or d[0] is None:
             return ("", "", "")
-        msg = email.message_from_bytes(d[0][1])
-        frm = _decode(msg.get('From'))
-        subj = _decode(msg.get('Subject'))
-        body = self._extract_body(msg)
-        return (frm, subj, body)
-
-    def mark_seen(self, uid_bytes):
-        imap = self._imap_connect()
-        imap.store(uid_bytes, '+FLAGS', '\\Seen')
-
-    def search(self, query: str, limit: int = 10) -> List[Dict]:
-        imap = self._imap_connect()
-        imap.select("INBOX")
-        typ, data = imap.search(None, f'(OR SUBJECT "{query}" FROM "{query}")')
-        if typ != 'OK' or not data:
+        frm, subj, part, parsed = self._structure_reply(d)
+        if parsed:
+            if part is None:
+                return (frm, subj, "(no readable body)")
+            typ, d = conn.imap.uid('FETCH', str(uid), f'({body_item(part, max_bytes)})')
+            return (frm, subj, self._part_body(d, part, max_bytes) if typ == 'OK' else "")
+        # BODYSTRUCTURE we couldn't read: take the whole message after all
+        typ, d = conn.imap.uid('FETCH', str(uid), '(BODY.PEEK[])')
+        raw = body_literals(d).get('') if typ == 'OK' else None
+        if raw is None:
+            return (frm, subj, "")
+        msg = email.message_from_bytes(raw)
+        return (_decode(msg.get('From')), _decode(msg.get('Subject')), self._extract_body(msg))
+
+    def _structure_reply(self, data) -> Tuple[str, str, Optional[TextPart], bool]:
+        """(from, subject, text part, parsed?) from a STRUCTURE_ITEMS reply."""
+        hdr = header_message(data)
+        structure = parse_bodystructure(data)
+        return (_decode(hdr.get('From')), _decode(hdr.get('Subject')),
+                pick_text_part(structure), structure is not None)
+
+    def _part_body(self, data, part: TextPart, max_bytes: Optional[int]) -> str:
+        raw = body_literals(data).get(part.section)
+        if raw is None:
+            return ""
+        text = decode_part(raw, part, truncated=max_bytes is not None and len(raw) >= max_bytes)
+        return self._html_to_text(text) if part.subtype == 'html' else text
+
+    def mark_seen(self, ident):
+        self._with_imap(lambda conn: self._mark_seen(conn, ident))
+
+    def _mark_seen(self, conn: ImapConnection, ident):
+        uid = self._uid_for(conn, ident)
+        if uid is None:
+            return
+        conn.imap.uid('STORE', str(uid), '+FLAGS', '\\Seen')
+        state = self._sync_state.get(conn.mailbox)
+        if state is not None:
+            with self._sync_lock:
+                state.unseen.discard(uid)
+
+    def search(self, query: str, limit: int = 10, offset: int = 0, fuzzy: bool = False) -> SummaryList:
+        """
+        Messages matching the words of `query`, best first, skipping the first `offset`.
+        Answered from the local index (subject, from, to and body; ranked, prefix
+        matching, with snippets) once INBOX is fully indexed, with no network at all;
+        before that the server searches subject and from, newest first. Offline, the
+        index answers with whatever it has. `fuzzy` (for spoken queries) adds local
+        matches that sound like or are spelled close to the query words.
+        """
+        local = self.local_search(query, limit, offset, fuzzy=fuzzy) if self._index_ready("INBOX") else None
+        if local is not None:
+            return local
+        try:
+            return self._with_imap(lambda conn: self._search(conn, query, limit, offset))
+        except (OSError, imaplib.IMAP4.error):
+            local = self.local_search(query, limit, offset, fuzzy=fuzzy)
+            if local is None:
+                raise
+            return local
+
+    def _search(self, conn: ImapConnection, query: str, limit: int, offset: int = 0) -> SummaryList:
+        self._select(conn, "INBOX")
+        uids = uid_search(conn.imap, None, f'(OR SUBJECT "{query}" FROM "{query}")')
+        if not uids:
+            return SummaryList()
+        uids = list(reversed(uids))[offset:offset + limit]
+        pairs = self._fetch_headers_for(conn, uids)
+        return self._summarize(pairs, conn.mailbox, conn.uidvalidity)
+
+    # ---------- local search index ----------
+    def local_search(self, query: str, limit: int = 10, offset: int = 0, mailbox: str = "INBOX",
+                     fuzzy: bool = False) -> Optional[SummaryList]:
+        """search() against the local index only; None when there is no index."""
+        if self._index is None:
+            return None
+        state = self._sync_state.get(mailbox)
+        return hits_to_summaries(self._index.search(query, mailbox, limit, offset, fuzzy), mailbox,
+                                 state.unseen if state is not None else None)
+
+    def _index_ready(self, mailbox: str) -> bool:
+        if self._index is None:
+            return False
+        validity = self._index.complete(mailbox)
+        state = self._sync_state.get(mailbox)
+        # a UIDVALIDITY change we know about but haven't re-indexed for makes the index stale
+        return validity is not None and (state is None or state.uidvalidity == validity)
+
+    def index_pending(self, mailbox: str = "INBOX", batch: int = INDEX_BATCH) -> int:
+        """
+        Background work for the search index: sync `mailbox`, then index the headers of up
+        to `batch` messages it doesn't have yet, newest first. Returns how many are still
+        missing; at 0 the mailbox is complete and search() stops asking the server.
+        """
+        return self._with_imap(lambda conn: self._index_pending(conn, mailbox, batch), background=True)
+
+    def _index_pending(self, conn: ImapConnection, mailbox: str, batch: int) -> int:
+        if self._index is None or self._sync(conn, mailbox) is None:
+            return 0
+        state = self._sync_state[mailbox]
+        with self._sync_lock:
+            uids = state.newest()
+        done = self._index.indexed_uids(mailbox, state.uidvalidity)
+        missing = [u for u in uids if u not in done]
+        if missing:
+            self._fetch_headers_for(conn, missing[:batch])
+        left = max(len(missing) - batch, 0)
+        if not left:
+            self._index.mark_complete(mailbox, state.uidvalidity)
+        return left
+
+    def index_body_pending(self, mailbox: str = "INBOX", newest: int = 500) -> bool:
+        """
+        Background work for the search index: fetch and index the body (its first
+        BODY_PREVIEW_BYTES) of one of the `newest` messages whose body isn't indexed yet.
+        Doesn't touch the body cache. False when there is nothing left to do.
+        """
+        return self._with_imap(lambda conn: self._index_body_pending(conn, mailbox, newest), background=True)
+
+    def _index_body_pending(self, conn: ImapConnection, mailbox: str, newest: int) -> bool:
+        state = self._sync_state.get(mailbox)
+        if self._index is None or state is None:
+            return False
+        with self._sync_lock:
+            uids = state.newest()[:newest]
+        done = self._index.indexed_uids(mailbox, state.uidvalidity, with_body=True)
+        todo = next((u for u in uids if u not in done), None)
+        if todo is None:
+            return False
+        ident = MessageId(mailbox, state.uidvalidity, todo)
+        self._index_body(ident, self._fetch_message(conn, ident, BODY_PREVIEW_BYTES)[2])
+        return True
+
+    def _index_headers(self, mailbox: str, uidvalidity: int, pairs: List[Tuple[int, HeaderFields]]):
+        rows = []
+        for uid, msg in pairs:
+            to = ", ".join(v for v in (msg.decoded('To'), msg.decoded('Cc')) if v)
+            rows.append((uid, msg.decoded('From'), to, msg.decoded('Subject'), msg.decoded('Date')))
+        try:
+            self._index.add_headers(mailbox, uidvalidity, rows)
+        except sqlite3.Error:
+            pass  # the index is only an accelerator; the listing itself already worked
+
+    def _index_body(self, ident, text: str):
+        if self._index is None or not isinstance(ident, MessageId):
+            return
+        if text == "(no readable body)":
+            text = ""
+        try:
+            # a blank body still counts as indexed, so index_body_pending() moves on
+            self._index.add_body(ident.mailbox, ident.uidvalidity, ident.uid, text or " ")
+        except sqlite3.Error:
+            pass
+
+    # ---------- paging ----------
+    def list_page(self, before: Optional[int] = None, page_size: int = 10, primary_only: bool = True,
+                  unseen_only: bool = False, query: Optional[str] = None,
+                  mailbox: str = "INBOX") -> Tuple[SummaryList, Optional[int]]:
+        """
+        One page of a listing, newest first, taken from the UIDs below `before` (None: the
+        newest). With `query` it pages through search results instead of the whole mailbox.
+        Returns the page and the `before` of the next one (None when there is no more).
+        Headers are fetched a window at a time, so older mail costs nothing until it's asked for.
+        """
+        return self._with_imap(lambda conn: self._list_page(conn, before, page_size, primary_only,
+                                                            unseen_only, query, mailbox))
+
+    def _list_page(self, conn: ImapConnection, before: Optional[int], page_size: int, primary_only: bool,
+                   unseen_only: bool, query: Optional[str], mailbox: str) -> Tuple[SummaryList, Optional[int]]:
+        if conn.mailbox != mailbox:
+            self._select(conn, mailbox)
+        candidates = self._page_candidates(conn, before, unseen_only, query)
+        window = max(page_size * 3, 40) if primary_only else page_size
+        pairs: List[Tuple[int, HeaderFields]] = []
+        scanned = 0
+        while len(pairs) < page_size and scanned < len(candidates) and scanned < PAGE_SCAN_LIMIT:
+            chunk = candidates[scanned:scanned + window]
+            scanned += len(chunk)
+            for uid, msg in self._fetch_headers_for(conn, chunk):
+                if primary_only and not _is_probably_primary(msg):
+                    continue
+                pairs.append((uid, msg))
+                if len(pairs) == page_size:
+                    break
+        if len(pairs) == page_size:
+            next_before = pairs[-1][0] if candidates[-1] < pairs[-1][0] else None
+        elif scanned < len(candidates):
+            next_before = candidates[scanned - 1]  # gave up on a long run of filtered-out mail
+        else:
+            next_before = None
+        return self._summarize(pairs, conn.mailbox, conn.uidvalidity), next_before
+
+    def _page_candidates(self, conn: ImapConnection, before: Optional[int], unseen_only: bool,
+                         query: Optional[str]) -> List[int]:
+        """UIDs below `before`, newest first: from sync state when there is some, else a UID range SEARCH."""
+        if before is not None and before <= 1:
             return []
-        uids = data[0].split()
-        uids = list(reversed(uids))[:limit]
-        pairs = self._fetch_headers_for(imap, uids)
-        return self._summarize(pairs)
+        state = self._sync_state.get(conn.mailbox)
+        if query is None and state is not None and state.uidvalidity == conn.uidvalidity:
+            with self._sync_lock:
+                uids = state.newest(unseen_only)
+            return [u for u in uids if before is None or u < before]
+        criteria = ['UID', f'1:{before - 1}'] if before is not None else []
+        if query is not None:
+            criteria.append(f'(OR SUBJECT "{query}" FROM "{query}")')
+        elif unseen_only:
+            criteria.append('UNSEEN')
+        return list(reversed(uid_search(conn.imap, None, *(criteria or ['ALL']))))
+
+    # ---------- pipelined (future-based) API ----------
+    # These queue commands on one shared connection without waiting for earlier ones,
+    # so e.g. a body fetch and a flag update cost one round trip together.
+    def submit_fetch(self, idents: List[MessageId], items: str = '(RFC822)') -> Future:
+        """UID FETCH `items` for `idents`; the Future resolves to {uid: literal}."""
+        pipe, uids = self._pipeline_for(idents)
+        if not uids:
+            return _resolved({})
+        return _then(pipe.submit_fetch(uids, items),
+                     lambda r: parse_fetch_response(r[1]) if r[0] == 'OK' else {})
+
+    def submit_store(self, idents: List[MessageId], op: str = '+FLAGS', flags: str = '(\\Seen)') -> Future:
+        """UID STORE on `idents`; the Future resolves to True if the server said OK."""
+        pipe, uids = self._pipeline_for(idents)
+        if not uids:
+            return _resolved(False)
+        return _then(pipe.submit_store(uids, op, flags), lambda r: r[0] == 'OK')
+
+    def fetch_message_async(self, ident, max_bytes: Optional[int] = None) -> Future:
+        """Future of fetch_message(ident, max_bytes)'s (from, subject, body)."""
+        hit = self._bodies.get(ident, max_bytes) if isinstance(ident, MessageId) else None
+        if hit is not None:
+            return _resolved(hit)
+        pipe, uids = self._pipeline_for([ident])
+        if not uids:
+            return _resolved(("", "", ""))
+        uid = uids[0]
+        out: Future = Future()
+        def fail(e):
+            if not out.done():
+                out.set_exception(e)
+        def got_structure(f):
+            try:
+                typ, d = f.result()
+                frm, subj, part, parsed = self._structure_reply(d) if typ == 'OK' else ("", "", None, True)
+                if parsed and part is None:
+                    out.set_result((frm, subj, "(no readable body)" if typ == 'OK' else ""))
+                    return
+                item = body_item(part, max_bytes) if part is not None else 'BODY.PEEK[]'
+                body = pipe.submit('UID FETCH', str(uid), f'({item})', untagged='FETCH', uids=[uid])
+                body.add_done_callback(lambda b: got_body(b, frm, subj, part))
+            except BaseException as e:
+                fail(e)
+        def got_body(f, frm, subj, part):
+            try:
+                typ, d = f.result()
+                if typ != 'OK':
+                    body = ""
+                elif part is not None:
+                    body = self._part_body(d, part, max_bytes)
+                else:
+                    raw = body_literals(d).get('')
+                    body = self._extract_body(email.message_from_bytes(raw)) if raw is not None else ""
+                self._remember_body(ident, (frm, subj, body), max_bytes)
+                out.set_result((frm, subj, body))
+            except BaseException as e:
+                fail(e)
+        pipe.submit('UID FETCH', str(uid), STRUCTURE_ITEMS, untagged='FETCH', uids=[uid]).add_done_callback(got_structure)
+        return out
+
+    def stream_message(self, ident, max_bytes: Optional[int] = None,
+                       chunk_bytes: int = STREAM_CHUNK_BYTES, readahead: int = 2) -> Future:
+        """
+        Future of (from, subject, sentences) where `sentences` yields the body sentence by
+        sentence while the text part is still downloading in `chunk_bytes` ranges
+        (`readahead` ranges in flight). Consume it in the caller's thread.
+        """
+        hit = self._bodies.get(ident, max_bytes) if isinstance(ident, MessageId) else None
+        if hit is not None:
+            return _resolved((hit[0], hit[1], iter_sentences([hit[2]])))
+        pipe, uids = self._pipeline_for([ident])
+        if not uids:
+            return _resolved(("", "", iter(())))
+        uid = uids[0]
+        def got_structure(reply):
+            typ, d = reply
+            if typ != 'OK':
+                return ("", "", iter(()))
+            frm, subj, part, parsed = self._structure_reply(d)
+            if part is not None:
+                pieces = self._stream_part(pipe, ident, uid, (frm, subj), part, max_bytes, chunk_bytes, readahead)
+                return (frm, subj, iter_sentences(pieces))
+            if parsed:
+                return (frm, subj, iter(["(no readable body)"]))
+            return (frm, subj, iter_sentences(self._whole_body(ident, max_bytes)))
+        return _then(pipe.submit('UID FETCH', str(uid), STRUCTURE_ITEMS, untagged='FETCH', uids=[uid]), got_structure)
+
+    def _whole_body(self, ident, max_bytes: Optional[int]) -> Iterator[str]:
+        # BODYSTRUCTURE we couldn't read; runs on first next(), i.e. in the consumer's thread
+        yield self.fetch_message(ident, max_bytes)[2]
+
+    def _stream_part(self, pipe: ImapPipeline, ident, uid: int, header: Tuple[str, str], part: TextPart,
+                     max_bytes: Optional[int], chunk_bytes: int, readahead: int) -> Iterator[str]:
+        total = part.size if max_bytes is None else min(part.size, max_bytes)
+        offsets = iter(range(0, max(total, 1), chunk_bytes))
+        in_flight = deque()
+        def submit_next():
+            off = next(offsets, None)
+            if off is not None:
+                item = f'BODY.PEEK[{part.section}]<{off}.{chunk_bytes}>'
+                in_flight.append(pipe.submit('UID FETCH', str(uid), f'({item})', untagged='FETCH', uids=[uid]))
+        for _ in range(max(1, readahead)):
+            submit_next()
+        decoder = PartDecoder(part)
+        texts: List[str] = []
+        got, failed = 0, False
+        while in_flight:
+            typ, d = in_flight.popleft().result()
+            submit_next()
+            raw = body_literals(d).get(part.section, b'') if typ == 'OK' else b''
+            failed = failed or typ != 'OK'
+            got += len(raw)
+            last = len(raw) < chunk_bytes or not in_flight
+            texts.append(decoder.feed(raw, final=last, truncated=last and got < part.size))
+            yield texts[-1]
+            if last:
+                break
+        # Read to the end of the whole part and decoded cleanly: later reads come from the
+        # body cache. A stream cut at max_bytes isn't cached; its chunk-sized ranges don't
+        # match what a max_bytes fetch_message would have returned.
+        whole = got >= part.size or (max_bytes is None and not in_flight and len(raw) < chunk_bytes)
+        if whole and not failed and not decoder.errors:
+            self._remember_body(ident, (header[0], header[1], "".join(texts)))
+
+    def mark_seen_async(self, ident) -> Future:
+        uid = ident.uid if isinstance(ident, MessageId) else int(ident)
+        mailbox = ident.mailbox if isinstance(ident, MessageId) else "INBOX"
+        def done(ok):
+            state = self._sync_state.get(mailbox)
+            if ok and state is not None:
+                with self._sync_lock:
+                    state.unseen.discard(uid)
+            return ok
+        return _then(self.submit_store([ident]), done)
+
+    def _pipeline_for(self, idents) -> Tuple[ImapPipeline, List[int]]:
+        """The shared pipeline with the idents' mailbox selected, and their still-valid UIDs."""
+        idents = list(idents)
+        mailbox = next((i.mailbox for i in idents if isinstance(i, MessageId)), "INBOX")
+        with self._activity_lock:
+            self._foreground_at = time.monotonic()
+        with self._pipeline_lock:
+            pipe = self._pipeline
+            if pipe is None or pipe.broken is not None or pipe.conn.mailbox != mailbox:
+                self._drop_pipeline()
+                conn = self._pool.acquire()
+                try:
+                    self._select(conn, mailbox)
+                except BaseException:
+                    self._pool.discard(conn)
+                    raise
+                pipe = self._pipeline = ImapPipeline(conn)
+        validity = pipe.conn.uidvalidity
+        uids = [i.uid if isinstance(i, MessageId) else int(i) for i in idents
+                if not isinstance(i, MessageId) or validity is None or i.uidvalidity == validity]
+        return pipe, uids
+
+    def _drop_pipeline(self):
+        # caller holds _pipeline_lock
+        pipe, self._pipeline = self._pipeline, None
+        if pipe is None:
+            return
+        pipe.close()
+        if pipe.broken is None:
+            self._pool.release(pipe.conn)
+        else:
+            self._pool.discard(pipe.conn)
 
     def _extract_body(self, msg) -> str:
         if msg.is_multipart():
@@ -194,14 +956,41 @@ class EmailClient:
         return re.sub('<[^<]+?>', '', html)
 
     # ---------- SMTP ----------
-    def send(self, to_email: str, subject: str, body: str):
+    def send(self, to_email: str, subject: str, body: str, message_id: Optional[str] = None):
+        """
+        Send a plain-text mail over the warm SMTP session (see SmtpSession). `message_id`
+        keeps the Message-ID of a message that is sent again (the Outbox retrying it).
+        """
+        self._smtp.send_message(self._compose(SendJob(to_email, subject, body, message_id)))
+
+    def send_bulk(self, jobs: Iterable[Tuple]) -> List[Delivery]:
+        """
+        Send many messages ((to, subject, body[, message_id]) tuples or SendJobs) on one
+        SMTP session, pipelined when the server allows it, and return one Delivery per
+        recipient; Delivery.job is the message's position in `jobs`. Refusals are
+        reported, not raised; only failing to connect or log in raises.
+        """
+        msgs = [self._compose(SendJob(*job)) for job in jobs]
+        return self._smtp.send_batch(msgs) if msgs else []
+
+    def _compose(self, job: SendJob) -> EmailMessage:
         msg = EmailMessage()
         msg["From"] = self.user
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.set_content(body)
+        msg["To"] = job.to
+        msg["Subject"] = job.subject
+        if job.message_id:
+            msg["Message-ID"] = job.message_id
+        msg.set_content(job.body)
+        return msg
 
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=context) as server:
+    def _open_smtp(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=ssl.create_default_context(), timeout=30)
+        else:
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+        try:
             server.login(self.user, self.password)
-            server.send_message(msg)
+        except BaseException:
+            server.close()
+            raise
+        return server
@@ -0,0 +1,1270 @@
+import argparse, base64, random, re, select, socket, socketserver, threading, time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from email.utils import format_datetime
+from queue import Queue
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# A local IMAP4rev1 + SMTP stand-in, so EmailClient can run without a mail account:
+# to try the app offline, and as a reproducible target for benchmarks/.
+#
+# Everything runs in-process on 127.0.0.1. The IMAP side covers what the clients send:
+# UID SEARCH/FETCH/STORE, CONDSTORE and QRESYNC (CHANGEDSINCE, VANISHED), IDLE,
+# STATUS and literals. The SMTP side speaks ESMTP with PIPELINING and AUTH PLAIN/LOGIN.
+# A Link adds round-trip time, a bandwidth cap and random failures, all seeded so a
+# run repeats exactly. Both servers count connections, commands, round trips, bytes
+# and their own CPU time, so a benchmark can tell the client's cost from theirs.
+
+_CRLF = b"\r\n"
+_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# ---------- generated mail ----------
+_FIRST = ["Sean", "Kathryn", "Alex", "Maria", "John", "Priya", "Chen", "Fatima", "Olu", "Grace",
+          "Tom", "Aisha", "Luis", "Emma", "Raji", "Noah", "Zara", "Ivan", "Mei", "Sam"]
+_LAST = ["Okafor", "Smith", "Garcia", "Chen", "Patel", "Kim", "Novak", "Rossi", "Adeyemi", "Brown",
+         "Silva", "Khan"]
+_TOPICS = ["invoice", "meeting", "project update", "lunch", "quarterly report", "budget", "trip",
+           "contract", "schedule", "code review", "birthday", "deadline", "proposal", "results",
+           "holiday plans", "doctor appointment", "rent", "course notes"]
+_BRANDS = [("Daily Digest", "news@digest.example"), ("ShopMart", "deals@shopmart.example"),
+           ("Tech Weekly", "hello@techweekly.example"), ("City Library", "events@library.example"),
+           ("Travel Club", "offers@travelclub.example")]
+_SERVICES = [("Bank", "alerts@bank.example"), ("Airline", "noreply@airline.example"),
+             ("Cloud Storage", "noreply@cloud.example"), ("Phone Company", "billing@phone.example")]
+_WORDS = ("the of and to a in is it you that he was for on are with as his they be at one have this from "
+          "or had by hot word but what some we can out other were all there when up use your how said an "
+          "each she which do their time if will way about many then them write would like so these her "
+          "long make thing see him two has look more day could go come did number sound no most people my "
+          "over know water than call first who may down side been now find any new work part take get "
+          "place made live where after back little only round man year came show every good me give our "
+          "under name very through just form sentence great think say help low line differ turn cause "
+          "much mean before move right boy old too same tell does set three want air well also play small "
+          "end put home read hand port large spell add even land here must big high such follow act why "
+          "ask men change went light kind off need house picture try us again animal point mother world "
+          "near build self earth father").split()
+_RECEIVED = ("from mail-out.example.net (mail-out.example.net [203.0.113.7]) by mx.fake.example with ESMTPS "
+             "id %s for <%s>; %s")
+_DKIM = ("v=1; a=rsa-sha256; c=relaxed/relaxed; d=example.net; s=s1; h=from:to:subject:date:message-id; "
+         "bh=%s; b=%s")
+
+
+class MailMix(NamedTuple):
+    """Share of each kind of generated message (the rest is personal mail)."""
+    newsletters: float = 0.35  # each carries one of the bulk signals _is_probably_primary checks
+    automated: float = 0.10    # receipts/notifications: Auto-Submitted or a transactional X-Mailer
+    unseen: float = 0.15
+    html: float = 0.6          # of newsletters and automated mail: multipart/alternative with HTML
+    attachments: float = 0.05  # of personal mail: with a PDF attached
+    body_bytes: int = 1500     # typical text size; each message gets from half to double this
+    attachment_bytes: int = 40000
+
+
+class FakeMessage:
+    """
+    One message in a FakeMailbox. Generated messages keep only their headers and a
+    seed; the body is rebuilt on demand, so a 100k mailbox fits in memory.
+    """
+    __slots__ = ("uid", "flags", "modseq", "date", "kind", "sender", "to", "subject", "extra", "seed",
+                 "body_len", "html", "attachment", "_raw")
+
+    def __init__(self, uid: int, sender: str, to: str, subject: str, date: datetime, kind: str = "personal",
+                 flags=(), extra: Tuple[Tuple[str, str], ...] = (), seed: int = 0, body_len: int = 0,
+                 html: bool = False, attachment: int = 0, raw: Optional[bytes] = None, modseq: int = 1):
+        self.uid, self.sender, self.to, self.subject, self.date, self.kind = uid, sender, to, subject, date, kind
+        self.flags = set(flags)
+        self.extra, self.seed, self.body_len, self.html, self.attachment = extra, seed, body_len, html, attachment
+        self._raw = raw
+        self.modseq = modseq
+
+    def header_lines(self) -> List[Tuple[str, str]]:
+        if self._raw is not None:
+            return list(message_from_bytes(self._header_block()).items())
+        stamp = format_datetime(self.date)
+        fake_hash = "%040x" % (self.seed * 2654435761 + self.uid)
+        return [("Received", _RECEIVED % (fake_hash[:12], self.to, stamp)),
+                ("DKIM-Signature", _DKIM % (fake_hash, fake_hash * 8)),
+                ("From", self.sender), ("To", self.to), ("Subject", self.subject), ("Date", stamp),
+                ("Message-ID", f"<{self.uid}.{self.seed}@fake.example>"), *self.extra]
+
+    def _header_block(self) -> bytes:
+        raw = self._raw
+        end = raw.find(b"\r\n\r\n")
+        return raw[:end + 4] if end >= 0 else raw
+
+    def header_fields(self, names) -> bytes:
+        """BODY[HEADER.FIELDS (names)]: the matching header lines and a blank line."""
+        names = {n.lower() for n in names}
+        out = [f"{k}: {v}\r\n" for k, v in self.header_lines() if k.lower() in names]
+        return "".join(out).encode("utf-8", "replace") + _CRLF
+
+    def raw(self) -> bytes:
+        if self._raw is not None:
+            return self._raw
+        rng = random.Random(self.seed * 1000003 + self.uid)
+        text = _paragraphs(rng, self.body_len)
+        body = EmailMessage()
+        body.set_content(text)
+        if self.html:
+            body.add_alternative("<html><body>%s</body></html>" % "".join(
+                f"<p>{p}</p>" for p in text.split("\n\n")), subtype="html")
+        if self.attachment:
+            body.add_attachment(b"%PDF-1.4\n" + rng.randbytes(self.attachment), maintype="application",
+                                subtype="pdf", filename="document.pdf")
+        head = "".join(f"{k}: {v}\r\n" for k, v in self.header_lines()).encode("utf-8", "replace")
+        return head + body.as_bytes(policy=policy.SMTP)
+
+    @property
+    def unseen(self) -> bool:
+        return "\\Seen" not in self.flags
+
+
+def _paragraphs(rng: random.Random, size: int) -> str:
+    paras, total = [], 0
+    while total < size:
+        sentences = []
+        for _ in range(rng.randint(2, 5)):
+            words = rng.choices(_WORDS, k=rng.randint(6, 16))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paras.append(" ".join(sentences))
+        total += len(paras[-1]) + 2
+    return "\n\n".join(paras)
+
+
+def generate_mailbox(count: int, mix: MailMix = MailMix(), seed: int = 0, uidvalidity: int = 1,
+                     user: str = "me@fake.example", spacing: timedelta = timedelta(minutes=10),
+                     now: Optional[datetime] = None) -> "FakeMailbox":
+    """
+    `count` messages, newest last (highest UID), `spacing` apart up to `now`. The same
+    arguments always give the same mailbox (dates aside, when `now` is left out).
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc).replace(microsecond=0)
+    mb = FakeMailbox(uidvalidity=uidvalidity)
+    for i in range(count):
+        r = rng.random()
+        date = now - spacing * (count - 1 - i)
+        body_len = int(mix.body_bytes * rng.uniform(0.5, 2.0))
+        html = attachment = False
+        topic = rng.choice(_TOPICS)
+        if r < mix.newsletters:
+            kind = "newsletter"
+            brand, addr = rng.choice(_BRANDS)
+            sender, subject = f"{brand} <{addr}>", f"{brand}: {topic} and {rng.choice(_TOPICS)} this week"
+            signal = rng.randrange(4)
+            extra = ((("List-Unsubscribe", f"<mailto:unsubscribe@{addr.split('@')[1]}>"),
+                      ("List-Id", f"<{brand.lower().replace(' ', '-')}.list>")),
+                     (("Precedence", "bulk"),),
+                     (("List-Unsubscribe", f"<https://{addr.split('@')[1]}/u?id={i}>"),),
+                     (("X-Mailer", "Mailchimp Mailer"),))[signal]
+            html = rng.random() < mix.html
+        elif r < mix.newsletters + mix.automated:
+            kind = "automated"
+            service, addr = rng.choice(_SERVICES)
+            sender, subject = f"{service} <{addr}>", f"Your {service.lower()} receipt #{rng.randint(10000, 99999)}"
+            extra = (("Auto-Submitted", "auto-generated"),) if rng.random() < 0.5 else (("X-Mailer", "Postmark"),)
+            html = rng.random() < mix.html
+        else:
+            kind = "personal"
+            first, last = rng.choice(_FIRST), rng.choice(_LAST)
+            sender = f"{first} {last} <{first.lower()}.{last.lower()}@example.com>"
+            subject = rng.choice(["%s", "Re: %s", "About the %s", "%s tomorrow?", "Fwd: %s"]) % topic
+            extra = (("Cc", f"{rng.choice(_FIRST).lower()}@example.com"),) if rng.random() < 0.2 else ()
+            attachment = mix.attachment_bytes if rng.random() < mix.attachments else 0
+        flags = () if rng.random() < mix.unseen else ("\\Seen",)
+        mb.add(FakeMessage(mb.next_uid, sender, user, subject, date, kind, flags, extra, seed, body_len, html,
+                           attachment))
+    return mb
+
+
+# ---------- mailbox ----------
+class FakeMailbox:
+    """
+    Messages in UID order plus a change log of (modseq, uid, kind) for CONDSTORE,
+    QRESYNC and IDLE; kind is "new", "flags" or "expunge". Messages added with add()
+    (the initial contents) share modseq 1 and aren't logged.
+    """
+
+    def __init__(self, uidvalidity: int = 1, name: str = "INBOX"):
+        self.name = name
+        self.uidvalidity = uidvalidity
+        self.messages: List[FakeMessage] = []
+        self.uids: List[int] = []
+        self.next_uid = 1
+        self.modseq = 1
+        self.log: List[Tuple[int, int, str]] = []
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self._raw_cache: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def add(self, msg: FakeMessage):
+        with self.lock:
+            msg.uid = self.next_uid
+            self.next_uid += 1
+            self.messages.append(msg)
+            self.uids.append(msg.uid)
+
+    def append(self, raw: bytes, flags=(), date: Optional[datetime] = None) -> FakeMessage:
+        """Deliver new mail (shows up in IDLE, NOOP and CHANGEDSINCE)."""
+        hdr = message_from_bytes(raw.split(b"\r\n\r\n", 1)[0] if b"\r\n\r\n" in raw else raw)
+        with self.lock:
+            self.modseq += 1
+            msg = FakeMessage(self.next_uid, str(hdr.get("From", "")), str(hdr.get("To", "")),
+                              str(hdr.get("Subject", "")), date or datetime.now(timezone.utc), "personal",
+                              flags, raw=raw, modseq=self.modseq)
+            self.add(msg)
+            self.log.append((self.modseq, msg.uid, "new"))
+            self.changed.notify_all()
+        return msg
+
+    def find(self, uid: int) -> Tuple[int, Optional[FakeMessage]]:
+        """(sequence number, message) for `uid`, or (0, None)."""
+        i = bisect_left(self.uids, uid)
+        if i < len(self.uids) and self.uids[i] == uid:
+            return i + 1, self.messages[i]
+        return 0, None
+
+    def set_flags(self, msg: FakeMessage, add=(), remove=(), replace=None) -> bool:
+        with self.lock:
+            before = set(msg.flags)
+            if replace is not None:
+                msg.flags = set(replace)
+            msg.flags |= set(add)
+            msg.flags -= set(remove)
+            if msg.flags == before:
+                return False
+            self.modseq += 1
+            msg.modseq = self.modseq
+            self.log.append((self.modseq, msg.uid, "flags"))
+            self.changed.notify_all()
+            return True
+
+    def expunge(self, uids) -> List[int]:
+        gone = set(uids)
+        with self.lock:
+            removed = [u for u in self.uids if u in gone]
+            if not removed:
+                return []
+            self.messages = [m for m in self.messages if m.uid not in gone]
+            self.uids = [m.uid for m in self.messages]
+            for uid in removed:
+                self.modseq += 1
+                self.log.append((self.modseq, uid, "expunge"))
+                self._raw_cache.pop(uid, None)
+            self.changed.notify_all()
+            return removed
+
+    def changes_since(self, modseq: int) -> List[Tuple[int, int, str]]:
+        with self.lock:
+            return self.log[bisect_right(self.log, (modseq, float("inf"), "")):]
+
+    def raw(self, msg: FakeMessage) -> bytes:
+        """Full message bytes; the last few built are kept (a read asks for structure, then a part)."""
+        with self.lock:
+            raw = self._raw_cache.get(msg.uid)
+            if raw is not None:
+                self._raw_cache.move_to_end(msg.uid)
+                return raw
+        raw = msg.raw()
+        with self.lock:
+            self._raw_cache[msg.uid] = raw
+            while len(self._raw_cache) > 64:
+                self._raw_cache.popitem(last=False)
+        return raw
+
+
+# ---------- network ----------
+class Link(NamedTuple):
+    """How the connection to a fake server behaves."""
+    rtt: float = 0.0                  # seconds added before every reply reaches the client
+    bandwidth: Optional[float] = None  # bytes per second from server to client; None = unlimited
+    drop_rate: float = 0.0            # chance that a command gets the connection closed instead of a reply
+    error_rate: float = 0.0           # chance of a temporary failure reply (IMAP NO, SMTP 451)
+    seed: int = 0
+
+
+class ServerStats:
+    """Counters for one fake server; snapshot() reads them, reset() zeroes them."""
+    _FIELDS = ("connections", "commands", "round_trips", "bytes_in", "bytes_out", "cpu_seconds", "drops",
+               "errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def add(self, **counts):
+        with self._lock:
+            for k, v in counts.items():
+                self._values[k] += v
+
+    def reset(self):
+        with self._lock:
+            self._values = dict.fromkeys(self._FIELDS, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class _Shaper:
+    """Writes to a socket from its own thread, each chunk delayed per the Link."""
+
+    def __init__(self, sock: socket.socket, link: Link):
+        self.sock = sock
+        self.link = link
+        self._free = 0.0
+        self._queue: Queue = Queue()
+        threading.Thread(target=self._run, daemon=True, name="fake-link").start()
+
+    def send(self, data: bytes):
+        now = time.monotonic()
+        start = max(now, self._free)
+        self._free = start + (len(data) / self.link.bandwidth if self.link.bandwidth else 0.0)
+        self._queue.put((self._free + self.link.rtt, data))
+
+    def close(self):
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            due, data = item
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                return
+
+
+class _Session(socketserver.BaseRequestHandler):
+    """Line I/O, link shaping, failure injection and accounting shared by both fake servers."""
+
+    def setup(self):
+        self.stats: ServerStats = self.server.stats
+        self.link: Link = self.server.link
+        self._buf = bytearray()
+        self._out: List[bytes] = []
+        self._wrote = False
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._shaper = _Shaper(self.request, self.link) if (self.link.rtt or self.link.bandwidth) else None
+        self._cpu = time.thread_time()
+        self.stats.add(connections=1)
+
+    def finish(self):
+        try:
+            self.flush()
+        except OSError:
+            pass
+        self._charge()
+        if self._shaper is not None:
+            self._shaper.close()
+
+    def _charge(self):
+        now = time.thread_time()
+        self.stats.add(cpu_seconds=now - self._cpu)
+        self._cpu = now
+
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8", "replace")
+        self.stats.add(bytes_out=len(data))
+        self._out.append(data)
+
+    def flush(self):
+        """
+        Write out the replies so far. Called before waiting for input, so the replies to
+        pipelined commands leave together, the way real servers answer them.
+        """
+        if not self._out:
+            return
+        data, self._out = b"".join(self._out), []
+        self._wrote = True
+        if self._shaper is not None:
+            self._shaper.send(data)
+        else:
+            self.request.sendall(data)
+
+    def _fill(self, timeout: Optional[float] = None) -> bool:
+        self.flush()
+        if self._wrote:
+            # the client has everything it asked for and must answer before we go on
+            self._wrote = False
+            self.stats.add(round_trips=1)
+        self._charge()
+        if timeout is not None and not select.select([self.request], [], [], timeout)[0]:
+            self._cpu = time.thread_time()
+            return False
+        try:
+            data = self.request.recv(65536)
+        except OSError:
+            data = b""
+        self._cpu = time.thread_time()
+        if not data:
+            raise EOFError
+        self.stats.add(bytes_in=len(data))
+        self._buf += data
+        return True
+
+    def readline(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """The next line without its CRLF; None on timeout."""
+        while True:
+            i = self._buf.find(b"\n")
+            if i >= 0:
+                line = bytes(self._buf[:i + 1])
+                del self._buf[:i + 1]
+                return line.rstrip(b"\r\n")
+            if not self._fill(timeout):
+                return None
+
+    def read(self, n: int) -> bytes:
+        while len(self._buf) < n:
+            self._fill()
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+    def fault(self) -> Optional[str]:
+        """Roll the Link's dice for one command: "drop", "error" or None."""
+        if not (self.link.drop_rate or self.link.error_rate):
+            return None
+        roll = self.server.roll()
+        if roll < self.link.drop_rate:
+            self.stats.add(drops=1)
+            return "drop"
+        if roll < self.link.drop_rate + self.link.error_rate:
+            self.stats.add(errors=1)
+            return "error"
+        return None
+
+    def drop(self):
+        self._out = []
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def handle(self):
+        try:
+            self.serve()
+        except (EOFError, OSError):
+            pass
+
+
+class _FakeServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, handler, link: Link):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.link = link
+        self.stats = ServerStats()
+        self._rng = random.Random(link.seed)
+        self._rng_lock = threading.Lock()
+
+    def roll(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> int:
+        threading.Thread(target=self.serve_forever, daemon=True, name=type(self).__name__).start()
+        return self.port
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# ---------- IMAP ----------
+def _parse(s: str, i: int = 0) -> Tuple[list, int]:
+    """IMAP arguments as nested lists of strings; a [section] stays inside its atom."""
+    out: list = []
+    n = len(s)
+    while i < n:
+        c = s[i]
+        if c == " ":
+            i += 1
+        elif c == "(":
+            sub, i = _parse(s, i + 1)
+            out.append(sub)
+        elif c == ")":
+            return out, i + 1
+        elif c == '"':
+            j, buf = i + 1, []
+            while j < n and s[j] != '"':
+                if s[j] == "\\":
+                    j += 1
+                buf.append(s[j])
+                j += 1
+            out.append("".join(buf))
+            i = j + 1
+        else:
+            j, depth = i, 0
+            while j < n and (depth or s[j] not in ' ()"'):
+                depth += (s[j] == "[") - (s[j] == "]")
+                j += 1
+            out.append(s[i:j])
+            i = j
+    return out, i
+
+
+def _ranges(seqset: str, largest: int) -> List[Tuple[int, int]]:
+    out = []
+    for part in seqset.split(","):
+        a, _, b = part.partition(":")
+        lo = largest if a == "*" else int(a)
+        hi = lo if not b else (largest if b == "*" else int(b))
+        out.append((min(lo, hi), max(lo, hi)))
+    return out
+
+
+def _imap_date(s: str) -> datetime:
+    day, mon, year = s.split("-")
+    return datetime(int(year), _MONTHS.index(mon.capitalize()) + 1, int(day), tzinfo=timezone.utc)
+
+
+def _quote(s: str) -> str:
+    return '"%s"' % s.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _section(raw: bytes, section: str) -> bytes:
+    """BODY[section] of a full message."""
+    sec = section.upper()
+    head_end = raw.find(b"\r\n\r\n")
+    head, text = (raw[:head_end + 4], raw[head_end + 4:]) if head_end >= 0 else (raw, b"")
+    if sec == "":
+        return raw
+    if sec == "HEADER":
+        return head
+    if sec == "TEXT":
+        return text
+    if sec.startswith("HEADER.FIELDS"):
+        names = {n.lower() for n in re.findall(r"[\w-]+", section.split(" ", 1)[1])}
+        keep, out = False, []
+        for line in head.split(b"\r\n"):
+            if line[:1] in (b" ", b"\t"):
+                if keep:
+                    out.append(line + _CRLF)
+                continue
+            keep = line.split(b":", 1)[0].decode("ascii", "replace").lower() in names
+            if keep:
+                out.append(line + _CRLF)
+        return b"".join(out) + _CRLF
+    part = message_from_bytes(raw)
+    for n in section.split("."):
+        if part.is_multipart():
+            subs = part.get_payload()
+            if not n.isdigit() or not 0 < int(n) <= len(subs):
+                return b""
+            part = subs[int(n) - 1]
+        elif n != "1":
+            return b""
+    payload = part.get_payload(decode=False)
+    if isinstance(payload, list):
+        return b""
+    return payload.encode("utf-8", "surrogateescape").replace(b"\r\n", b"\n").replace(b"\n", _CRLF)
+
+
+def _bodystructure(part) -> str:
+    if part.is_multipart():
+        subs = "".join(_bodystructure(p) for p in part.get_payload())
+        return f'({subs} "{part.get_content_subtype().upper()}")'
+    main, sub = part.get_content_maintype(), part.get_content_subtype()
+    params = (part.get_params() or [])[1:]
+    ptxt = "(" + " ".join(f'"{k.upper()}" {_quote(v)}' for k, v in params) + ")" if params else "NIL"
+    enc = (part.get("Content-Transfer-Encoding") or "7bit").upper()
+    payload = part.get_payload(decode=False)
+    body = payload.encode("utf-8", "surrogateescape").replace(b"\r\n", b"\n").replace(b"\n", _CRLF) \
+        if isinstance(payload, str) else b""
+    out = f'("{main.upper()}" "{sub.upper()}" {ptxt} NIL NIL "{enc}" {len(body)}'
+    if main == "text":
+        out += " %d" % body.count(b"\n")
+    disp = part.get_content_disposition()
+    fname = part.get_filename()
+    dtxt = (f'("{disp.upper()}" ("FILENAME" {_quote(fname)}))' if fname else f'("{disp.upper()}" NIL)') \
+        if disp else "NIL"
+    return out + f" NIL {dtxt} NIL NIL)"
+
+
+_FETCH_ITEM_RE = re.compile(r"BODY(\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?", re.I)
+
+
+class _ImapSession(_Session):
+    def serve(self):
+        srv: FakeImapServer = self.server
+        self.selected: Optional[FakeMailbox] = None
+        self.logged_in = False
+        self.qresync = False
+        self.view: List[int] = []   # UIDs this session has been told about, in sequence order
+        self.seen_modseq = 0
+        self.send(f"* OK [CAPABILITY {' '.join(srv.capabilities())}] fake IMAP4rev1 ready\r\n")
+        while True:
+            line = self.readline()
+            # client literals: "... {n}" then n bytes, then the rest of the command
+            while True:
+                m = re.search(rb"\{(\d+)(\+?)\}$", line)
+                if not m:
+                    break
+                if not m.group(2):
+                    self.send("+ go ahead\r\n")
+                data = self.read(int(m.group(1)))
+                line = line[:m.start()] + _quote(data.decode("utf-8", "replace")).encode() + self.readline()
+            self.stats.add(commands=1)
+            text = line.decode("utf-8", "replace")
+            tag, _, rest = text.partition(" ")
+            name, _, args = rest.partition(" ")
+            name = name.upper()
+            uid = name == "UID"
+            if uid:
+                name, _, args = args.partition(" ")
+                name = name.upper()
+            fault = self.fault() if name not in ("LOGOUT", "CAPABILITY") else None
+            if fault == "drop":
+                self.drop()
+                return
+            if fault == "error":
+                self.send(f"{tag} NO [UNAVAILABLE] temporary failure (simulated)\r\n")
+                continue
+            handler = getattr(self, "cmd_" + name.lower(), None)
+            if handler is None:
+                self.send(f"{tag} BAD unknown command {name}\r\n")
+                continue
+            if not self.logged_in and name not in ("LOGIN", "CAPABILITY", "NOOP", "LOGOUT"):
+                self.send(f"{tag} NO log in first\r\n")
+                continue
+            try:
+                if handler(tag, args, uid) is False:
+                    return
+            except (EOFError, OSError):
+                raise
+            except Exception as e:
+                self.send(f"{tag} BAD {type(e).__name__}: {e}\r\n")
+
+    # ----- any state -----
+    def cmd_capability(self, tag, args, uid):
+        self.send(f"* CAPABILITY {' '.join(self.server.capabilities())}\r\n{tag} OK done\r\n")
+
+    def cmd_noop(self, tag, args, uid):
+        self._updates()
+        self.send(f"{tag} OK done\r\n")
+
+    cmd_check = cmd_noop
+
+    def cmd_logout(self, tag, args, uid):
+        self.send(f"* BYE logging out\r\n{tag} OK done\r\n")
+        return False
+
+    def cmd_login(self, tag, args, uid):
+        user, password = (_parse(args)[0] + ["", ""])[:2]
+        srv: FakeImapServer = self.server
+        if srv.user is not None and (user != srv.user or password != srv.password):
+            self.send(f"{tag} NO [AUTHENTICATIONFAILED] invalid credentials\r\n")
+            return
+        self.logged_in = True
+        self.send(f"{tag} OK [CAPABILITY {' '.join(srv.capabilities())}] logged in\r\n")
+
+    def cmd_enable(self, tag, args, uid):
+        caps = self.server.capabilities()
+        on = [c for c in args.upper().split() if c in caps and c in ("CONDSTORE", "QRESYNC")]
+        self.qresync = self.qresync or "QRESYNC" in on
+        self.send(f"* ENABLED {' '.join(on)}\r\n{tag} OK done\r\n")
+
+    def cmd_list(self, tag, args, uid):
+        self.send(f'* LIST (\\HasNoChildren) "/" "INBOX"\r\n{tag} OK done\r\n')
+
+    cmd_lsub = cmd_list
+
+    def cmd_status(self, tag, args, uid):
+        parsed = _parse(args)[0]
+        mb = self.server.mailbox
+        if str(parsed[0]).upper() != mb.name:
+            self.send(f"{tag} NO no such mailbox\r\n")
+            return
+        with mb.lock:
+            values = {"MESSAGES": len(mb.messages), "UNSEEN": sum(m.unseen for m in mb.messages),
+                      "UIDNEXT": mb.next_uid, "UIDVALIDITY": mb.uidvalidity, "RECENT": 0,
+                      "HIGHESTMODSEQ": mb.modseq}
+        items = [i.upper() for i in (parsed[1] if len(parsed) > 1 else [])]
+        got = " ".join(f"{i} {values[i]}" for i in items if i in values)
+        self.send(f"* STATUS {mb.name} ({got})\r\n{tag} OK done\r\n")
+
+    def cmd_select(self, tag, args, uid, readonly=False):
+        parsed = _parse(args)[0]
+        mb = self.server.mailbox
+        if not parsed or str(parsed[0]).upper() != mb.name:
+            self.selected = None
+            self.send(f"{tag} NO no such mailbox\r\n")
+            return
+        self.selected = mb
+        with mb.lock:
+            self.view = list(mb.uids)
+            self.seen_modseq = mb.modseq
+            unseen = next((i for i, m in enumerate(mb.messages, 1) if m.unseen), 0)
+            out = ["* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)\r\n",
+                   f"* {len(mb.messages)} EXISTS\r\n", "* 0 RECENT\r\n",
+                   f"* OK [UIDVALIDITY {mb.uidvalidity}] UIDs valid\r\n",
+                   f"* OK [UIDNEXT {mb.next_uid}] next UID\r\n"]
+            if unseen:
+                out.append(f"* OK [UNSEEN {unseen}] first unseen\r\n")
+            if "CONDSTORE" in self.server.capabilities():
+                out.append(f"* OK [HIGHESTMODSEQ {mb.modseq}] modseq\r\n")
+        out.append(f"{tag} OK [{'READ-ONLY' if readonly else 'READ-WRITE'}] selected\r\n")
+        self.send("".join(out))
+
+    def cmd_examine(self, tag, args, uid):
+        self.cmd_select(tag, args, uid, readonly=True)
+
+    # ----- selected state -----
+    def _need_selected(self, tag) -> bool:
+        if self.selected is None:
+            self.send(f"{tag} BAD no mailbox selected\r\n")
+            return False
+        return True
+
+    def cmd_close(self, tag, args, uid):
+        self.selected = None
+        self.send(f"{tag} OK closed\r\n")
+
+    cmd_unselect = cmd_close
+
+    def cmd_expunge(self, tag, args, uid):
+        if not self._need_selected(tag):
+            return
+        mb = self.selected
+        mb.expunge([m.uid for m in mb.messages if "\\Deleted" in m.flags])
+        self._updates()
+        self.send(f"{tag} OK expunged\r\n")
+
+    def _resolve(self, seqset: str, uid: bool) -> List[Tuple[int, FakeMessage]]:
+        mb = self.selected
+        with mb.lock:
+            uids, msgs = mb.uids, mb.messages
+            if not msgs:
+                return []
+            picked = set()
+            if uid:
+                for lo, hi in _ranges(seqset, uids[-1]):
+                    picked.update(range(bisect_left(uids, lo), bisect_right(uids, hi)))
+            else:
+                for lo, hi in _ranges(seqset, len(msgs)):
+                    picked.update(range(max(lo, 1) - 1, min(hi, len(msgs))))
+            return [(i + 1, msgs[i]) for i in sorted(picked)]
+
+    def cmd_search(self, tag, args, uid):
+        if not self._need_selected(tag):
+            return
+        tokens = _parse(args)[0]
+        if tokens and str(tokens[0]).upper() == "CHARSET":
+            tokens = tokens[2:]
+        if tokens and isinstance(tokens[0], str) and tokens[0].upper() == "UID" and len(tokens) > 1:
+            candidates = self._resolve(tokens[1], True)   # the usual "UID n:*" needs no full scan
+            tokens = tokens[2:]
+        else:
+            with self.selected.lock:
+                candidates = list(enumerate(self.selected.messages, 1))
+        keys = _SearchProgram(tokens, self.selected)
+        hits = [(m.uid if uid else seq) for seq, m in candidates if keys.match(seq, m)]
+        self.send(f"* SEARCH{''.join(' %d' % h for h in hits)}\r\n{tag} OK search done\r\n")
+
+    def cmd_fetch(self, tag, args, uid):
+        if not self._need_selected(tag):
+            return
+        parsed = _parse(args)[0]
+        seqset, items = parsed[0], parsed[1] if len(parsed) > 1 else []
+        items = items if isinstance(items, list) else [items]
+        mods = parsed[2] if len(parsed) > 2 and isinstance(parsed[2], list) else []
+        names = [str(i).upper() for i in items]
+        names = {"ALL": ["FLAGS", "INTERNALDATE", "RFC822.SIZE"], "FAST": ["FLAGS", "INTERNALDATE", "RFC822.SIZE"],
+                 "FULL": ["FLAGS", "INTERNALDATE", "RFC822.SIZE", "BODYSTRUCTURE"]}.get(
+            names[0] if len(names) == 1 else "", names)
+        mb = self.selected
+        since = None
+        modnames = [str(m).upper() for m in mods]
+        if "CHANGEDSINCE" in modnames:
+            since = int(modnames[modnames.index("CHANGEDSINCE") + 1])
+        out = []
+        targets = self._resolve(seqset, uid)
+        if since is not None:
+            if "VANISHED" in modnames and uid and self.qresync:
+                gone = sorted({u for ms, u, kind in mb.changes_since(since) if kind == "expunge"})
+                if gone:
+                    out.append(b"* VANISHED (EARLIER) %s\r\n" % ",".join(map(str, gone)).encode())
+            targets = [(seq, m) for seq, m in targets if m.modseq > since]
+        with_modseq = since is not None or "MODSEQ" in names
+        for seq, m in targets:
+            parts = []
+            if uid or "UID" in names:
+                parts.append(b"UID %d" % m.uid)
+            literals = []
+            for name in names:
+                if name == "FLAGS":
+                    parts.append(("FLAGS (%s)" % " ".join(sorted(m.flags))).encode())
+                elif name == "INTERNALDATE":
+                    d = m.date
+                    parts.append(f'INTERNALDATE "{d.day:02d}-{_MONTHS[d.month - 1]}-{d.year} '
+                                 f'{d:%H:%M:%S} +0000"'.encode())
+                elif name in ("RFC822.SIZE",):
+                    parts.append(b"RFC822.SIZE %d" % len(mb.raw(m)))
+                elif name == "BODYSTRUCTURE" or name == "BODY":
+                    parts.append(name.encode() + b" " + _bodystructure(message_from_bytes(mb.raw(m))).encode())
+                elif name in ("RFC822", "RFC822.HEADER", "RFC822.TEXT"):
+                    raw = mb.raw(m)
+                    literals.append((name, _section(raw, {"RFC822": "", "RFC822.HEADER": "HEADER",
+                                                          "RFC822.TEXT": "TEXT"}[name])))
+                    if name != "RFC822.HEADER":
+                        mb.set_flags(m, add=("\\Seen",))
+                elif name.startswith("BODY"):
+                    mt = _FETCH_ITEM_RE.match(str(items[names.index(name)]))
+                    if not mt:
+                        raise ValueError(f"bad fetch item {name}")
+                    section = mt.group(2)
+                    if section.upper().startswith("HEADER.FIELDS") and not section.upper().startswith(
+                            "HEADER.FIELDS.NOT"):
+                        data = m.header_fields(re.findall(r"[\w-]+", section.split(" ", 1)[1]))
+                    else:
+                        data = _section(mb.raw(m), section)
+                    label = f"BODY[{section}]"
+                    if mt.group(3) is not None:
+                        start, count = int(mt.group(3)), int(mt.group(4))
+                        data = data[start:start + count]
+                        label += f"<{start}>"
+                    literals.append((label, data))
+                    if not mt.group(1):
+                        mb.set_flags(m, add=("\\Seen",))
+            if with_modseq:
+                parts.append(b"MODSEQ (%d)" % m.modseq)
+            body = b" ".join(parts)
+            for label, data in literals:
+                body += (b" " if body else b"") + label.encode() + b" {%d}\r\n" % len(data) + data
+            out.append(b"* %d FETCH (%s)\r\n" % (seq, body))
+        out.append(f"{tag} OK fetch done\r\n".encode())
+        self.send(b"".join(out))
+
+    def cmd_store(self, tag, args, uid):
+        if not self._need_selected(tag):
+            return
+        parsed = _parse(args)[0]
+        seqset, rest = parsed[0], parsed[1:]
+        if rest and isinstance(rest[0], list):   # (UNCHANGEDSINCE n): accepted, not enforced
+            rest = rest[1:]
+        op = str(rest[0]).upper()
+        flags = rest[1] if isinstance(rest[1], list) else rest[1:]
+        silent = op.endswith(".SILENT")
+        mb = self.selected
+        out = []
+        for seq, m in self._resolve(seqset, uid):
+            if op.startswith("+"):
+                mb.set_flags(m, add=flags)
+            elif op.startswith("-"):
+                mb.set_flags(m, remove=flags)
+            else:
+                mb.set_flags(m, replace=flags)
+            if not silent:
+                modseq = f" MODSEQ ({m.modseq})" if "CONDSTORE" in self.server.capabilities() else ""
+                uidpart = f"UID {m.uid} " if uid else ""
+                out.append(f"* {seq} FETCH ({uidpart}FLAGS ({' '.join(sorted(m.flags))}){modseq})\r\n")
+        out.append(f"{tag} OK store done\r\n")
+        self.send("".join(out))
+
+    def cmd_idle(self, tag, args, uid):
+        if not self.server.idle:
+            self.send(f"{tag} BAD IDLE not supported\r\n")
+            return
+        self.send("+ idling\r\n")
+        while True:
+            self._updates()
+            line = self.readline(timeout=0.05)
+            if line is not None:
+                if line.strip().upper() == b"DONE":
+                    break
+                self.send(f"{tag} BAD expected DONE\r\n")
+                return
+        self.send(f"{tag} OK IDLE terminated\r\n")
+
+    def _updates(self):
+        """Tell the session about new, changed and expunged messages since it last heard."""
+        mb = self.selected
+        if mb is None:
+            return
+        out, vanished = [], []
+        with mb.lock:
+            if mb.modseq == self.seen_modseq:
+                return
+            changes = mb.changes_since(self.seen_modseq)
+            self.seen_modseq = mb.modseq
+            grew = False
+            flagged = []
+            for _, u, kind in changes:
+                if kind == "new":
+                    if not self.view or u > self.view[-1]:
+                        self.view.append(u)
+                        grew = True
+                elif kind == "expunge":
+                    i = bisect_left(self.view, u)
+                    if i < len(self.view) and self.view[i] == u:
+                        del self.view[i]
+                        if self.qresync:
+                            vanished.append(u)
+                        else:
+                            out.append(f"* {i + 1} EXPUNGE\r\n")
+                elif kind == "flags":
+                    flagged.append(u)
+            if vanished:
+                out.append(f"* VANISHED {','.join(map(str, vanished))}\r\n")
+            for u in dict.fromkeys(flagged):
+                i = bisect_left(self.view, u)
+                seq, m = mb.find(u)
+                if m is not None and i < len(self.view) and self.view[i] == u:
+                    out.append(f"* {i + 1} FETCH (UID {u} FLAGS ({' '.join(sorted(m.flags))}))\r\n")
+            if grew:
+                out.append(f"* {len(self.view)} EXISTS\r\n")
+        if out:
+            self.send("".join(out))
+
+
+class _SearchProgram:
+    """An IMAP SEARCH key list compiled into match(seq, message)."""
+
+    def __init__(self, tokens: list, mailbox: FakeMailbox):
+        self.mailbox = mailbox
+        self.largest_uid = mailbox.uids[-1] if mailbox.uids else 0
+        self.count = len(mailbox.uids)
+        self._tokens = list(tokens)
+        self._tests = []
+        while self._tokens:
+            self._tests.append(self._key())
+
+    def match(self, seq: int, m: FakeMessage) -> bool:
+        return all(t(seq, m) for t in self._tests)
+
+    def _next(self):
+        return self._tokens.pop(0)
+
+    def _key(self) -> Callable[[int, FakeMessage], bool]:
+        tok = self._next()
+        if isinstance(tok, list):
+            sub = _SearchProgram(tok, self.mailbox)
+            return sub.match
+        key = tok.upper()
+        flag_keys = {"SEEN": "\\Seen", "ANSWERED": "\\Answered", "FLAGGED": "\\Flagged",
+                     "DELETED": "\\Deleted", "DRAFT": "\\Draft"}
+        if key == "ALL":
+            return lambda seq, m: True
+        if key in flag_keys:
+            f = flag_keys[key]
+            return lambda seq, m: f in m.flags
+        if key.startswith("UN") and key[2:] in flag_keys:
+            f = flag_keys[key[2:]]
+            return lambda seq, m: f not in m.flags
+        if key in ("NEW", "RECENT"):
+            return lambda seq, m: False
+        if key == "OLD":
+            return lambda seq, m: True
+        if key in ("KEYWORD", "UNKEYWORD"):
+            f, want = self._next(), key == "KEYWORD"
+            return lambda seq, m: (f in m.flags) == want
+        if key in ("SINCE", "BEFORE", "ON", "SENTSINCE", "SENTBEFORE", "SENTON"):
+            day = _imap_date(self._next()).date()
+            cmp = {"SINCE": lambda d: d >= day, "BEFORE": lambda d: d < day, "ON": lambda d: d == day}[
+                key.replace("SENT", "")]
+            return lambda seq, m: cmp(m.date.astimezone(timezone.utc).date())
+        if key in ("FROM", "TO", "SUBJECT", "CC", "BCC"):
+            needle = self._next().lower()
+            field = {"FROM": "sender", "TO": "to", "SUBJECT": "subject"}.get(key)
+            if field:
+                return lambda seq, m: needle in getattr(m, field).lower()
+            return lambda seq, m: any(needle in v.lower() for k, v in m.header_lines() if k.upper() == key)
+        if key == "HEADER":
+            name, needle = self._next().lower(), self._next().lower()
+            return lambda seq, m: any(needle in v.lower() for k, v in m.header_lines() if k.lower() == name)
+        if key in ("BODY", "TEXT"):
+            needle = self._next().lower().encode()
+            part = "TEXT" if key == "BODY" else ""
+            return lambda seq, m: needle in _section(self.mailbox.raw(m), part).lower()
+        if key in ("LARGER", "SMALLER"):
+            n, bigger = int(self._next()), key == "LARGER"
+            return lambda seq, m: (len(self.mailbox.raw(m)) > n) if bigger else (len(self.mailbox.raw(m)) < n)
+        if key == "MODSEQ":
+            n = int(self._next())
+            return lambda seq, m: m.modseq >= n
+        if key == "UID":
+            ranges = _ranges(self._next(), self.largest_uid)
+            return lambda seq, m: any(lo <= m.uid <= hi for lo, hi in ranges)
+        if key == "NOT":
+            inner = self._key()
+            return lambda seq, m: not inner(seq, m)
+        if key == "OR":
+            a, b = self._key(), self._key()
+            return lambda seq, m: a(seq, m) or b(seq, m)
+        if re.fullmatch(r"[\d*:,]+", key):
+            ranges = _ranges(key, self.count)
+            return lambda seq, m: any(lo <= seq <= hi for lo, hi in ranges)
+        raise ValueError(f"unsupported search key {tok}")
+
+
+class FakeImapServer(_FakeServer):
+    """IMAP4rev1 over plain TCP for one account and one mailbox (INBOX)."""
+
+    def __init__(self, mailbox: FakeMailbox, link: Link = Link(), user: Optional[str] = None,
+                 password: Optional[str] = None, condstore: bool = True, qresync: bool = False, idle: bool = True):
+        super().__init__(_ImapSession, link)
+        self.mailbox = mailbox
+        self.user, self.password = user, password
+        self.condstore, self.qresync, self.idle = condstore, qresync, idle
+
+    def capabilities(self) -> List[str]:
+        caps = ["IMAP4rev1", "LITERAL+", "UIDPLUS", "ENABLE", "UNSELECT"]
+        if self.idle:
+            caps.append("IDLE")
+        if self.condstore or self.qresync:
+            caps.append("CONDSTORE")
+        if self.qresync:
+            caps.append("QRESYNC")
+        return caps
+
+
+# ---------- SMTP ----------
+class SmtpMessage(NamedTuple):
+    sender: str
+    recipients: List[str]
+    data: bytes
+
+
+class _SmtpSession(_Session):
+    def serve(self):
+        srv: FakeSmtpServer = self.server
+        self.authed = srv.user is None
+        self.mail_from: Optional[str] = None
+        self.rcpts: List[str] = []
+        self.send("220 fake.example ESMTP ready\r\n")
+        while True:
+            line = self.readline().decode("utf-8", "replace")
+            self.stats.add(commands=1)
+            verb = line.split(" ", 1)[0].upper()
+            arg = line[len(verb):].strip()
+            fault = self.fault() if verb in ("MAIL", "RCPT", "DATA") else None
+            if fault == "drop":
+                self.drop()
+                return
+            if fault == "error":
+                self.send("451 4.3.0 temporary failure (simulated)\r\n")
+                if verb == "DATA":
+                    self.rcpts = []
+                continue
+            if verb in ("EHLO", "HELO"):
+                self.mail_from, self.rcpts = None, []
+                if verb == "HELO":
+                    self.send("250 fake.example\r\n")
+                    continue
+                exts = ["fake.example", "SIZE 36700160", "8BITMIME", "AUTH PLAIN LOGIN"]
+                if srv.pipelining:
+                    exts.insert(1, "PIPELINING")
+                self.send("".join(f"250{'-' if i < len(exts) - 1 else ' '}{e}\r\n" for i, e in enumerate(exts)))
+            elif verb == "AUTH":
+                self._auth(arg)
+            elif verb == "MAIL":
+                if not self.authed:
+                    self.send("530 5.7.0 authentication required\r\n")
+                elif self.mail_from is not None:
+                    self.send("503 5.5.1 nested MAIL command\r\n")
+                else:
+                    m = re.match(r"FROM:\s*<([^>]*)>", arg, re.I)
+                    self.mail_from = m.group(1) if m else arg[5:]
+                    self.rcpts = []
+                    self.send("250 2.1.0 ok\r\n")
+            elif verb == "RCPT":
+                m = re.match(r"TO:\s*<([^>]*)>", arg, re.I)
+                addr = m.group(1) if m else arg[3:]
+                if self.mail_from is None:
+                    self.send("503 5.5.1 need MAIL first\r\n")
+                elif srv.refuses(addr):
+                    self.send(f"550 5.1.1 <{addr}>: no such user\r\n")
+                else:
+                    self.rcpts.append(addr)
+                    self.send("250 2.1.5 ok\r\n")
+            elif verb == "DATA":
+                if self.mail_from is None:
+                    self.send("503 5.5.1 need MAIL first\r\n")
+                elif not self.rcpts:
+                    self.send("554 5.5.1 no valid recipients\r\n")
+                else:
+                    self.send("354 end data with <CR><LF>.<CR><LF>\r\n")
+                    lines = []
+                    while True:
+                        l = self.readline()
+                        if l == b".":
+                            break
+                        lines.append(l[1:] if l.startswith(b"..") else l)
+                    srv.accept(SmtpMessage(self.mail_from, self.rcpts, b"\r\n".join(lines) + _CRLF))
+                    self.mail_from, self.rcpts = None, []
+                    self.send("250 2.0.0 ok: queued\r\n")
+            elif verb == "RSET":
+                self.mail_from, self.rcpts = None, []
+                self.send("250 2.0.0 ok\r\n")
+            elif verb == "NOOP":
+                self.send("250 2.0.0 ok\r\n")
+            elif verb == "QUIT":
+                self.send("221 2.0.0 bye\r\n")
+                return
+            else:
+                self.send("502 5.5.2 command not recognized\r\n")
+
+    def _auth(self, arg: str):
+        srv: FakeSmtpServer = self.server
+        mech, _, initial = arg.partition(" ")
+        mech = mech.upper()
+        if mech == "PLAIN":
+            if not initial:
+                self.send("334 \r\n")
+                initial = self.readline().decode()
+            try:
+                _, user, password = base64.b64decode(initial).decode("utf-8").split("\0")
+            except ValueError:
+                self.send("501 5.5.2 bad AUTH PLAIN\r\n")
+                return
+        elif mech == "LOGIN":
+            self.send("334 VXNlcm5hbWU6\r\n")
+            user = base64.b64decode(self.readline()).decode("utf-8", "replace")
+            self.send("334 UGFzc3dvcmQ6\r\n")
+            password = base64.b64decode(self.readline()).decode("utf-8", "replace")
+        else:
+            self.send("504 5.5.4 unrecognized authentication type\r\n")
+            return
+        if srv.user is not None and (user != srv.user or password != srv.password):
+            self.send("535 5.7.8 authentication failed\r\n")
+            return
+        self.authed = True
+        self.send("235 2.7.0 authenticated\r\n")
+
+
+class FakeSmtpServer(_FakeServer):
+    """
+    ESMTP over plain TCP. Accepted mail is kept in `messages`; `refuse` lists addresses
+    (or parts of them) that get a 550 at RCPT TO; `on_message` is called for each one.
+    """
+
+    def __init__(self, link: Link = Link(), user: Optional[str] = None, password: Optional[str] = None,
+                 pipelining: bool = True, refuse=(), on_message: Optional[Callable[[SmtpMessage], None]] = None):
+        super().__init__(_SmtpSession, link)
+        self.user, self.password = user, password
+        self.pipelining = pipelining
+        self.refuse = [r.lower() for r in refuse]
+        self.on_message = on_message
+        self.messages: List[SmtpMessage] = []
+
+    def refuses(self, addr: str) -> bool:
+        return any(r in addr.lower() for r in self.refuse)
+
+    def accept(self, msg: SmtpMessage):
+        self.messages.append(msg)
+        if self.on_message is not None:
+            self.on_message(msg)
+
+
+# ---------- both ----------
+class FakeMailServer:
+    """
+    The IMAP and SMTP stand-ins for one account, started and stopped together.
+
+        with FakeMailServer(generate_mailbox(1000), link=Link(rtt=0.05)) as srv:
+            mail = srv.client()
+            mail.list_unread()
+            print(srv.stats())
+
+    Mail sent to the account's own address is delivered to its INBOX (and so shows up
+    through IDLE) unless `deliver_local` is False.
+    """
+
+    def __init__(self, mailbox: Optional[FakeMailbox] = None, link: Link = Link(), smtp_link: Optional[Link] = None,
+                 user: str = "me@fake.example", password: str = "secret", condstore: bool = True,
+                 qresync: bool = False, idle: bool = True, pipelining: bool = True, refuse=("reject",),
+                 deliver_local: bool = True):
+        self.mailbox = mailbox if mailbox is not None else generate_mailbox(100, user=user)
+        self.user, self.password = user, password
+        self.deliver_local = deliver_local
+        self.imap = FakeImapServer(self.mailbox, link, user, password, condstore, qresync, idle)
+        self.smtp = FakeSmtpServer(smtp_link or link, user, password, pipelining, refuse, self._delivered)
+
+    def _delivered(self, msg: SmtpMessage):
+        if self.deliver_local and any(r.lower() == self.user.lower() for r in msg.recipients):
+            self.mailbox.append(msg.data)
+
+    def start(self) -> "FakeMailServer":
+        self.imap.start()
+        self.smtp.start()
+        return self
+
+    def stop(self):
+        self.imap.stop()
+        self.smtp.stop()
+
+    def __enter__(self) -> "FakeMailServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def env(self) -> Dict[str, str]:
+        """The .env settings that point the app at this server."""
+        return {"IMAP_HOST": "127.0.0.1", "IMAP_PORT": str(self.imap.port), "SMTP_HOST": "127.0.0.1",
+                "SMTP_PORT": str(self.smtp.port), "EMAIL_USER": self.user, "EMAIL_PASS": self.password,
+                "MAIL_SSL": "0"}
+
+    def client(self, **kwargs):
+        """An EmailClient logged in to this server (keyword arguments go to EmailClient)."""
+        from email_client import EmailClient
+        return EmailClient("127.0.0.1", self.imap.port, "127.0.0.1", self.smtp.port, self.user, self.password,
+                           use_ssl=False, **kwargs)
+
+    def async_client(self, **kwargs):
+        from async_email_client import AsyncEmailClient
+        return AsyncEmailClient("127.0.0.1", self.imap.port, "127.0.0.1", self.smtp.port, self.user,
+                                self.password, use_ssl=False, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {"imap": self.imap.stats.snapshot(), "smtp": self.smtp.stats.snapshot()}
+
+    def reset_stats(self):
+        self.imap.stats.reset()
+        self.smtp.stats.reset()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Run a local fake IMAP/SMTP server for the voice email app.")
+    p.add_argument("--messages", type=int, default=500, help="mailbox size")
+    p.add_argument("--newsletters", type=float, default=MailMix._field_defaults["newsletters"], help="share of newsletters")
+    p.add_argument("--unseen", type=float, default=MailMix._field_defaults["unseen"], help="share of unread messages")
+    p.add_argument("--rtt", type=float, default=0.0, help="round-trip time to add, in milliseconds")
+    p.add_argument("--bandwidth", type=float, default=0.0, help="KB/s from server to client (0 = unlimited)")
+    p.add_argument("--drop-rate", type=float, default=0.0, help="chance a command drops the connection")
+    p.add_argument("--error-rate", type=float, default=0.0, help="chance a command fails temporarily")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--qresync", action="store_true", help="also offer QRESYNC")
+    args = p.parse_args()
+    mix = MailMix(newsletters=args.newsletters, unseen=args.unseen)
+    link = Link(rtt=args.rtt / 1000, bandwidth=args.bandwidth * 1024 or None, drop_rate=args.drop_rate,
+                error_rate=args.error_rate, seed=args.seed)
+    srv = FakeMailServer(generate_mailbox(args.messages, mix, seed=args.seed), link=link, qresync=args.qresync)
+    with srv:
+        print("Fake mail server running. Put these in .env (or the environment) and start app.py or gui.py:")
+        for k, v in srv.env().items():
+            print(f"{k}={v}")
+        print("Mail sent to anyone with 'reject' in the address is refused. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import unicodedata
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple, Union
+
+# Fuzzy matching of spoken search words against the search index's vocabulary.
+# Speech recognition spells names the way they sound ("Shawn" for "Sean", "Katherine"
+# for "Kathryn") and mishears a letter or two, so each query word is expanded with
+# the indexed terms that sound alike or are within a small edit distance.
+
+# SymSpell-style deletion index over the first PREFIX_LENGTH characters of each term
+# (the full words are compared afterwards). Terms are indexed with up to INDEX_DELETES
+# deletions and queries looked up with up to MAX_DISTANCE: every distance-1 match is
+# found, and distance-2 ones where the spoken word has extra or changed letters, for
+# half the memory of indexing two deletions. Phonetic keys cover most of the rest.
+PREFIX_LENGTH = 7
+INDEX_DELETES = 1
+MAX_DISTANCE = 2
+# Words shorter than this are only matched exactly (too many lookalikes otherwise).
+MIN_FUZZY_LENGTH = 3
+
+_VOWELS = frozenset("AEIOUY")
+
+
+def _ascii_upper(word: str) -> str:
+    word = unicodedata.normalize('NFKD', word)
+    return "".join(ch for ch in word.upper() if 'A' <= ch <= 'Z')
+
+
+def phonetic_keys(word: str) -> Tuple[str, ...]:
+    """
+    Metaphone-style sound keys for `word`: a primary one and, like Double Metaphone,
+    an alternate that folds SH/CH into S and TH into T ("Shawn" XN/SN matches "Sean" SN).
+    Empty for words with no letters.
+    """
+    w = _ascii_upper(word)
+    if not w:
+        return ()
+    if w[:2] in ('AE', 'GN', 'KN', 'PN', 'WR'):
+        w = w[1:]
+    if w[0] == 'X':
+        w = 'S' + w[1:]
+    elif w[:2] == 'WH':
+        w = 'W' + w[2:]
+    n = len(w)
+    out = []
+
+    def at(i: int) -> str:
+        return w[i] if 0 <= i < n else ''
+
+    i = 0
+    while i < n:
+        c = w[i]
+        if c == at(i - 1) and c != 'C':
+            i += 1
+            continue
+        nxt = at(i + 1)
+        if c in 'AEIOU':
+            if i == 0:
+                out.append('A')
+        elif c == 'B':
+            if not (i == n - 1 and at(i - 1) == 'M'):
+                out.append('P')
+        elif c == 'C':
+            if nxt == 'H':
+                out.append('K' if at(i - 1) == 'S' else 'X')
+                i += 1
+            elif nxt in ('I', 'E', 'Y'):
+                out.append('X' if w[i:i + 3] == 'CIA' else 'S')
+            elif not (at(i - 1) == 'S' and nxt in ('I', 'E', 'Y')):
+                out.append('K')
+        elif c == 'D':
+            if nxt == 'G' and at(i + 2) in ('E', 'I', 'Y'):
+                out.append('J')
+                i += 2
+            else:
+                out.append('T')
+        elif c == 'G':
+            if nxt == 'H' and at(i + 2) not in _VOWELS:
+                pass  # "night", "though"
+            elif nxt == 'N' and i + 2 >= n:
+                pass  # "sign"
+            elif nxt in ('I', 'E', 'Y'):
+                out.append('J')
+            else:
+                out.append('K')
+        elif c == 'H':
+            if nxt in _VOWELS and at(i - 1) not in ('C', 'S', 'P', 'T', 'G'):
+                out.append('H')
+        elif c == 'K':
+            if at(i - 1) != 'C':
+                out.append('K')
+        elif c == 'P':
+            out.append('F' if nxt == 'H' else 'P')
+        elif c == 'Q':
+            out.append('K')
+        elif c == 'S':
+            if nxt == 'H' or w[i:i + 3] in ('SIO', 'SIA'):
+                out.append('X')
+                i += nxt == 'H'
+            else:
+                out.append('S')
+        elif c == 'T':
+            if w[i:i + 3] in ('TIA', 'TIO'):
+                out.append('X')
+            elif nxt == 'H':
+                out.append('0')
+                i += 1
+            elif not (nxt == 'C' and at(i + 2) == 'H'):
+                out.append('T')
+        elif c == 'V':
+            out.append('F')
+        elif c in ('W', 'Y'):
+            if nxt in 'AEIOU' and nxt:
+                out.append(c)
+        elif c == 'X':
+            out.append('KS')
+        elif c == 'Z':
+            out.append('S')
+        else:
+            out.append(c)  # F J L M N R
+        i += 1
+    primary = "".join(out)[:6]
+    alternate = primary.replace('X', 'S').replace('0', 'T')
+    return (primary,) if alternate == primary else (primary, alternate)
+
+
+def edit_distance(a: str, b: str, limit: int = MAX_DISTANCE) -> int:
+    """Damerau-Levenshtein (adjacent swaps count once) distance, or limit + 1 if it's larger."""
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if abs(la - lb) > limit:
+        return limit + 1
+    over = limit + 1
+    # only cells within `limit` of the diagonal can stay under the limit
+    prev2: List[int] = []
+    prev = [j if j <= limit else over for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        cur = [over] * (lb + 1)
+        if i <= limit:
+            cur[0] = i
+        ca = a[i - 1]
+        best = cur[0]
+        for j in range(max(1, i - limit), min(lb, i + limit) + 1):
+            cb = b[j - 1]
+            d = prev[j - 1] + (ca != cb)
+            if prev[j] + 1 < d:
+                d = prev[j] + 1
+            if cur[j - 1] + 1 < d:
+                d = cur[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and prev2[j - 2] + 1 < d:
+                d = prev2[j - 2] + 1
+            cur[j] = d
+            if d < best:
+                best = d
+        if best > limit:
+            return over
+        prev2, prev = prev, cur
+    return min(prev[lb], over)
+
+
+def _deletes(word: str, distance: int) -> set:
+    """`word` and every string made by deleting up to `distance` of its characters."""
+    out = {word}
+    edge = {word}
+    for _ in range(distance):
+        edge = {w[:k] + w[k + 1:] for w in edge if len(w) > 1 for k in range(len(w))} - out
+        out |= edge
+    return out
+
+
+class TermDictionary:
+    """
+    The index vocabulary with two lookup structures for candidates():
+
+    - a SymSpell-style map from deletions of each term's prefix to the terms, so the
+      terms within edit distance are a few dozen dict lookups away instead of a scan;
+    - a map from phonetic key to the terms that sound like it, each list sorted by
+      length so only terms of about the query's length are compared.
+
+    Built once from (term, document count) pairs: a few seconds and under 100 MB for
+    100k terms, after which a lookup takes about a millisecond.
+    """
+
+    def __init__(self, terms: Iterable[Tuple[str, int]], prefix_length: int = PREFIX_LENGTH):
+        self.prefix_length = prefix_length
+        self.terms: List[str] = []
+        self.counts: List[int] = []
+        self._ids: Dict[str, int] = {}
+        # one term id, or a list of them once a key is shared (most keys aren't)
+        self._deletes: Dict[str, Union[int, List[int]]] = {}
+        sounds: Dict[str, List[int]] = {}
+        deletes = self._deletes
+        for term, count in terms:
+            if term in self._ids:
+                continue
+            tid = len(self.terms)
+            self.terms.append(term)
+            self.counts.append(count)
+            self._ids[term] = tid
+            if len(term) < MIN_FUZZY_LENGTH or term.isdigit():
+                continue
+            for d in _deletes(term[:prefix_length], INDEX_DELETES):
+                have = deletes.get(d)
+                if have is None:
+                    deletes[d] = tid
+                elif isinstance(have, int):
+                    deletes[d] = [have, tid]
+                else:
+                    have.append(tid)
+            for key in phonetic_keys(term):
+                sounds.setdefault(key, []).append(tid)
+        lengths = [len(t) for t in self.terms]
+        self._sounds: Dict[str, Tuple[List[int], List[int]]] = {}
+        for key, tids in sounds.items():
+            tids.sort(key=lengths.__getitem__)
+            self._sounds[key] = ([lengths[t] for t in tids], tids)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._ids
+
+    def candidates(self, word: str, limit: int = 8, max_distance: int = MAX_DISTANCE) -> List[Tuple[str, int]]:
+        """
+        Up to `limit` (term, edit distance) pairs for `word`, best first: the term itself,
+        then closer spellings, terms that sound alike, and terms more messages use.
+        Words of four letters or fewer allow one edit; terms that sound alike allow more.
+        """
+        word = word.lower()
+        if len(word) < MIN_FUZZY_LENGTH or word.isdigit():
+            return [(word, 0)] if word in self._ids else []
+        if len(word) <= 4:
+            max_distance = min(max_distance, 1)
+        terms = self.terms
+        found: Dict[int, Tuple[int, int]] = {}  # term id -> (distance, 0 if it sounds alike else 1)
+        checked = set()
+        for d in _deletes(word[:self.prefix_length], max_distance):
+            hit = self._deletes.get(d)
+            if hit is None:
+                continue
+            for tid in ((hit,) if isinstance(hit, int) else hit):
+                if tid in checked:
+                    continue
+                checked.add(tid)
+                if abs(len(terms[tid]) - len(word)) <= max_distance:
+                    dist = edit_distance(word, terms[tid], max_distance)
+                    if dist <= max_distance:
+                        found[tid] = (dist, 1)
+        # sounding alike allows more edits ("shawn"/"sean" is two, "catherine"/"kathryn" four)
+        sound_limit = max(max_distance + 1, len(word) // 2)
+        for key in phonetic_keys(word):
+            lengths, tids = self._sounds.get(key, ((), ()))
+            lo = bisect_left(lengths, len(word) - sound_limit)
+            hi = bisect_right(lengths, len(word) + sound_limit)
+            for tid in tids[lo:hi]:
+                if tid in found:
+                    found[tid] = (found[tid][0], 0)
+                    continue
+                dist = edit_distance(word, terms[tid], sound_limit)
+                if dist <= sound_limit:
+                    found[tid] = (dist, 0)
+        ranked = sorted(found, key=lambda t: (found[t][0] > 0, found[t][0] + found[t][1], -self.counts[t]))
+        return [(terms[t], found[t][0]) for t in ranked[:limit]]
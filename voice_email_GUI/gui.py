@@ -1,9 +1,20 @@
 import os, sys, csv, difflib, re, threading
-from typing import List, Dict
+from typing import Dict, Optional
 from dotenv import load_dotenv
 from PyQt6 import QtCore, QtGui, QtWidgets
 
+from async_email_client import AsyncEmailClient
+from body_cache import cache_summary
 from email_client import EmailClient
+from idle_listener import IdleListener, MailboxEvent
+from imap_body import BODY_PREVIEW_BYTES
+from indexer import SearchIndexer
+from message_model import MessageFilterProxy, MessageTableModel
+from message_summary import MessageSummary, SummaryList
+from outbox import Outbox, OutboxSender, outbox_summary
+from paging import PAGE_SIZE, Pager
+from prefetch import BodyPrefetcher
+from qt_async import AsyncBridge, install_qt_loop
 from voice_io import VoiceIO
 
 # -------- Number parsing for voice commands --------
@@ -32,7 +43,12 @@ def extract_index(text: str) -> int:
 
 # -------- Contacts helpers --------
 def load_contacts(path: str = 'contacts.csv') -> Dict[str, str]:
-    m = {}
+    """
+    name -> address from contacts.csv rows "name,email[,groups]". The optional third
+    column puts a contact in groups ("team;family"); each group name maps to all its
+    members' addresses, comma-separated, so "send this to the team" is one message.
+    """
+    m, groups = {}, {}
     if not os.path.exists(path): return m
     with open(path, newline='', encoding='utf-8') as f:
         for row in csv.reader(f):
@@ -40,14 +56,24 @@ def load_contacts(path: str = 'contacts.csv') -> Dict[str, str]:
             name, email = row[0].strip(), row[1].strip()
             if name and email:
                 m[name.lower()] = email
+                for g in (row[2].split(';') if len(row) > 2 else []):
+                    if g.strip():
+                        groups.setdefault(g.strip().lower(), []).append(email)
+    for g, emails in groups.items():
+        m.setdefault(g, ", ".join(emails))
     return m
 
 def resolve_contact(name: str, contacts: Dict[str, str]) -> str:
-    email = contacts.get(name.lower())
+    name = re.sub(r"^(?:the|my|our)\s+", "", name.lower().strip())
+    email = contacts.get(name)
     if email: return email
-    choices = difflib.get_close_matches(name.lower(), list(contacts.keys()), n=1, cutoff=0.6)
+    choices = difflib.get_close_matches(name, list(contacts.keys()), n=1, cutoff=0.6)
     return contacts.get(choices[0], '') if choices else ''
 
+def forward_text(frm: str, subj: str, body: str) -> str:
+    return (f"---------- Forwarded message ----------\nFrom: {frm}\nSubject: {subj or '(no subject)'}\n\n"
+            f"{body or ''}")
+
 def strip_address(frm: str) -> str:
     m = re.search(r"<([^>]+)>", frm)
     return m.group(1) if m else frm.split()[-1]
@@ -66,10 +92,28 @@ class Worker(QtCore.QRunnable):
         except Exception as e:
             self.signals.error.emit(str(e))
 
+class AsyncWorker:
+    """Worker counterpart for AsyncEmailClient coroutines; same `signals`, started by run()."""
+    def __init__(self, bridge: AsyncBridge, fn, *args, **kwargs):
+        self.bridge = bridge
+        self.fn = fn; self.args = args; self.kwargs = kwargs
+        self.signals = WorkerSignals()
+    def run(self):
+        self.bridge.submit(self.fn(*self.args, **self.kwargs), self._done)
+    def _done(self, fut):
+        try:
+            self.signals.success.emit(fut.result())
+        except Exception as e:
+            self.signals.error.emit(str(e))
+
 class WorkerSignals(QtCore.QObject):
     success = QtCore.pyqtSignal(object)
     error = QtCore.pyqtSignal(str)
 
+class MailSignals(QtCore.QObject):
+    # carries IdleListener / OutboxSender events from their threads to the GUI thread
+    event = QtCore.pyqtSignal(object)
+
 # -------- Settings Dialog --------
 class SettingsDialog(QtWidgets.QDialog):
     def __init__(self, parent=None, env_path=".env"):
@@ -245,7 +289,7 @@ class ComposeDialog(QtWidgets.QDialog):
 
 # -------- Main Window --------
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, loop=None):
         super().__init__()
         load_dotenv()
 
@@ -269,9 +313,50 @@ class MainWindow(QtWidgets.QMainWindow):
                 "EMAIL_USER or EMAIL_PASS not set in .env.\nClose the app and fix your .env.")
             sys.exit(1)
 
-        self.mail = EmailClient(imap_host, imap_port, smtp_host, smtp_port, user, pw)
+        header_cache = os.getenv('HEADER_CACHE', '.header_cache.db')  # empty disables the on-disk cache
+        max_conns = int(os.getenv('MAX_IMAP_CONNECTIONS', '4'))
+        smtp_keepalive = float(os.getenv('SMTP_KEEPALIVE', '60'))  # seconds the SMTP login stays open
+        use_ssl = os.getenv('MAIL_SSL', '1') == '1'  # 0 only for a local test server (fake_mail_server.py)
+        self.mail = EmailClient(imap_host, imap_port, smtp_host, smtp_port, user, pw,
+                                cache_path=header_cache or None, max_connections=max_conns,
+                                body_cache_bytes=int(float(os.getenv('BODY_CACHE_MB', '8')) * 1024 * 1024),
+                                smtp_idle_timeout=smtp_keepalive, use_ssl=use_ssl)
         self.contacts = load_contacts()
+        # Compose/reply only wait for the outbox write; delivery and retries happen in the background
+        self.outbox = Outbox(os.getenv('OUTBOX_PATH', '.outbox.db') or ":memory:")
+        self.outbox_signals = MailSignals()
+        self.outbox_signals.event.connect(self._on_outbox_event)
+        self.sender = OutboxSender(self.mail, self.outbox,
+                                   on_event=lambda kind, item: self.outbox_signals.event.emit((kind, item)))
+        self.sender.start()
         self.pool = QtCore.QThreadPool.globalInstance()
+        # ASYNC_MAIL=1: list/read/search/mark/send run as coroutines on one asyncio loop
+        # (Qt's own loop via qasync if installed) instead of one pool thread per action.
+        self.amail = None; self.bridge = None
+        if os.getenv('ASYNC_MAIL', '0') == '1':
+            self.amail = AsyncEmailClient(imap_host, imap_port, smtp_host, smtp_port, user, pw,
+                                          max_connections=max_conns, body_cache=self.mail.body_cache,
+                                          search_index=self.mail.search_index, smtp_idle_timeout=smtp_keepalive,
+                                          use_ssl=use_ssl)
+            self.bridge = AsyncBridge(loop)
+        self.list_kind = "inbox"  # what the table shows: "inbox" listing or "search" results
+        self.list_query = None    # the search behind a "search" listing
+        self.list_fuzzy = False   # ...and whether it was spoken (matches what sounds alike)
+        # Older mail is loaded a page at a time when the table is scrolled to the bottom
+        self.page_size = int(os.getenv('PAGE_SIZE', str(PAGE_SIZE)))
+        self.pager = None
+        self._loading_more = False
+        # Warm the bodies of the selected message and the next few while the user looks at the list
+        self.prefetcher = None
+        prefetch_depth = int(os.getenv('PREFETCH_BODIES', '3'))
+        if prefetch_depth > 0:
+            self.prefetcher = BodyPrefetcher(self.mail, depth=prefetch_depth)
+            self.prefetcher.start()
+        # Local search index, filled in the background; searches are answered from it once it's complete
+        self.indexer = None
+        if os.getenv('SEARCH_INDEX', '1') == '1' and self.mail.search_index is not None:
+            self.indexer = SearchIndexer(self.mail, bodies=int(os.getenv('SEARCH_INDEX_BODIES', '200')))
+            self.indexer.start()
 
         self.setWindowTitle("VOICE BASED EMAIL SYSTEM FOR VISUALLY IMPAIRED")
         self.resize(1200, 760)
@@ -280,6 +365,18 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.voice_thread = None
         self._set_status_idle()
+        # Show the last-known inbox from the header cache right away; Ctrl+I refreshes it.
+        cached = self.mail.cached_unread()
+        if cached:
+            self._populate_table(cached); self._set_status_idle("Showing cached inbox")
+
+        # Push new mail / flag changes over IMAP IDLE instead of polling
+        self.listener = None
+        if os.getenv('PUSH_MAIL', '1') == '1':
+            self.mail_signals = MailSignals()
+            self.mail_signals.event.connect(self._on_mail_event)
+            self.listener = IdleListener(self.mail, self.mail_signals.event.emit, primary_only=self.primary_only)
+            self.listener.start()
         self.voice.speak("Welcome to your voice email. Press Control plus I to check inbox, or Control plus Space to speak a command.")
 
     # ----- UI -----
@@ -330,31 +427,40 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_comp  = big_btn("✉️ Compose", "Ctrl+N", "Compose a new email (voice-supported)")
         self.btn_reply = big_btn("↩️ Reply", None, "Reply to selected")
         self.btn_mark  = big_btn("✅ Mark as Read", "Del", "Mark selected as read")
+        self.btn_outbox = big_btn("📤 Outbox", None, "Messages waiting to be sent, and ones that failed")
         self.btn_settings = big_btn("⚙️ Settings", None, "Edit .env (mic, TTS rate, language, Primary only)")
         self.btn_speak_text = big_btn("🔊 Speak Viewer", None, "Speak loaded message")
         self.btn_stop = big_btn("■ Stop", "Esc", "Stop speaking")
 
-        for b in [self.btn_check, self.btn_read, self.btn_next, self.btn_comp, self.btn_reply, self.btn_mark, self.btn_settings, self.btn_speak_text, self.btn_stop]:
+        for b in [self.btn_check, self.btn_read, self.btn_next, self.btn_comp, self.btn_reply, self.btn_mark, self.btn_outbox, self.btn_settings, self.btn_speak_text, self.btn_stop]:
             side.addWidget(b)
         side.addStretch(1)
 
         # Middle: search + table + viewer
         mid = QtWidgets.QVBoxLayout(); main.addLayout(mid, 1)
         srow = QtWidgets.QHBoxLayout()
-        self.search_edit = QtWidgets.QLineEdit(); self.search_edit.setPlaceholderText("Search subject/from (Ctrl+F)")
+        self.search_edit = QtWidgets.QLineEdit(); self.search_edit.setPlaceholderText("Search mail (Ctrl+F)")
         self.search_btn = QtWidgets.QPushButton("Search"); self.search_btn.setShortcut("Ctrl+F")
-        srow.addWidget(self.search_edit, 1); srow.addWidget(self.search_btn)
+        self.filter_edit = QtWidgets.QLineEdit(); self.filter_edit.setPlaceholderText("Filter this list")
+        srow.addWidget(self.search_edit, 1); srow.addWidget(self.search_btn); srow.addWidget(self.filter_edit)
         mid.addLayout(srow)
 
-        self.table = QtWidgets.QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["#", "From", "Subject", "Date"])
+        # The view reads cells from the model on demand; scrolling to the end asks it
+        # for more (fetchMore), which loads the next page in the background.
+        self.model = MessageTableModel(self, can_fetch_more=self._can_load_more, fetch_more=self._load_more)
+        self.proxy = MessageFilterProxy(self); self.proxy.setSourceModel(self.model)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.proxy)
         self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.setSelectionBehavior(QtWidgets.QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setEditTriggers(QtWidgets.QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.setAlternatingRowColors(True)
         self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)
         self.table.setShowGrid(False)
-        self.table.setSortingEnabled(False)
+        self.table.horizontalHeader().setSortIndicator(0, QtCore.Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)
         self.table.setColumnWidth(0, 50); self.table.setColumnWidth(1, 280); self.table.setColumnWidth(2, 520)
         mid.addWidget(self.table, 2)
 
@@ -369,8 +475,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_comp.clicked.connect(self.on_compose)
         self.btn_reply.clicked.connect(self.on_reply)
         self.btn_mark.clicked.connect(self.on_mark_read)
-        self.search_btn.clicked.connect(self.on_search)
-        self.table.itemSelectionChanged.connect(lambda: self.viewer.setPlainText(""))
+        self.btn_outbox.clicked.connect(self.on_outbox)
+        self.search_btn.clicked.connect(lambda: self.on_search())
+        self.filter_edit.textChanged.connect(self.proxy.set_filter_text)
+        self.table.selectionModel().selectionChanged.connect(lambda *_: self.viewer.setPlainText(""))
+        self.table.selectionModel().selectionChanged.connect(self._prefetch_from_selection)
         self.btn_speak_text.clicked.connect(self.on_speak_viewer)
         self.btn_stop.clicked.connect(self.on_stop_speaking)
         self.btn_settings.clicked.connect(self.on_settings)
@@ -384,8 +493,6 @@ class MainWindow(QtWidgets.QMainWindow):
         self._pulse = False
         self._timer = QtCore.QTimer(self); self._timer.setInterval(300); self._timer.timeout.connect(self._tick)
 
-        self.uid_map: Dict[int, bytes] = {}
-        self.cur_list: List[Dict] = []
 
     def _apply_style(self):
         self.setStyleSheet("""
@@ -396,7 +503,7 @@ class MainWindow(QtWidgets.QMainWindow):
             padding: 10px 16px;
         }
         QPushButton:hover { background: #1f2937; }
-        QLineEdit, QPlainTextEdit, QTableWidget {
+        QLineEdit, QPlainTextEdit, QTableView {
             background: white; border: 1px solid #e5e7eb; border-radius: 10px;
             padding: 8px; font-size: 14px;
         }
@@ -424,51 +531,152 @@ class MainWindow(QtWidgets.QMainWindow):
 
     # ----- Core actions -----
     def on_check_inbox(self):
+        self.list_kind = "inbox"; self.list_query = None
         self._set_status_working("Checking Inbox…")
-        worker = Worker(self.mail.list_unread, 10, self.primary_only)
+        worker = self._mail_worker('list_unread', self.page_size, self.primary_only)
         worker.signals.success.connect(self._populate_table)
         worker.signals.error.connect(self._error)
-        self.pool.start(worker)
-
-    def _populate_table(self, msgs: List[Dict]):
-        self.cur_list = msgs or []
-        self.uid_map.clear()
-        self.table.setRowCount(0)
+        self._start(worker)
+
+    def _populate_table(self, msgs: SummaryList):
+        msgs = msgs if msgs is not None else SummaryList()
+        # the pager keeps its own copy: the model's list grows as more pages are appended
+        self.pager = Pager(self.mail, msgs[:], query=self.list_query,
+                           primary_only=self.primary_only and self.list_kind == "inbox",
+                           page_size=self.page_size, fuzzy=self.list_fuzzy)
+        self.model.set_list(msgs)
+        hdr = self.table.horizontalHeader()  # a new listing comes in its own order
+        hdr.blockSignals(True); hdr.setSortIndicator(0, QtCore.Qt.SortOrder.AscendingOrder); hdr.blockSignals(False)
         if not msgs:
             self.viewer.setPlainText(""); self._set_status_idle("No messages")
             QtWidgets.QMessageBox.information(self, "Inbox", "No messages found in Primary Inbox." if self.primary_only else "No messages found in Inbox.")
             return
-        for it in msgs:
-            r = self.table.rowCount(); self.table.insertRow(r)
-            self.table.setItem(r, 0, QtWidgets.QTableWidgetItem(str(it['index'])))
-            self.table.setItem(r, 1, QtWidgets.QTableWidgetItem(it['from']))
-            self.table.setItem(r, 2, QtWidgets.QTableWidgetItem(it['subject'] or "(no subject)"))
-            self.table.setItem(r, 3, QtWidgets.QTableWidgetItem(it.get('date', "")))
-            self.uid_map[it['index']] = it['uid']
         self.table.selectRow(0); self._set_status_idle("Inbox loaded")
 
-    def _fetch_body(self, uid):
-        return self.mail.fetch_message(uid)
+    # ----- List rows (view rows go through the sort/filter proxy) -----
+    @property
+    def cur_list(self) -> SummaryList:
+        return self.model.summaries
+
+    def _current_row(self) -> int:
+        idx = self.table.currentIndex()
+        return idx.row() if idx.isValid() else -1
+
+    def _summary_at(self, view_row: int) -> Optional[MessageSummary]:
+        src = self.proxy.mapToSource(self.proxy.index(view_row, 0))
+        return self.model.summary(src.row()) if src.isValid() else None
+
+    def _current_summary(self) -> Optional[MessageSummary]:
+        row = self._current_row()
+        return self._summary_at(row) if row >= 0 else None
+
+    def _select_number(self, n: int) -> bool:
+        """Select message number `n` (the # column); False if it isn't shown."""
+        if not 1 <= n <= self.model.rowCount():
+            return False
+        idx = self.proxy.mapFromSource(self.model.index(n - 1, 0))
+        if not idx.isValid():
+            return False
+        self.table.selectRow(idx.row()); self.table.scrollTo(idx)
+        return True
+
+    def _on_mail_event(self, ev: MailboxEvent):
+        """Apply a pushed IdleListener event to the current list without refetching it."""
+        if ev.reset:
+            if self.list_kind == "inbox" and self.cur_list:
+                self.on_check_inbox()
+            return
+        cur = self._current_summary()
+        self.model.set_list(self.cur_list.merged(ev.new, ev.vanished, ev.seen, ev.unseen,
+                                                 prepend=self.list_kind == "inbox"))
+        if cur is not None and cur.uid in self.cur_list.uids:
+            self._select_number(self.cur_list.uids.index(cur.uid) + 1)
+        if ev.new and self.indexer is not None:
+            self.indexer.notify()
+        if ev.new and self.list_kind == "inbox":
+            first = ev.new[0]
+            note = f"New message from {first.sender}: {first.subject or 'no subject'}"
+            if len(ev.new) > 1:
+                note = f"{len(ev.new)} new messages. " + note
+            self._set_status_idle(f"{len(ev.new)} new message(s)")
+            if not (self.voice_thread and self.voice_thread.is_alive()):
+                self.voice_thread = threading.Thread(target=self._speak_async, args=(note,), daemon=True)
+                self.voice_thread.start()
+
+    def _can_load_more(self) -> bool:
+        return not self._loading_more and self.pager is not None and self.pager.has_next
+
+    def _load_more(self, then=None):
+        """Append the next page of the listing; `then(number)` runs with its first message's number."""
+        if not self._can_load_more():
+            return False
+        self._loading_more = True
+        pager = self.pager
+        self._set_status_working("Loading more…")
+        worker = Worker(pager.next_page)
+        worker.signals.success.connect(lambda items: self._append_page(pager, items, then))
+        worker.signals.error.connect(lambda e: (setattr(self, '_loading_more', False), self._error(e)))
+        self.pool.start(worker)
+        return True
+
+    def _append_page(self, pager: Pager, items: SummaryList, then=None):
+        self._loading_more = False
+        if pager is not self.pager:
+            return  # the listing was replaced while this page loaded
+        if not items:
+            self._set_status_idle("No more messages"); return
+        first = self.model.rowCount() + 1
+        self.model.append(items)
+        self._set_status_idle(f"{len(self.cur_list)} messages")
+        if then is not None:
+            then(first)
+
+    def on_next_page(self):
+        row = max(self._current_row(), 0)
+        target = (row // self.page_size + 1) * self.page_size
+        if target < self.proxy.rowCount():
+            self.table.selectRow(target)
+        elif not self._load_more(self._select_number):
+            self.voice.speak("There are no more messages.")
+
+    def on_previous_page(self):
+        row = max(self._current_row(), 0)
+        if row < self.page_size:
+            self.voice.speak("This is the first page."); return
+        self.table.selectRow((row // self.page_size - 1) * self.page_size)
+
+    def _prefetch_from_selection(self, *_):
+        if self.prefetcher is not None:
+            row = max(self._current_row(), 0)
+            self.prefetcher.schedule(self._summary_at(r) for r in range(row, self.proxy.rowCount()))
+
+    def _mail_worker(self, name: str, *args):
+        """A worker calling `name` on the async client when ASYNC_MAIL is on, else on the threaded one."""
+        if self.amail is not None:
+            return AsyncWorker(self.bridge, getattr(self.amail, name), *args)
+        return Worker(getattr(self.mail, name), *args)
+
+    def _start(self, worker):
+        if isinstance(worker, AsyncWorker):
+            worker.run()
+        else:
+            self.pool.start(worker)
 
     def on_read_selected(self):
-        row = self.table.currentRow()
-        if row < 0 or row >= len(self.cur_list):
+        it = self._current_summary()
+        if it is None:
             QtWidgets.QMessageBox.information(self, "Read", "Please select a message.")
             return
-        idx = int(self.table.item(row, 0).text()); uid = self.uid_map.get(idx)
-        if not uid:
-            QtWidgets.QMessageBox.warning(self, "Read", "Internal mapping error.")
-            return
+        uid = it.uid
         self._set_status_working("Opening message…")
-        worker = Worker(self._fetch_body, uid)
+        worker = self._mail_worker('fetch_message', uid)
         worker.signals.success.connect(self._show_message)
         worker.signals.error.connect(self._error)
-        self.pool.start(worker)
+        self._start(worker)
 
     def on_read_next(self):
-        row = self.table.currentRow(); row = -1 if row < 0 else row
-        nxt = row + 1
-        if nxt >= len(self.cur_list):
+        nxt = self._current_row() + 1
+        if nxt >= self.proxy.rowCount():
             self.voice.speak("You are at the last message."); return
         self.table.selectRow(nxt); self.on_read_selected()
 
@@ -478,15 +686,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.viewer.setPlainText(txt)
         self._set_status_idle("Message ready")
 
-    def on_search(self):
+    def on_search(self, fuzzy: bool = False):
         q = self.search_edit.text().strip()
         if not q:
             QtWidgets.QMessageBox.information(self, "Search", "Type a keyword to search."); return
+        self.list_kind = "search"; self.list_query = q; self.list_fuzzy = fuzzy
         self._set_status_working(f"Searching for {q}…")
-        worker = Worker(self.mail.search, q, 10)
+        worker = self._mail_worker('search', q, self.page_size, 0, fuzzy)
         worker.signals.success.connect(self._populate_table)
         worker.signals.error.connect(self._error)
-        self.pool.start(worker)
+        self._start(worker)
 
     def on_compose(self):
         dlg = ComposeDialog(self, contacts=self.contacts, voice=(self.voice if self.use_mic else None))
@@ -495,61 +704,113 @@ class MainWindow(QtWidgets.QMainWindow):
             if not to_email or '@' not in to_email:
                 QtWidgets.QMessageBox.warning(self, "Compose", "Please provide a valid recipient email.")
                 return
-            self._set_status_working("Sending…")
-            worker = Worker(self.mail.send, to_email, subject or "(no subject)", body or "")
-            worker.signals.success.connect(lambda _: (self._set_status_idle("Sent"), QtWidgets.QMessageBox.information(self, "Compose", "Sent.")))
-            worker.signals.error.connect(self._error)
-            self.pool.start(worker)
+            self._queue_send(to_email, subject or "(no subject)", body or "")
 
     def on_reply(self):
-        row = self.table.currentRow()
-        if row < 0 or row >= len(self.cur_list):
+        it = self._current_summary()
+        if it is None:
             QtWidgets.QMessageBox.information(self, "Reply", "Please select a message."); return
-        idx = int(self.table.item(row, 0).text()); uid = self.uid_map.get(idx)
-        if not uid:
-            QtWidgets.QMessageBox.warning(self, "Reply", "Internal mapping error."); return
-        frm, subj, _ = self.mail.fetch_message(uid)
+        uid = it.uid
+        frm, subj, _ = self.mail.fetch_message(uid, max_bytes=BODY_PREVIEW_BYTES)  # usually a body-cache hit
         to_email = strip_address(frm)
         if '@' not in to_email:
             QtWidgets.QMessageBox.warning(self, "Reply", "Could not detect a valid reply address."); return
         text, ok = QtWidgets.QInputDialog.getMultiLineText(self, "Reply", f"To: {to_email}\nSubject: Re: {subj or '(no subject)'}", "")
         if not ok or not text.strip(): return
-        self._set_status_working("Sending reply…")
-        worker = Worker(self.mail.send, to_email, "Re: " + (subj or "(no subject)"), text.strip())
-        worker.signals.success.connect(lambda _: (self._set_status_idle("Reply sent"), QtWidgets.QMessageBox.information(self, "Reply", "Reply sent.")))
-        worker.signals.error.connect(self._error)
-        self.pool.start(worker)
+        self._queue_send(to_email, "Re: " + (subj or "(no subject)"), text.strip())
 
-    def on_mark_read(self):
-        row = self.table.currentRow()
-        if row < 0 or row >= len(self.cur_list):
-            QtWidgets.QMessageBox.information(self, "Mark as Read", "Please select a message.")
-            return
-        idx_item = self.table.item(row, 0)
-        if not idx_item:
-            QtWidgets.QMessageBox.warning(self, "Mark as Read", "No row selected.")
-            return
+    # ----- Outbox -----
+    def _queue_send(self, to_email: str, subject: str, body: str):
         try:
-            idx = int(idx_item.text())
-        except Exception:
-            QtWidgets.QMessageBox.warning(self, "Mark as Read", "Invalid selection.")
+            self.sender.enqueue(to_email, subject, body)
+        except Exception as e:
+            self._error(f"Could not save the message to the outbox, so it was not sent.\n{e}"); return
+        self._set_status_idle(f"Sending to {to_email}…")
+        self._say("Saved to your outbox. It is being sent now.")
+
+    def _on_outbox_event(self, ev):
+        """Report an OutboxSender result: (kind, OutboxItem)."""
+        kind, item = ev
+        if kind == "sent":
+            self._set_status_idle(f"Sent to {item.to}")
+            if item.last_error:
+                self._say(f"Your message to {item.to} was sent, but some addresses refused it.")
+                QtWidgets.QMessageBox.warning(self, "Outbox", f"Sent, but not to:\n{item.last_error}")
+            else:
+                self._say(f"Your message to {item.to} was sent.")
+        elif kind == "retry":
+            self._set_status_idle(f"Sending to {item.to} failed; retrying (try {item.attempts})")
+            if item.attempts == 1:
+                self._say(f"Your message to {item.to} could not be sent yet. I will keep trying.")
+        elif kind == "dead":
+            self._set_status_idle("Send failed")
+            self._say(f"Your message to {item.to} could not be sent.")
+            QtWidgets.QMessageBox.warning(self, "Outbox", f"Could not send to {item.to}:\n{item.last_error}\n\n"
+                                                          "It stays in the outbox; open Outbox to retry it.")
+
+    def on_outbox(self, retry: bool = False):
+        items = self.outbox.items()
+        stuck = any(it.state == "dead" or it.attempts for it in items)
+        if retry:
+            n = self.sender.retry_now()
+            self._say(f"Retrying {n} message{'s' if n != 1 else ''}." if n else "There is nothing to retry.")
             return
+        summary = outbox_summary(items)
+        self._say(summary)
+        box = QtWidgets.QMessageBox(self); box.setWindowTitle("Outbox"); box.setText(summary)
+        lines = [f"{'Waiting' if it.state == 'queued' else 'Failed'}: {it.to} — {it.subject}"
+                 + (f" ({it.last_error})" if it.last_error else "") for it in items]
+        if lines:
+            box.setDetailedText("\n".join(lines))
+        retry_btn = box.addButton("Retry now", QtWidgets.QMessageBox.ButtonRole.ActionRole) if stuck else None
+        box.addButton(QtWidgets.QMessageBox.StandardButton.Close)
+        box.exec()
+        if retry_btn is not None and box.clickedButton() is retry_btn:
+            self.on_outbox(retry=True)
+
+    def on_forward(self, who: str):
+        it = self._current_summary()
+        if it is None:
+            QtWidgets.QMessageBox.information(self, "Forward", "Please select a message."); return
+        to_email = resolve_contact(who, self.contacts)
+        if not to_email:
+            self.voice.speak(f"I could not find {who} in your contacts."); return
+        self._set_status_working("Preparing to forward…")
+        worker = self._mail_worker('fetch_message', it.uid, BODY_PREVIEW_BYTES)  # usually a body-cache hit
+        worker.signals.success.connect(lambda tup: self._confirm_forward(who, to_email, tup))
+        worker.signals.error.connect(self._error)
+        self._start(worker)
+
+    def _confirm_forward(self, who: str, to_email: str, tup):
+        frm, subj, body = tup
+        self._set_status_idle("Message ready")
+        ans = QtWidgets.QMessageBox.question(self, "Forward", f"Forward \"{subj or '(no subject)'}\" to {who}?\n\n{to_email}")
+        if ans != QtWidgets.QMessageBox.StandardButton.Yes: return
+        self._queue_send(to_email, "Fwd: " + (subj or "(no subject)"), forward_text(frm, subj, body))
 
-        uid = self.uid_map.get(idx)
-        if not uid:
-            QtWidgets.QMessageBox.warning(self, "Mark as Read", "Internal mapping error.")
+    def on_mark_read(self):
+        it = self._current_summary()
+        if it is None:
+            QtWidgets.QMessageBox.information(self, "Mark as Read", "Please select a message.")
             return
+        uid = it.uid
 
         self._set_status_working("Marking as read…")
-        worker = Worker(self.mail.mark_seen, uid)
+        worker = self._mail_worker('mark_seen', uid)
         worker.signals.success.connect(lambda _: (
             self._set_status_idle("Marked as read"),
             QtWidgets.QMessageBox.information(self, "Mark as Read", "Marked as read.")
         ))
         worker.signals.error.connect(self._error)
-        self.pool.start(worker)
+        self._start(worker)
 
     # ----- Speak / Stop -----
+    def _say(self, text):
+        """Speak `text` in the background unless something is already being spoken."""
+        if self.voice_thread and self.voice_thread.is_alive(): return
+        self.voice_thread = threading.Thread(target=self._speak_async, args=(text,), daemon=True)
+        self.voice_thread.start()
+
     def _speak_async(self, text):
         self._set_status_working("Speaking…")
         try:
@@ -594,32 +855,42 @@ class MainWindow(QtWidgets.QMainWindow):
         self.cmd_edit.setText(cmd); self._execute_command(cmd)
 
     def _execute_command(self, cmd: str):
-        if self.cur_list and not any(w in cmd for w in ["read","open","compose","search","reply","mark","check","inbox","next"]):
+        if self.cur_list and not any(w in cmd for w in ["read","open","compose","search","reply","mark","check","inbox","next","send","forward","outbox","cache"]):
             idx = extract_index(cmd)
             if idx != -1:
                 cmd = f"read number {idx}"
 
         if "help" in cmd:
-            self.voice.speak("You can say: check inbox, read number two, read next, compose, search for invoice, reply, or mark as read."); return
+            self.voice.speak("You can say: check inbox, read number two, read next, next page, previous page, compose, search for invoice, reply, send this to the team, mark as read, what's in my outbox, retry outbox, or cache stats."); return
+        if "cache" in cmd and "stat" in cmd:
+            self._say(cache_summary(self.mail.body_cache_stats())); return
+        if "outbox" in cmd:
+            self.on_outbox(retry=any(w in cmd for w in ("retry", "try again", "resend"))); return
         if ("check" in cmd and "inbox" in cmd) or "unread" in cmd:
             self.on_check_inbox(); return
+        if "next page" in cmd or "more messages" in cmd:
+            self.on_next_page(); return
+        if "previous page" in cmd:
+            self.on_previous_page(); return
         if "read next" in cmd or cmd.strip()=="next":
             self.on_read_next(); return
         if "read" in cmd and ("number" in cmd or re.search(r"\bread\s+\d+\b", cmd)):
             n = extract_index(cmd)
             if n == -1:
                 self.voice.speak("Please say the message number, like read number two."); return
-            for r in range(self.table.rowCount()):
-                if int(self.table.item(r,0).text()) == n:
-                    self.table.selectRow(r); self.on_read_selected(); return
+            if self._select_number(n):
+                self.on_read_selected(); return
             self.voice.speak("That number is not in the current list."); return
+        m = re.search(r"\b(?:send|forward) (?:this|it|that)(?: message| email)? to (.+)", cmd)
+        if m:
+            self.on_forward(m.group(1).strip()); return
         if "compose" in cmd or "send email" in cmd:
             self.on_compose(); return
         if "search" in cmd:
-            q = cmd.split("search",1)[1].replace("for","").strip()
+            q = re.sub(r"^\s*for\b", "", cmd.split("search",1)[1]).strip()
             if not q:
                 self.voice.speak("Say search for, then a keyword."); return
-            self.search_edit.setText(q); self.on_search(); return
+            self.search_edit.setText(q); self.on_search(fuzzy=True); return
         if "reply" in cmd:
             self.on_reply(); return
         if "mark" in cmd and "read" in cmd:
@@ -643,6 +914,19 @@ class MainWindow(QtWidgets.QMainWindow):
                 pass
             QtWidgets.QMessageBox.information(self, "Settings", "Saved. Some changes require restart.")
 
+    def closeEvent(self, event):
+        if self.listener is not None:
+            self.listener.stop()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.indexer is not None:
+            self.indexer.stop()
+        self.sender.stop()
+        self.mail.close()
+        if self.bridge is not None:
+            self.bridge.close(self.amail.close())
+        super().closeEvent(event)
+
     # ----- Error -----
     def _error(self, msg: str):
         self._set_status_idle("Error")
@@ -650,9 +934,15 @@ class MainWindow(QtWidgets.QMainWindow):
 
 # -------- Main --------
 def main():
+    load_dotenv()
     app = QtWidgets.QApplication(sys.argv)
     f = app.font(); f.setPointSize(12); app.setFont(f)
-    w = MainWindow(); w.show()
+    loop = install_qt_loop(app) if os.getenv('ASYNC_MAIL', '0') == '1' else None
+    w = MainWindow(loop); w.show()
+    if loop is not None:
+        with loop:
+            loop.run_forever()
+        sys.exit(0)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
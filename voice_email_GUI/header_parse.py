@@ -0,0 +1,99 @@
+from email.header import decode_header, make_header
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+# Listing-path header parsing. email.message_from_bytes builds a full Message (policy,
+# defects, payload, a list of every header) per message; listings only ever read a
+# handful of fields, so HeaderParser keeps just those, as plain strings.
+
+
+# Distinct encoded values remembered by decode_value; newsletters and threads repeat
+# the same senders and subjects all the time.
+DECODE_CACHE_SIZE = 4096
+
+
+def decode_value(h) -> str:
+    """RFC 2047 encoded-words -> text; the value unchanged if it can't be decoded."""
+    if not h:
+        return ""
+    if not isinstance(h, str):
+        return _decode_words(h)  # an email.header.Header from Message.get
+    if '=?' not in h:
+        return h  # nothing encoded, which is most values
+    return _decode_cached(h)
+
+
+def _decode_words(h) -> str:
+    try:
+        return str(make_header(decode_header(h)))
+    except Exception:
+        return h
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def _decode_cached(h: str) -> str:
+    return _decode_words(h)
+
+
+class HeaderFields:
+    """
+    The wanted fields of one header block, raw (unfolded, not yet RFC 2047 decoded).
+
+    get() mirrors Message.get (case-insensitive name, first occurrence, `default` if
+    absent); decoded() does the RFC 2047 work, only for the fields actually read.
+    """
+
+    __slots__ = ('_index', '_values')
+
+    def __init__(self, index: Dict[str, int], values: Tuple[Optional[str], ...]):
+        self._index = index
+        self._values = values
+
+    def get(self, name: str, default=None):
+        i = self._index.get(name.lower())
+        v = self._values[i] if i is not None else None
+        return default if v is None else v
+
+    def decoded(self, name: str) -> str:
+        return decode_value(self.get(name))
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __repr__(self):
+        names = sorted(self._index, key=self._index.get)
+        return "HeaderFields(%r)" % {n: v for n, v in zip(names, self._values) if v is not None}
+
+
+class HeaderParser:
+    """Parses raw header blocks into HeaderFields holding only `fields`."""
+
+    def __init__(self, fields: Iterable[str]):
+        self._index: Dict[str, int] = {}
+        for f in fields:
+            self._index.setdefault(f.lower(), len(self._index))
+
+    def parse(self, raw: bytes) -> HeaderFields:
+        try:
+            text = raw.decode('utf-8')
+        except UnicodeDecodeError:
+            text = raw.decode('latin-1')  # 8-bit junk: keep every byte, like surrogateescape would
+        index = self._index
+        values = [None] * len(index)
+        current = -1  # slot of the field being continued by folded lines, -1 if not wanted
+        for line in text.split('\n'):
+            line = line.rstrip('\r')
+            if not line:
+                break  # end of the header block
+            if line[0] in ' \t':
+                if current >= 0:
+                    values[current] += line
+                continue
+            name, sep, value = line.partition(':')
+            i = index.get(name.rstrip().lower()) if sep else None
+            if i is None or values[i] is not None:
+                current = -1  # unwanted, or a repeat (get() returns the first one, like Message)
+                continue
+            values[i] = value.lstrip(' \t')
+            current = i
+        return HeaderFields(index, tuple(values))
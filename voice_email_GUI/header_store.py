@@ -0,0 +1,118 @@
+import sqlite3, threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from imap_util import sequence_set, parse_sequence_set
+
+
+class HeaderStore:
+    """
+    Persistent header cache keyed by (mailbox, UIDVALIDITY, UID).
+
+    Headers of a given UID never change on the server, so once stored they can be
+    served from disk forever; only a UIDVALIDITY change invalidates a mailbox.
+    It also remembers the last inbox listing so the UI can show it at cold start,
+    and the per-mailbox sync state (HIGHESTMODSEQ, known and unseen UIDs).
+
+    Only the header `fields` the client asks the server for are stored; opening the
+    file with a different field set drops the cached headers (and listings built
+    from them) rather than serving messages with fields missing.
+    """
+
+    def __init__(self, path: str, fields: Iterable[str] = ()):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS headers ("
+                " mailbox TEXT NOT NULL, uidvalidity INTEGER NOT NULL, uid INTEGER NOT NULL,"
+                " raw BLOB NOT NULL, PRIMARY KEY (mailbox, uidvalidity, uid))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS listings ("
+                " mailbox TEXT NOT NULL, name TEXT NOT NULL, uidvalidity INTEGER NOT NULL,"
+                " uids TEXT NOT NULL, PRIMARY KEY (mailbox, name))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                " mailbox TEXT PRIMARY KEY, uidvalidity INTEGER NOT NULL, highestmodseq INTEGER NOT NULL,"
+                " uids TEXT NOT NULL, unseen TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            wanted = " ".join(sorted(f.lower() for f in fields))
+            row = self._db.execute("SELECT value FROM meta WHERE key='header_fields'").fetchone()
+            if row is None or row[0] != wanted:
+                self._db.execute("DELETE FROM headers")
+                self._db.execute("DELETE FROM listings")
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('header_fields', ?)", (wanted,))
+
+    def get_many(self, mailbox: str, uidvalidity: int, uids: Iterable[int]) -> Dict[int, bytes]:
+        uids = list(uids)
+        out: Dict[int, bytes] = {}
+        with self._lock:
+            # stay below SQLite's bound-parameter limit
+            for i in range(0, len(uids), 500):
+                chunk = uids[i:i + 500]
+                q = ("SELECT uid, raw FROM headers WHERE mailbox=? AND uidvalidity=? AND uid IN (%s)"
+                     % ",".join("?" * len(chunk)))
+                for uid, raw in self._db.execute(q, (mailbox, uidvalidity, *chunk)):
+                    out[uid] = raw
+        return out
+
+    def put_many(self, mailbox: str, uidvalidity: int, items: Dict[int, bytes]):
+        if not items:
+            return
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO headers (mailbox, uidvalidity, uid, raw) VALUES (?, ?, ?, ?)",
+                [(mailbox, uidvalidity, uid, raw) for uid, raw in items.items()],
+            )
+
+    def forget_other_epochs(self, mailbox: str, uidvalidity: int):
+        """Drop everything cached for `mailbox` under a different UIDVALIDITY."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM headers WHERE mailbox=? AND uidvalidity<>?", (mailbox, uidvalidity))
+            self._db.execute("DELETE FROM listings WHERE mailbox=? AND uidvalidity<>?", (mailbox, uidvalidity))
+            self._db.execute("DELETE FROM sync_state WHERE mailbox=? AND uidvalidity<>?", (mailbox, uidvalidity))
+
+    def save_listing(self, mailbox: str, name: str, uidvalidity: int, uids: List[int]):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO listings (mailbox, name, uidvalidity, uids) VALUES (?, ?, ?, ?)",
+                (mailbox, name, uidvalidity, " ".join(map(str, uids))),
+            )
+
+    def load_listing(self, mailbox: str, name: str) -> Optional[Tuple[int, List[int]]]:
+        """Return (uidvalidity, uids) of the last saved listing, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT uidvalidity, uids FROM listings WHERE mailbox=? AND name=?", (mailbox, name)
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], [int(u) for u in row[1].split()]
+
+    def save_sync_state(self, mailbox: str, uidvalidity: int, highestmodseq: int,
+                        uids: Iterable[int], unseen: Iterable[int]):
+        # UID lists are stored as IMAP sequence sets, so a 50k mailbox is usually a few bytes.
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_state (mailbox, uidvalidity, highestmodseq, uids, unseen)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (mailbox, uidvalidity, highestmodseq, sequence_set(uids), sequence_set(unseen)),
+            )
+
+    def load_sync_state(self, mailbox: str) -> Optional[Tuple[int, int, List[int], List[int]]]:
+        """Return (uidvalidity, highestmodseq, uids, unseen), or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT uidvalidity, highestmodseq, uids, unseen FROM sync_state WHERE mailbox=?", (mailbox,)
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], row[1], parse_sequence_set(row[2]), parse_sequence_set(row[3])
+
+    def close(self):
+        with self._lock:
+            self._db.close()
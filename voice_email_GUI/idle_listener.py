@@ -0,0 +1,157 @@
+import queue, re, socket, threading, time
+from typing import Callable, List, NamedTuple, Optional
+
+from email_client import EmailClient, MessageId
+from imap_sync import MailboxState, SyncResult
+from message_summary import SummaryList
+
+# RFC 2177: servers may drop an IDLE after 30 minutes, so re-issue it well before that.
+REIDLE_SECONDS = 25 * 60
+
+_ACTIVITY_RE = re.compile(rb'^\* (\d+ (EXISTS|EXPUNGE|FETCH)|VANISHED)\b')
+
+
+class MailboxEvent(NamedTuple):
+    """Incremental change pushed by IdleListener."""
+    mailbox: str
+    new: SummaryList           # summaries of arrived messages, newest first (merge before display)
+    seen: List[MessageId]      # marked read elsewhere
+    unseen: List[MessageId]    # marked unread elsewhere
+    vanished: List[MessageId]  # deleted/expunged
+    reset: bool                # local state was rebuilt; do a full refresh instead
+
+
+class IdleListener(threading.Thread):
+    """
+    Background push listener on its own IMAP connection.
+
+    - Uses IDLE when the server supports it (re-issued every REIDLE_SECONDS),
+      otherwise polls with NOOP every `poll_seconds`.
+    - On any activity it runs an incremental sync of `mail` itself, so the sync state,
+      body cache and search index see each change once. Changes found by any sync of
+      `mail` (a listing, the search indexer) are reported too.
+    - Calls `on_event(MailboxEvent)` from this thread; GUI callers must hop back to
+      their own thread.
+    - Reconnects with exponential backoff (up to 60 s) after network errors.
+    """
+
+    def __init__(self, mail: EmailClient, on_event: Callable[[MailboxEvent], None], mailbox: str = "INBOX",
+                 primary_only: bool = True, poll_seconds: int = 60, reidle_seconds: int = REIDLE_SECONDS):
+        super().__init__(daemon=True, name="imap-idle")
+        self.client = mail
+        self.on_event = on_event
+        self.mailbox = mailbox
+        self.primary_only = primary_only
+        self.poll_seconds = poll_seconds
+        self.reidle_seconds = reidle_seconds
+        self._stop_evt = threading.Event()
+        # (uidvalidity, result, seen, unseen) from syncs of `mail`, waiting to be reported
+        self._changes: "queue.Queue" = queue.Queue()
+        mail.add_sync_listener(self._on_sync)
+
+    def stop(self):
+        self._stop_evt.set()
+
+    def _on_sync(self, mailbox: str, state: MailboxState, res: SyncResult):
+        # runs in whichever thread synced; read the flags now, a later sync changes them
+        if mailbox == self.mailbox:
+            self._changes.put((state.uidvalidity, res, [u for u in res.changed if u not in state.unseen],
+                               [u for u in res.changed if u in state.unseen]))
+
+    # ---------- loop ----------
+    def run(self):
+        backoff = 1
+        while not self._stop_evt.is_set():
+            try:
+                self._sync_and_emit()  # catch up on whatever happened while disconnected
+                backoff = 1
+                with self.client.idle_connection(self.mailbox) as conn:
+                    while not self._stop_evt.is_set():
+                        if 'IDLE' in conn.imap.capabilities:
+                            active = self._idle(conn.imap)
+                        else:
+                            active = self._poll(conn.imap)
+                        if (active or not self._changes.empty()) and not self._stop_evt.is_set():
+                            self._sync_and_emit()
+            except Exception:
+                self._stop_evt.wait(backoff)
+                backoff = min(backoff * 2, 60)
+        self.client.remove_sync_listener(self._on_sync)
+
+    def _sync_and_emit(self):
+        self.client.sync(self.mailbox, background=True)  # what it finds arrives through _on_sync
+        while not self._stop_evt.is_set():
+            try:
+                uidvalidity, res, seen, unseen = self._changes.get_nowait()
+            except queue.Empty:
+                return
+            ident = lambda uid: MessageId(self.mailbox, uidvalidity, uid)
+            if res.full:
+                self.on_event(MailboxEvent(self.mailbox, SummaryList(), [], [], [], True))
+                continue
+            new = (self.client.summarize_uids(sorted(res.new, reverse=True), self.mailbox, self.primary_only)
+                   if res.new else SummaryList())
+            self.on_event(MailboxEvent(self.mailbox, new, [ident(u) for u in seen], [ident(u) for u in unseen],
+                                       [ident(u) for u in res.vanished], False))
+
+    def _poll(self, imap) -> bool:
+        """NOOP fallback: True if the server reported new, changed or expunged messages."""
+        if self._stop_evt.wait(self.poll_seconds):
+            return False
+        for code in ('EXISTS', 'EXPUNGE', 'FETCH', 'VANISHED'):
+            imap.response(code)
+        imap.noop()
+        return any(imap.response(code)[1][0] is not None for code in ('EXISTS', 'EXPUNGE', 'FETCH', 'VANISHED'))
+
+    def _idle(self, imap) -> bool:
+        """
+        One IDLE round. Returns True on mailbox activity, False on stop, re-IDLE timeout
+        or when another sync of the client queued changes to report.
+        imaplib (before 3.14) has no IDLE, so the raw socket is read directly with a short
+        timeout; that keeps imaplib's buffered reader untouched for the commands that follow.
+        """
+        tag = imap._new_tag()
+        imap.tagged_commands.pop(tag, None)
+        imap.send(tag + b' IDLE\r\n')
+        sock = imap.sock
+        old_timeout = sock.gettimeout()
+        buf = b''
+
+        def readline(timeout: float) -> Optional[bytes]:
+            nonlocal buf
+            deadline = time.monotonic() + timeout
+            while b'\n' not in buf:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+                sock.settimeout(left)
+                try:
+                    chunk = sock.recv(4096)
+                except socket.timeout:
+                    return None
+                if not chunk:
+                    raise ConnectionError("IMAP connection closed during IDLE")
+                buf += chunk
+            line, buf = buf.split(b'\n', 1)
+            return line + b'\n'
+
+        try:
+            line = readline(30)
+            if not line or not line.startswith(b'+'):
+                raise imap.abort(f"IDLE refused: {line!r}")
+            active = False
+            deadline = time.monotonic() + self.reidle_seconds
+            while not self._stop_evt.is_set() and time.monotonic() < deadline and self._changes.empty():
+                line = readline(1.0)
+                if line and _ACTIVITY_RE.match(line):
+                    active = True
+                    break
+            imap.send(b'DONE\r\n')
+            while True:
+                line = readline(30)
+                if line is None:
+                    raise imap.abort("no reply to IDLE DONE")
+                if line.startswith(tag):
+                    return active
+        finally:
+            sock.settimeout(old_timeout)
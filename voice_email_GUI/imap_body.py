@@ -0,0 +1,247 @@
+import base64, binascii, codecs, email, quopri, re
+from email.message import Message
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Partial body fetch: read BODYSTRUCTURE, pick the readable text part and download only
+# that section (optionally only its first bytes) with BODY.PEEK, which leaves \Seen alone.
+
+# Enough text for the spoken preview; the full part is fetched when max_bytes is None.
+BODY_PREVIEW_BYTES = 8192
+
+# Range size when streaming a part (see EmailClient.stream_message).
+STREAM_CHUNK_BYTES = 4096
+
+# One round trip for everything needed to choose a part and announce the message.
+STRUCTURE_ITEMS = '(BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE)])'
+
+_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\x00(\d+)\x00|([^\s()"\x00]+))', re.S)
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])["\')\]]*\s+|\n\s*\n')
+_TAG_RE = re.compile(r'<[^<]+?>')
+_SECTION_LITERAL_RE = re.compile(rb'BODY\[([^\]]*)\](?:<\d+>)? \{\d+\}$', re.I)
+
+
+class TextPart(NamedTuple):
+    section: str     # IMAP section number, e.g. '1' or '2.1'
+    subtype: str     # 'plain' or 'html'
+    encoding: str    # Content-Transfer-Encoding, lower case
+    charset: str
+    size: int        # encoded size in bytes
+
+
+def _flatten(data) -> Tuple[bytes, List[bytes]]:
+    """imaplib FETCH data -> one line with literals replaced by \\x00n\\x00 markers, plus the literals."""
+    buf, lits = b'', []
+    for it in data:
+        if isinstance(it, tuple):
+            head = re.sub(rb'\{\d+\}$', b'', it[0])
+            buf += head + b'\x00%d\x00' % len(lits)
+            lits.append(it[1])
+        elif it:
+            buf += it
+    return buf, lits
+
+
+def _parse_list(buf: bytes, pos: int, lits: List[bytes]):
+    """Parse the parenthesized list starting at buf[pos] == '('. Returns (list, end position)."""
+    out: List = []
+    stack = [out]
+    pos += 1
+    while stack:
+        m = _TOKEN_RE.match(buf, pos)
+        if not m:
+            raise ValueError("unterminated list in BODYSTRUCTURE")
+        pos = m.end()
+        if m.group(1):
+            child: List = []
+            stack[-1].append(child)
+            stack.append(child)
+        elif m.group(2):
+            stack.pop()
+        elif m.group(3) is not None:
+            stack[-1].append(re.sub(rb'\\(.)', rb'\1', m.group(3)))
+        elif m.group(4) is not None:
+            stack[-1].append(lits[int(m.group(4))])
+        else:
+            atom = m.group(5)
+            stack[-1].append(None if atom.upper() == b'NIL' else atom)
+    return out, pos
+
+
+def parse_bodystructure(data) -> Optional[List]:
+    """The BODYSTRUCTURE of a single-message FETCH reply as nested lists (NIL -> None), or None."""
+    buf, lits = _flatten(data)
+    i = buf.upper().find(b'BODYSTRUCTURE (')
+    if i < 0:
+        return None
+    try:
+        return _parse_list(buf, i + len(b'BODYSTRUCTURE '), lits)[0]
+    except (ValueError, IndexError):
+        return None
+
+
+def body_literals(data) -> Dict[str, bytes]:
+    """BODY[...] literals of a FETCH reply keyed by section, e.g. {'1': ..., 'HEADER.FIELDS': ...}."""
+    out: Dict[str, bytes] = {}
+    for it in data:
+        if isinstance(it, tuple):
+            m = _SECTION_LITERAL_RE.search(it[0])
+            if m:
+                key = m.group(1).split(b' ', 1)[0].decode().upper()
+                out[key] = it[1]
+    return out
+
+
+def _s(v) -> str:
+    return v.decode(errors='ignore').lower() if isinstance(v, bytes) else ""
+
+
+def _is_attachment(node: List, ext_at: int) -> bool:
+    disp = node[ext_at] if len(node) > ext_at else None
+    return isinstance(disp, list) and bool(disp) and _s(disp[0]) == 'attachment'
+
+
+def _leading_lists(node: List):
+    for c in node:
+        if not isinstance(c, list):
+            return
+        yield c
+
+
+def _text_parts(node: List, section: str):
+    if node and isinstance(node[0], list):
+        # multipart: the child parts come first, then the subtype and extension data
+        for i, child in enumerate(_leading_lists(node), start=1):
+            yield from _text_parts(child, f"{section}.{i}" if section else str(i))
+        return
+    if _s(node[0]) != 'text' or _is_attachment(node, 9):
+        return
+    params = node[2] if isinstance(node[2], list) else []
+    charset = next((_s(params[k + 1]) for k in range(0, len(params) - 1, 2) if _s(params[k]) == 'charset'), "")
+    try:
+        size = int(node[6])
+    except (TypeError, ValueError):
+        size = 0
+    yield TextPart(section or "1", _s(node[1]), _s(node[5]) or '7bit', charset or 'utf-8', size)
+
+
+def pick_text_part(structure: Optional[List]) -> Optional[TextPart]:
+    """First inline text/plain part, else the first text/html one; None if there is none."""
+    if not structure:
+        return None
+    parts = list(_text_parts(structure, ""))
+    for want in ('plain', 'html'):
+        for p in parts:
+            if p.subtype == want:
+                return p
+    return None
+
+
+def body_item(part: TextPart, max_bytes: Optional[int] = None) -> str:
+    """FETCH item for `part`, e.g. 'BODY.PEEK[1]<0.8192>'."""
+    rng = f"<0.{max_bytes}>" if max_bytes is not None and max_bytes < part.size else ""
+    return f"BODY.PEEK[{part.section}]{rng}"
+
+
+def decode_part(raw: bytes, part: TextPart, truncated: bool = False) -> str:
+    """Undo the transfer encoding and charset of `raw`; a cut-off base64 tail is dropped."""
+    try:
+        if part.encoding == 'base64':
+            b64 = re.sub(rb'[^A-Za-z0-9+/=]', b'', raw)
+            if truncated:
+                b64 = b64[: len(b64) // 4 * 4]
+            raw = base64.b64decode(b64)
+        elif part.encoding == 'quoted-printable':
+            raw = quopri.decodestring(raw)
+    except (binascii.Error, ValueError):
+        pass
+    try:
+        return raw.decode(part.charset, errors='ignore')
+    except LookupError:
+        return raw.decode('utf-8', errors='ignore')
+
+
+def header_message(data) -> Message:
+    """The headers fetched with STRUCTURE_ITEMS, parsed."""
+    return email.message_from_bytes(body_literals(data).get('HEADER.FIELDS', b''))
+
+
+# ---------- streaming ----------
+class PartDecoder:
+    """Incremental decode_part: feed() encoded chunks in order, get text back as soon as it is complete."""
+
+    def __init__(self, part: TextPart):
+        self.part = part
+        self._pending = b''     # encoded bytes that can't be decoded yet
+        self._markup = ''       # an unfinished HTML tag
+        self.errors = 0         # chunks whose transfer encoding couldn't be undone
+        try:
+            self._chars = codecs.getincrementaldecoder(part.charset)(errors='ignore')
+        except LookupError:
+            self._chars = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+
+    def feed(self, raw: bytes, final: bool = False, truncated: bool = False) -> str:
+        """
+        Text decoded so far from `raw` and what came before. `truncated` (with `final`)
+        means the part was cut short, e.g. at max_bytes: like decode_part, a partial
+        base64 group at the end is dropped instead of failing the whole chunk.
+        """
+        buf = self._pending + raw
+        if self.part.encoding == 'base64':
+            buf = re.sub(rb'[^A-Za-z0-9+/=]', b'', buf)
+            cut = len(buf) if final and not truncated else len(buf) // 4 * 4
+        elif self.part.encoding == 'quoted-printable':
+            # soft line breaks and =XX escapes never span a newline
+            cut = len(buf) if final else buf.rfind(b'\n') + 1
+        else:
+            cut = len(buf)
+        chunk, self._pending = buf[:cut], buf[cut:]
+        try:
+            if self.part.encoding == 'base64':
+                chunk = base64.b64decode(chunk)
+            elif self.part.encoding == 'quoted-printable':
+                chunk = quopri.decodestring(chunk)
+        except (binascii.Error, ValueError):
+            self.errors += 1
+            chunk = self._salvage(chunk)
+        text = self._chars.decode(chunk, final)
+        if self.part.subtype != 'html':
+            return text
+        text = self._markup + text
+        open_at = text.rfind('<')
+        if not final and open_at > text.rfind('>'):
+            text, self._markup = text[:open_at], text[open_at:]
+        else:
+            self._markup = ''
+        return _TAG_RE.sub('', text)
+
+    def _salvage(self, chunk: bytes) -> bytes:
+        """What can still be decoded from a malformed chunk: base64 up to the last whole group."""
+        if self.part.encoding != 'base64':
+            return chunk
+        try:
+            return base64.b64decode(chunk[: len(chunk) // 4 * 4])
+        except (binascii.Error, ValueError):
+            return b''
+
+
+def iter_sentences(pieces: Iterable[str], max_len: int = 400) -> Iterator[str]:
+    """Re-chunk streamed text into sentences (or paragraphs, or `max_len` runs) as they complete."""
+    buf = ''
+    for piece in pieces:
+        buf += piece
+        while True:
+            m = _SENTENCE_END_RE.search(buf)
+            if m:
+                head, buf = buf[:m.start()], buf[m.end():]
+            elif len(buf) > max_len:
+                cut = buf.rfind(' ', 0, max_len)
+                cut = cut if cut > 0 else max_len
+                head, buf = buf[:cut], buf[cut:]
+            else:
+                break
+            head = ' '.join(head.split())
+            if head:
+                yield head
+    tail = ' '.join(buf.split())
+    if tail:
+        yield tail
@@ -0,0 +1,192 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Iterable, List, Optional, Set
+
+from imap_pool import ImapConnection, CONNECTION_ERRORS
+from imap_util import sequence_set, literal_size, split_untagged, split_tagged, response_uid
+
+
+class Pending:
+    """One in-flight command; `future` can be a concurrent or an asyncio Future."""
+
+    def __init__(self, future, untagged: str, uids: Optional[Set[int]], slot: bool = True):
+        self.future = future
+        self.untagged = untagged      # response type collected as the result, e.g. 'FETCH'
+        self.uids = uids              # UID FETCH/STORE: route FETCH replies by UID
+        self.slot = slot              # holds one of the max_in_flight slots
+        self.data: List = []
+
+
+def route_untagged(pending: Iterable[Pending], typ: str, items: List) -> Optional[Pending]:
+    """
+    The command an untagged response belongs to: FETCH replies go to the UID command
+    whose UID set contains them, others to the oldest command expecting that type.
+    """
+    pending = list(pending)
+    if typ == 'FETCH':
+        uid = response_uid(items)
+        if uid is not None:
+            for p in pending:
+                if p.uids is not None and uid in p.uids:
+                    return p
+    for p in pending:
+        if p.untagged == typ and (typ != 'FETCH' or p.uids is None):
+            return p
+    return None
+
+
+class ImapPipeline:
+    """
+    Several tagged commands in flight on one connection.
+
+    imaplib waits for each tagged completion before sending the next command. Here
+    commands are written as soon as they are submitted (up to `max_in_flight`) and a
+    reader thread demultiplexes the replies:
+    - the tagged completion resolves the command's Future with (typ, data), where data
+      looks like imaplib's (literal-carrying items are (head, literal) tuples);
+    - untagged FETCH replies go to the pending UID command whose UID set contains them,
+      other untagged replies of the expected type go to the oldest pending command;
+    - anything else (EXISTS, EXPUNGE, ...) is kept in `unsolicited`.
+
+    Future callbacks run on the reader thread. A command submitted from one (e.g. the
+    body FETCH after a BODYSTRUCTURE reply) doesn't wait for a free slot: only the reader
+    frees slots, so waiting there could hang every command in flight.
+
+    The connection must not be used through imaplib while the pipeline is open; the
+    reader only touches the socket while commands are pending, so after close() the
+    connection can go back to the pool.
+    """
+
+    def __init__(self, conn: ImapConnection, max_in_flight: int = 16):
+        self.conn = conn
+        self.imap = conn.imap
+        self.unsolicited: List[tuple] = []
+        self.broken: Optional[BaseException] = None
+        self._pending: "OrderedDict[bytes, Pending]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read_loop, daemon=True, name="imap-pipeline")
+        self._reader.start()
+
+    # ---------- submitting ----------
+    def submit(self, name: str, *args, untagged: Optional[str] = None, uids: Iterable[int] = None) -> Future:
+        """Send `name args...` now; the Future resolves to (typ, data) like imaplib's return value."""
+        fut: Future = Future()
+        slot = threading.current_thread() is not self._reader
+        if slot:
+            self._slots.acquire()
+        with self._cond:
+            if self._closed or self.broken is not None:
+                if slot:
+                    self._slots.release()
+                fut.set_exception(self.broken or self.imap.abort("pipeline closed"))
+                return fut
+            tag = self.imap._new_tag()
+            self.imap.tagged_commands.pop(tag, None)
+            self._pending[tag] = Pending(fut, (untagged or name.split()[-1]).upper(),
+                                          set(uids) if uids is not None else None, slot)
+            line = tag + b' ' + ' '.join([name] + [str(a) for a in args if a is not None]).encode() + b'\r\n'
+            # write under the condition lock too, so tags hit the wire in registration order
+            try:
+                with self._write_lock:
+                    self.imap.send(line)
+            except CONNECTION_ERRORS as e:
+                self._fail_all(e)
+                return fut
+            self._cond.notify_all()
+        return fut
+
+    def submit_fetch(self, uids: List[int], items: str) -> Future:
+        """UID FETCH `items` for `uids`; resolves to (typ, data) ready for parse_fetch_response."""
+        return self.submit('UID FETCH', sequence_set(uids), items, untagged='FETCH', uids=uids)
+
+    def submit_store(self, uids: List[int], op: str = '+FLAGS', flags: str = '(\\Seen)') -> Future:
+        return self.submit('UID STORE', sequence_set(uids), op, flags, untagged='FETCH', uids=uids)
+
+    def submit_search(self, *criteria) -> Future:
+        return self.submit('UID SEARCH', *criteria, untagged='SEARCH')
+
+    def close(self, timeout: Optional[float] = 30):
+        """Wait for in-flight commands, then stop the reader. The connection is left idle."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._reader.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- reading ----------
+    def _read_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed and self.broken is None:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            try:
+                self._dispatch(self._read_response())
+            except BaseException as e:
+                self._fail_all(e if isinstance(e, CONNECTION_ERRORS) else self.imap.abort(str(e)))
+                return
+
+    def _read_response(self) -> List:
+        """One full response, literals included, as imaplib-style items."""
+        items: List = []
+        line = self.imap.readline()
+        if not line:
+            raise self.imap.abort("socket closed by server")
+        head = line.rstrip(b'\r\n')
+        while True:
+            n = literal_size(head)
+            if n is None:
+                items.append(head)
+                return items
+            items.append((head, self.imap.read(n)))
+            head = self.imap.readline().rstrip(b'\r\n')
+
+    def _dispatch(self, items: List):
+        first = items[0][0] if isinstance(items[0], tuple) else items[0]
+        if first.startswith(b'* '):
+            parsed = split_untagged(items)
+            if parsed is None:
+                self.unsolicited.append(('', items))
+                return
+            typ, data = parsed
+            with self._cond:
+                target = route_untagged(self._pending.values(), typ, data)
+                if target is not None:
+                    target.data.extend(data)
+                else:
+                    self.unsolicited.append((typ, data))
+            return
+        if first.startswith(b'+'):
+            raise self.imap.abort("unexpected continuation request in pipeline")
+        tagged = split_tagged(first)
+        if tagged is None:
+            raise self.imap.abort(f"unparseable response: {first[:80]!r}")
+        with self._cond:
+            p = self._pending.pop(tagged[0], None)
+            self._cond.notify_all()
+        if p is None:
+            return
+        if p.slot:
+            self._slots.release()
+        p.future.set_result((tagged[1], p.data or [None]))
+
+    def _fail_all(self, exc: BaseException):
+        with self._cond:
+            self.broken = exc
+            pending, self._pending = list(self._pending.values()), OrderedDict()
+            self._cond.notify_all()
+        for p in pending:
+            if p.slot:
+                self._slots.release()
+            if not p.future.done():
+                p.future.set_exception(exc)
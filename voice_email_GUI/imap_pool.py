@@ -0,0 +1,153 @@
+import imaplib, threading, time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+# Errors that mean the connection itself is gone (as opposed to a NO/BAD reply).
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+
+class ImapConnection:
+    """An authenticated imaplib connection plus what is currently selected on it."""
+
+    def __init__(self, imap):
+        self.imap = imap
+        self.mailbox: Optional[str] = None
+        self.uidvalidity: Optional[int] = None
+        self.exists = 0
+        self.highestmodseq = 0
+        self.condstore = False
+        self.qresync = False
+        self.last_used = time.monotonic()
+
+    def logout(self):
+        try:
+            self.imap.logout()
+        except Exception:
+            pass
+
+
+class ImapPool:
+    """
+    Thread-safe pool of IMAP connections.
+
+    - `connect()` must return a logged-in ImapConnection; failures are retried with
+      exponential backoff (0.5 s, 1 s, 2 s ...) up to `connect_attempts` times.
+    - A connection idle for more than `check_after` seconds is NOOP-checked before
+      it is handed out; dead ones are dropped and replaced transparently.
+    - Connections idle for more than `idle_timeout` seconds are logged out.
+    - Connections that raised a connection error inside `connection()` are discarded,
+      and the idle ones are NOOP-checked before their next use.
+    """
+
+    def __init__(self, connect: Callable[[], ImapConnection], max_size: int = 4,
+                 idle_timeout: float = 600, check_after: float = 60, connect_attempts: int = 4):
+        self._connect = connect
+        self.max_size = max(1, int(max_size))
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.connect_attempts = connect_attempts
+        self._idle: List[ImapConnection] = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            self.discard(conn, suspect_others=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.logout()
+
+    # ---------- checkout / checkin ----------
+    # connection() is the normal way in; these are for holders that outlive a `with` block
+    # (e.g. a pipeline). Every acquire() must end in exactly one release() or discard().
+    def acquire(self) -> ImapConnection:
+        while True:
+            stale: List[ImapConnection] = []
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise imaplib.IMAP4.abort("connection pool closed")
+                    now = time.monotonic()
+                    keep = [c for c in self._idle if now - c.last_used <= self.idle_timeout]
+                    stale = [c for c in self._idle if now - c.last_used > self.idle_timeout]
+                    self._idle = keep
+                    self._total -= len(stale)
+                    if self._idle:
+                        conn = self._idle.pop()  # most recently used: likeliest to have the right mailbox selected
+                        break
+                    if self._total < self.max_size:
+                        self._total += 1
+                        break
+                    self._cond.wait()
+            for c in stale:
+                c.logout()
+            if conn is None:
+                try:
+                    return self._open()
+                except BaseException:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            if time.monotonic() - conn.last_used <= self.check_after or self._healthy(conn):
+                return conn
+            self.discard(conn)
+
+    def release(self, conn: ImapConnection):
+        conn.last_used = time.monotonic()
+        with self._cond:
+            closed = self._closed
+            if closed:
+                self._total -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+        if closed:
+            conn.logout()
+
+    def discard(self, conn: ImapConnection, suspect_others: bool = False):
+        with self._cond:
+            self._total -= 1
+            if suspect_others:
+                # a dropped link usually means the network changed: re-check the rest before reuse
+                for c in self._idle:
+                    c.last_used = min(c.last_used, time.monotonic() - self.check_after - 1)
+            self._cond.notify()
+        conn.logout()
+
+    # ---------- internals ----------
+    def _healthy(self, conn: ImapConnection) -> bool:
+        try:
+            typ, _ = conn.imap.noop()
+            return typ == 'OK'
+        except Exception:
+            return False
+
+    def _open(self) -> ImapConnection:
+        delay = 0.5
+        for attempt in range(self.connect_attempts):
+            try:
+                return self._connect()
+            except CONNECTION_ERRORS:
+                if attempt == self.connect_attempts - 1:
+                    raise
+                time.sleep(delay)
+                delay *= 2
@@ -0,0 +1,119 @@
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from imap_util import parse_fetch_flags, parse_sequence_set, max_modseq, uid_search
+
+
+class MailboxState:
+    """
+    What we knew about a mailbox at the end of the last sync: its UIDVALIDITY,
+    HIGHESTMODSEQ (0 if the server has no CONDSTORE), every UID and the unseen ones.
+    """
+
+    def __init__(self, uidvalidity: int, highestmodseq: int = 0,
+                 uids: Optional[Iterable[int]] = None, unseen: Optional[Iterable[int]] = None):
+        self.uidvalidity = uidvalidity
+        self.highestmodseq = highestmodseq
+        self.uids: Set[int] = set(uids or ())
+        self.unseen: Set[int] = set(unseen or ())
+
+    def newest(self, unseen_only: bool = False) -> List[int]:
+        """UIDs newest first (UIDs grow with arrival order)."""
+        return sorted(self.unseen if unseen_only else self.uids, reverse=True)
+
+
+class SyncResult(NamedTuple):
+    new: List[int]        # UIDs that arrived since the last sync
+    changed: List[int]    # known UIDs whose seen/unseen state flipped
+    vanished: List[int]   # UIDs expunged since the last sync
+    full: bool            # state was rebuilt from scratch (first sync or UIDVALIDITY change)
+
+
+def sync_mailbox(imap, state: Optional[MailboxState], uidvalidity: int, exists: int,
+                 highestmodseq: int = 0, qresync: bool = False) -> Tuple[MailboxState, SyncResult]:
+    """
+    Bring `state` up to date for the currently selected mailbox.
+
+    `uidvalidity`, `exists` and `highestmodseq` come from the SELECT response.
+    - CONDSTORE: one UID FETCH (CHANGEDSINCE) returns only flag changes and new mail;
+      nothing at all is sent when HIGHESTMODSEQ hasn't moved.
+    - QRESYNC: the same FETCH also reports expunged UIDs via VANISHED.
+    - Neither: UID SEARCH for UIDs above the last known one plus UNSEEN.
+    Without QRESYNC, expunges are detected by comparing EXISTS with the known count.
+    """
+    if state is None or state.uidvalidity != uidvalidity:
+        return _full_sync(imap, uidvalidity, highestmodseq)
+    if highestmodseq and state.highestmodseq:
+        try:
+            return _condstore_sync(imap, state, exists, highestmodseq, qresync)
+        except Exception:
+            pass  # server rejected CHANGEDSINCE; the search path still works
+    return _search_sync(imap, state, exists, highestmodseq)
+
+
+def _full_sync(imap, uidvalidity: int, highestmodseq: int) -> Tuple[MailboxState, SyncResult]:
+    uids = uid_search(imap, None, 'ALL')
+    unseen = uid_search(imap, None, 'UNSEEN')
+    state = MailboxState(uidvalidity, highestmodseq, uids, unseen)
+    return state, SyncResult(sorted(state.uids), [], [], True)
+
+
+def _condstore_sync(imap, state: MailboxState, exists: int, highestmodseq: int,
+                    qresync: bool) -> Tuple[MailboxState, SyncResult]:
+    if highestmodseq == state.highestmodseq and exists == len(state.uids):
+        return state, SyncResult([], [], [], False)
+
+    modifier = f'(CHANGEDSINCE {state.highestmodseq}{" VANISHED" if qresync else ""})'
+    typ, data = imap.uid('FETCH', '1:*', '(UID FLAGS)', modifier)
+    if typ != 'OK':
+        raise RuntimeError(f"CHANGEDSINCE fetch failed: {typ}")
+    flags = parse_fetch_flags(data)
+
+    vanished: Set[int] = set()
+    if qresync:
+        _, lines = imap.response('VANISHED')
+        for line in lines or []:
+            if isinstance(line, bytes):
+                vanished.update(parse_sequence_set(line.replace(b'(EARLIER)', b'').strip()))
+
+    new = sorted(u for u in flags if u not in state.uids)
+    changed = [u for u, f in flags.items()
+               if u in state.uids and (u in state.unseen) == ('\\Seen' in f)]
+    for u, f in flags.items():
+        state.uids.add(u)
+        if '\\Seen' in f:
+            state.unseen.discard(u)
+        else:
+            state.unseen.add(u)
+
+    vanished &= state.uids
+    state.uids -= vanished
+    state.unseen -= vanished
+    if not qresync and exists != len(state.uids):
+        vanished |= _reconcile_expunged(imap, state)
+
+    state.highestmodseq = max(highestmodseq, max_modseq(data))
+    return state, SyncResult(new, changed, sorted(vanished), False)
+
+
+def _search_sync(imap, state: MailboxState, exists: int, highestmodseq: int) -> Tuple[MailboxState, SyncResult]:
+    last = max(state.uids, default=0)
+    # "UID n:*" always matches the newest message, even when it is older than n.
+    new = sorted(u for u in uid_search(imap, None, f'UID {last + 1}:*') if u > last)
+    unseen = set(uid_search(imap, None, 'UNSEEN'))
+
+    changed = [u for u in state.uids if (u in unseen) != (u in state.unseen)]
+    state.uids.update(new)
+    vanished: Set[int] = set()
+    if exists != len(state.uids):
+        vanished = _reconcile_expunged(imap, state)
+    state.unseen = unseen & state.uids
+    state.highestmodseq = highestmodseq
+    return state, SyncResult(new, [u for u in changed if u in state.uids], sorted(vanished), False)
+
+
+def _reconcile_expunged(imap, state: MailboxState) -> Set[int]:
+    current = set(uid_search(imap, None, 'ALL'))
+    gone = state.uids - current
+    state.uids = current
+    state.unseen &= state.uids
+    return gone
@@ -0,0 +1,134 @@
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+# Helpers for the bits of the IMAP wire format imaplib leaves to the caller.
+
+_FETCH_ITEM_RE = re.compile(rb'^(\d+) \(')
+_FETCH_UID_RE = re.compile(rb'\bUID (\d+)')
+_FETCH_FLAGS_RE = re.compile(rb'\bFLAGS \(([^)]*)\)')
+_FETCH_MODSEQ_RE = re.compile(rb'\bMODSEQ \((\d+)\)')
+_LITERAL_RE = re.compile(rb'\{(\d+)\}$')
+_UNTAGGED_RE = re.compile(rb'^\* (?:(\d+) )?([A-Z-]+)(?: (.*))?$', re.S)
+_TAGGED_RE = re.compile(rb'^(\S+) (OK|NO|BAD)\b', re.S)
+
+def sequence_set(nums) -> str:
+    """Collapse message numbers into an IMAP sequence set, e.g. [1,2,3,5,9,10] -> '1:3,5,9:10'."""
+    ns = sorted({int(n) for n in nums})
+    ranges = []
+    for n in ns:
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+def parse_sequence_set(text) -> List[int]:
+    """Inverse of sequence_set: '1:3,5' -> [1, 2, 3, 5]. '*' is not supported."""
+    if isinstance(text, bytes):
+        text = text.decode()
+    out: List[int] = []
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            a, b = (int(x) for x in part.split(":", 1))
+            out.extend(range(min(a, b), max(a, b) + 1))
+        else:
+            out.append(int(part))
+    return out
+
+def parse_fetch_response(data) -> Dict[int, bytes]:
+    """
+    Split an interleaved multi-message FETCH response into {uid: literal}.
+    imaplib returns (b'12 (UID 40 RFC822.HEADER {342}', b'<literal>') tuples separated
+    by b')' items. Servers may also send the UID after the literal (b' UID 40)'), and
+    plain FETCH has no UID at all, in which case the message number is the key.
+    """
+    out: Dict[int, bytes] = {}
+    pending = None  # (message number, literal) still waiting for a trailing UID
+    for item in data or []:
+        if isinstance(item, tuple) and len(item) >= 2:
+            if pending:
+                out[pending[0]] = pending[1]
+                pending = None
+            m = _FETCH_UID_RE.search(item[0])
+            if m:
+                out[int(m.group(1))] = item[1]
+                continue
+            m = _FETCH_ITEM_RE.match(item[0])
+            if m:
+                pending = (int(m.group(1)), item[1])
+        elif pending and isinstance(item, bytes):
+            m = _FETCH_UID_RE.search(item)
+            out[int(m.group(1)) if m else pending[0]] = pending[1]
+            pending = None
+    if pending:
+        out[pending[0]] = pending[1]
+    return out
+
+def parse_fetch_flags(data) -> Dict[int, FrozenSet[str]]:
+    """{uid: flags} from literal-free FETCH lines such as b'5 (UID 40 FLAGS (\\Seen) MODSEQ (12))'."""
+    out: Dict[int, FrozenSet[str]] = {}
+    for item in data or []:
+        line = item[0] if isinstance(item, tuple) else item
+        if not isinstance(line, bytes):
+            continue
+        u = _FETCH_UID_RE.search(line)
+        f = _FETCH_FLAGS_RE.search(line)
+        if u and f:
+            out[int(u.group(1))] = frozenset(f.group(1).decode(errors='ignore').split())
+    return out
+
+def max_modseq(data) -> int:
+    """Highest MODSEQ mentioned in a FETCH response (0 if none)."""
+    best = 0
+    for item in data or []:
+        line = item[0] if isinstance(item, tuple) else item
+        if isinstance(line, bytes):
+            for m in _FETCH_MODSEQ_RE.finditer(line):
+                best = max(best, int(m.group(1)))
+    return best
+
+def uid_search(imap, *criteria) -> List[int]:
+    """UID SEARCH returning ints in server order ([] on a non-OK reply)."""
+    typ, data = imap.uid('SEARCH', *criteria)
+    if typ != 'OK' or not data or not data[0]:
+        return []
+    return [int(u) for u in data[0].split()]
+
+# ---------- raw responses (for code that reads the socket itself) ----------
+# A response is a list of items in imaplib's shape: plain lines are bytes, a line that
+# announced a {n} literal is a (line, literal) tuple.
+
+def literal_size(line: bytes) -> Optional[int]:
+    """n if `line` (without CRLF) ends in a {n} literal marker, else None."""
+    m = _LITERAL_RE.search(line)
+    return int(m.group(1)) if m else None
+
+def split_untagged(items: List) -> Optional[Tuple[str, List]]:
+    """
+    ('FETCH', data) for an untagged response, with data as imaplib would return it
+    (leading "* " and the type stripped, "12 FETCH (..." -> "12 (..."); None if malformed.
+    """
+    first = items[0][0] if isinstance(items[0], tuple) else items[0]
+    m = _UNTAGGED_RE.match(first)
+    if not m:
+        return None
+    num, rest = m.group(1), m.group(3) or b''
+    dat = (num + b' ' + rest) if num else rest
+    head = (dat, items[0][1]) if isinstance(items[0], tuple) else dat
+    return m.group(2).decode().upper(), [head] + items[1:]
+
+def split_tagged(line: bytes) -> Optional[Tuple[bytes, str]]:
+    """(tag, 'OK'|'NO'|'BAD') of a tagged completion line, or None."""
+    m = _TAGGED_RE.match(line)
+    return (m.group(1), m.group(2).decode()) if m else None
+
+def response_uid(items: List) -> Optional[int]:
+    """The UID mentioned in an untagged FETCH response, if any."""
+    for it in items:
+        m = _FETCH_UID_RE.search(it[0] if isinstance(it, tuple) else it)
+        if m:
+            return int(m.group(1))
+    return None
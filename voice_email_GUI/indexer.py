@@ -0,0 +1,70 @@
+import threading
+
+from email_client import EmailClient
+from prefetch import IDLE_GAP_SECONDS
+
+# Re-check for mail the index hasn't seen at least this often, even without notify().
+REINDEX_SECONDS = 300
+
+
+class SearchIndexer(threading.Thread):
+    """
+    Keeps EmailClient's local search index caught up with `mailbox` in the background.
+
+    - Each round syncs the mailbox and indexes headers INDEX_BATCH messages at a time,
+      newest first, until every message is in (search() is local from then on); then
+      the bodies of the `bodies` newest messages, one at a time, and last the
+      vocabulary for fuzzy search, so a spoken search never waits for it.
+    - Runs at start, on notify() (call it when new mail arrives) and every
+      `interval` seconds.
+    - Like BodyPrefetcher it only works after interactive IMAP work has been quiet for
+      `idle_gap` seconds, so voice commands never queue behind it.
+    """
+
+    def __init__(self, mail: EmailClient, mailbox: str = "INBOX", bodies: int = 200,
+                 interval: float = REINDEX_SECONDS, idle_gap: float = IDLE_GAP_SECONDS):
+        super().__init__(daemon=True, name="search-indexer")
+        self.mail = mail
+        self.mailbox = mailbox
+        self.bodies = bodies
+        self.interval = interval
+        self.idle_gap = idle_gap
+        self._cond = threading.Condition()
+        self._pending = True  # first round right away
+        self._stopped = False
+
+    def notify(self):
+        with self._cond:
+            self._pending = True
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._stopped:
+                    self._cond.wait(self.interval)
+                if self._stopped:
+                    return
+                self._pending = False
+            try:
+                self._catch_up()
+            except Exception:
+                pass  # offline or a dropped link: the next round retries
+
+    def _catch_up(self):
+        headers_left = True
+        while not self._stopped:
+            if self.mail.is_busy(within=self.idle_gap):
+                with self._cond:
+                    self._cond.wait(self.idle_gap / 3)
+                continue
+            if headers_left:
+                headers_left = self.mail.index_pending(self.mailbox) > 0
+            elif not self.bodies or not self.mail.index_body_pending(self.mailbox, self.bodies):
+                self.mail.search_index.terms()
+                return
@@ -0,0 +1,129 @@
+from typing import Callable, Optional
+
+from PyQt6 import QtCore, QtGui
+
+from message_summary import MessageSummary, SummaryList
+
+Qt = QtCore.Qt
+
+# SummaryList.sort_by key per column; "#" and Date both follow arrival order.
+_SORT_KEYS = ('uid', 'sender', 'subject', 'uid')
+
+
+class MessageTableModel(QtCore.QAbstractTableModel):
+    """
+    Table model straight over a SummaryList: cells are looked up when the view paints
+    them, so showing thousands of messages costs no per-row objects.
+
+    `can_fetch_more()` / `fetch_more()` hook the view's incremental loading (it calls
+    fetchMore when scrolled to the end); fetch_more should load asynchronously and
+    hand the page to append().
+    """
+
+    HEADERS = ("#", "From", "Subject", "Date")
+
+    def __init__(self, parent=None, can_fetch_more: Optional[Callable[[], bool]] = None,
+                 fetch_more: Optional[Callable[[], None]] = None):
+        super().__init__(parent)
+        self._list = SummaryList()
+        self._can_fetch_more = can_fetch_more
+        self._fetch_more = fetch_more
+        self._bold = QtGui.QFont()
+        self._bold.setBold(True)
+
+    @property
+    def summaries(self) -> SummaryList:
+        return self._list
+
+    def set_list(self, lst: SummaryList):
+        self.beginResetModel()
+        self._list = lst
+        self.endResetModel()
+
+    def append(self, items: SummaryList):
+        if not items:
+            return
+        start = len(self._list)
+        self.beginInsertRows(QtCore.QModelIndex(), start, start + len(items) - 1)
+        self._list.extend(items)
+        self.endInsertRows()
+
+    def summary(self, row: int) -> Optional[MessageSummary]:
+        return self._list.at(row + 1)
+
+    # ---------- QAbstractTableModel ----------
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._list)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        r, c = index.row(), index.column()
+        lst = self._list
+        if role == Qt.ItemDataRole.DisplayRole:
+            if c == 0:
+                return str(r + 1)
+            if c == 1:
+                return lst.senders[r]
+            if c == 2:
+                return lst.subjects[r] or "(no subject)"
+            return lst.dates[r] or ""
+        if role == Qt.ItemDataRole.FontRole and lst.unread[r]:
+            return self._bold
+        if role == Qt.ItemDataRole.ToolTipRole and c == 2 and lst.snippets[r].strip():
+            return lst.snippets[r]  # search results: the body words that matched
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def sort(self, column: int, order=Qt.SortOrder.AscendingOrder):
+        """Reorder the list itself; numbers follow the new order, so "read number 1" is the top row."""
+        if not 0 <= column < len(_SORT_KEYS) or not self._list:
+            return
+        # "#" ascending is the listing's own order, newest first; Date ascending is oldest first
+        reverse = (order == Qt.SortOrder.DescendingOrder) != (column == 0)
+        self.layoutAboutToBeChanged.emit()
+        old_rows = self._list.sort_by(_SORT_KEYS[column], reverse=reverse)
+        new_row = {old: new for new, old in enumerate(old_rows)}
+        for idx in self.persistentIndexList():
+            r = new_row.get(idx.row())
+            self.changePersistentIndex(idx, self.index(r, idx.column()) if r is not None else QtCore.QModelIndex())
+        self.layoutChanged.emit()
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and self._can_fetch_more is not None and self._can_fetch_more()
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if self._fetch_more is not None and not parent.isValid():
+            self._fetch_more()
+
+
+class MessageFilterProxy(QtCore.QSortFilterProxyModel):
+    """
+    Case-insensitive substring filter over From and Subject. Sorting is passed on to
+    MessageTableModel.sort, which reorders the columns in one go instead of comparing
+    rows one Python call at a time.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._needle = ""
+
+    def set_filter_text(self, text: str):
+        self._needle = (text or "").strip().lower()
+        self.invalidateFilter()
+
+    def sort(self, column: int, order=Qt.SortOrder.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+    def filterAcceptsRow(self, source_row: int, source_parent) -> bool:
+        if not self._needle:
+            return True
+        lst = self.sourceModel().summaries
+        return self._needle in lst.senders[source_row].lower() or self._needle in lst.subjects[source_row].lower()
@@ -0,0 +1,133 @@
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+
+class MessageSummary(NamedTuple):
+    """One row of a listing. `index` is the 1-based number the user says ("read number 2")."""
+    index: int
+    uid: object                    # MessageId
+    sender: str
+    subject: str
+    date: str
+    unread: Optional[bool] = None  # None when the client doesn't know
+    snippet: str = ""              # search results: body words around the match
+
+
+_COLUMNS = ('uids', 'senders', 'subjects', 'dates', 'unread', 'snippets')
+
+
+class SummaryList:
+    """
+    A listing stored column by column: no per-message object until one is asked for.
+
+    Numbers are positions (first entry is index 1). popleft() hands out the first
+    remaining entry but keeps it addressable by number, so "read next" doesn't
+    renumber what the user already heard. uid_at() and at() are O(1).
+    """
+
+    __slots__ = _COLUMNS + ('_start',)
+
+    def __init__(self, items: Iterable[MessageSummary] = ()):
+        self.uids: List = []
+        self.senders: List[str] = []
+        self.subjects: List[str] = []
+        self.dates: List[str] = []
+        self.unread: List[Optional[bool]] = []
+        self.snippets: List[str] = []
+        self._start = 0
+        for it in items:
+            self.append(it.uid, it.sender, it.subject, it.date, it.unread, it.snippet)
+
+    def append(self, uid, sender: str, subject: str, date: str, unread: Optional[bool] = None,
+               snippet: str = ""):
+        self.uids.append(uid)
+        self.senders.append(sender)
+        self.subjects.append(subject)
+        self.dates.append(date)
+        self.unread.append(unread)
+        self.snippets.append(snippet)
+
+    def extend(self, other: "SummaryList"):
+        """Append the remaining entries of `other`, numbered on from ours."""
+        for name in _COLUMNS:
+            getattr(self, name).extend(getattr(other, name)[other._start:])
+
+    def _row(self, pos: int) -> MessageSummary:
+        return MessageSummary(pos + 1, self.uids[pos], self.senders[pos], self.subjects[pos],
+                              self.dates[pos], self.unread[pos], self.snippets[pos])
+
+    def __len__(self) -> int:
+        return len(self.uids) - self._start
+
+    def __iter__(self) -> Iterator[MessageSummary]:
+        return (self._row(p) for p in range(self._start, len(self.uids)))
+
+    def __getitem__(self, i: Union[int, slice]):
+        """Remaining entries by position, like a list; a slice is a new (renumbered) SummaryList."""
+        if isinstance(i, slice):
+            out = SummaryList()
+            sl = slice(self._start, None)
+            for name in _COLUMNS:
+                setattr(out, name, getattr(self, name)[sl][i])
+            return out
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("SummaryList index out of range")
+        return self._row(self._start + i)
+
+    def __repr__(self):
+        return f"SummaryList({list(self)!r})"
+
+    def uid_at(self, index: int):
+        """UID of message number `index`, or None."""
+        return self.uids[index - 1] if 1 <= index <= len(self.uids) else None
+
+    def at(self, index: int) -> Optional[MessageSummary]:
+        """Message number `index`, or None."""
+        return self._row(index - 1) if 1 <= index <= len(self.uids) else None
+
+    def popleft(self) -> MessageSummary:
+        if not len(self):
+            raise IndexError("popleft from an empty SummaryList")
+        self._start += 1
+        return self._row(self._start - 1)
+
+    def sort_by(self, column: str, reverse: bool = False) -> List[int]:
+        """
+        Reorder in place by 'uid' (arrival), 'sender' or 'subject', renumbering; returns
+        the old position of each new one. Entries already popped are dropped.
+        """
+        n = len(self.uids)
+        if column == 'uid':
+            keys = [u.uid for u in self.uids]
+        else:
+            keys = [(v or "").lower() for v in getattr(self, column + 's')]
+        order = sorted(range(self._start, n), key=keys.__getitem__, reverse=reverse)
+        for name in _COLUMNS:
+            col = getattr(self, name)
+            setattr(self, name, [col[p] for p in order])
+        self._start = 0
+        return order
+
+    def merged(self, new: Iterable[MessageSummary] = (), vanished: Iterable = (), seen: Iterable = (),
+               unseen: Iterable = (), prepend: bool = True) -> "SummaryList":
+        """
+        A renumbered copy with `vanished` UIDs removed, unread flags updated and, if
+        `prepend`, the `new` entries not already listed put in front.
+        """
+        gone, seen, unseen = set(vanished), set(seen), set(unseen)
+        flags: Dict[object, bool] = {u: False for u in seen}
+        flags.update((u, True) for u in unseen)
+        keep = [p for p in range(self._start, len(self.uids)) if self.uids[p] not in gone]
+        out = SummaryList()
+        if prepend:
+            known = {self.uids[p] for p in keep}
+            for it in new:
+                if it.uid not in known and it.uid not in gone:
+                    out.append(it.uid, it.sender, it.subject, it.date, flags.get(it.uid, it.unread), it.snippet)
+        for p in keep:
+            uid = self.uids[p]
+            out.append(uid, self.senders[p], self.subjects[p], self.dates[p], flags.get(uid, self.unread[p]),
+                       self.snippets[p])
+        return out
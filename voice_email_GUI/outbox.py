@@ -0,0 +1,304 @@
+import random, smtplib, sqlite3, threading, time
+from email.utils import make_msgid
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from email_client import EmailClient, SendJob
+from smtp_session import Delivery
+
+# Retry schedule for a send that failed for a reason that may go away (offline, server
+# busy, 4xx): RETRY_BASE seconds, doubling up to RETRY_MAX, each with some jitter so a
+# queue of messages doesn't retry in lockstep. After MAX_ATTEMPTS tries it is dead.
+RETRY_BASE_SECONDS = 15.0
+RETRY_MAX_SECONDS = 3600.0
+MAX_ATTEMPTS = 10
+# Due messages handed to one pipelined SMTP batch (EmailClient.send_bulk).
+SEND_BATCH = 20
+
+# Permanent-looking codes that are really about the login, not the message; fixing the
+# password and retrying must still be possible, so these back off like a 4xx.
+_AUTH_CODES = (530, 534, 535)
+
+_COLUMNS = "id, to_addr, subject, body, message_id, created, attempts, next_try, last_error, state"
+
+
+class OutboxItem(NamedTuple):
+    id: int
+    to: str
+    subject: str
+    body: str
+    message_id: str
+    created: float
+    attempts: int
+    next_try: float
+    last_error: str
+    state: str  # "queued" or "dead"
+
+
+def _permanent(exc: BaseException) -> bool:
+    """True if retrying can't help: the server answered 5xx about this message or its recipient."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        return bool(codes) and all(500 <= code < 600 for code in codes)
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 500 <= exc.smtp_code < 600 and exc.smtp_code not in _AUTH_CODES
+    return False
+
+
+def _refusals_permanent(refused: List[Delivery]) -> bool:
+    return bool(refused) and all(500 <= d.code < 600 and d.code not in _AUTH_CODES for d in refused)
+
+
+def _refusals_text(refused: List[Delivery], named: bool = True) -> str:
+    return "; ".join((f"{d.recipient}: " if named else "") + f"{d.code} {d.reply}".strip() for d in refused)
+
+
+def _error_text(exc: BaseException) -> str:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        for code, msg in exc.recipients.values():
+            return f"{code} {msg.decode('utf-8', 'replace') if isinstance(msg, bytes) else msg}"
+    if isinstance(exc, smtplib.SMTPResponseException):
+        err = exc.smtp_error
+        return f"{exc.smtp_code} {err.decode('utf-8', 'replace') if isinstance(err, bytes) else err}"
+    return str(exc) or type(exc).__name__
+
+
+def retry_delay(attempts: int, base: float = RETRY_BASE_SECONDS, cap: float = RETRY_MAX_SECONDS) -> float:
+    """Seconds to wait after the `attempts`-th failed try (exponential, with jitter)."""
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.75, 1.0)
+
+
+class Outbox:
+    """
+    Durable spool of outgoing mail (SQLite), so a composed message survives a failed
+    send, a lost connection or the app closing.
+
+    - add() returns once the message is on disk (WAL with synchronous=FULL fsyncs the
+      commit), which is all the user waits for; OutboxSender delivers it afterwards.
+    - A message stays "queued" until it is sent, then it is deleted. One that can't be
+      delivered (a permanent refusal, or MAX_ATTEMPTS failures) becomes "dead" and stays
+      until retry() requeues it (which also ends any backoff).
+    - Each message gets its Message-ID when it is spooled, so if the app dies between
+      the server accepting it and the row being deleted, the resend is the same message.
+    """
+
+    def __init__(self, path: str = ".outbox.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=FULL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY, to_addr TEXT NOT NULL, subject TEXT NOT NULL, body TEXT NOT NULL,"
+                " message_id TEXT NOT NULL, created REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_try REAL NOT NULL, last_error TEXT NOT NULL DEFAULT '',"
+                " state TEXT NOT NULL DEFAULT 'queued')"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_try)")
+
+    def add(self, to_email: str, subject: str, body: str) -> OutboxItem:
+        """Spool a message for sending now; returns once it is safely on disk."""
+        now = time.time()
+        msgid = make_msgid()
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT INTO outbox (to_addr, subject, body, message_id, created, next_try) VALUES (?, ?, ?, ?, ?, ?)",
+                (to_email, subject, body, msgid, now, now))
+        return OutboxItem(cur.lastrowid, to_email, subject, body, msgid, now, 0, now, "", "queued")
+
+    def get(self, item_id: int) -> Optional[OutboxItem]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM outbox WHERE id=?", (item_id,)).fetchone()
+        return OutboxItem(*row) if row else None
+
+    def due(self, limit: int = SEND_BATCH, now: Optional[float] = None) -> List[OutboxItem]:
+        """Up to `limit` queued messages due by `now`, the longest waiting first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM outbox WHERE state='queued' AND next_try<=?"
+                " ORDER BY next_try, id LIMIT ?", (now, limit)).fetchall()
+        return [OutboxItem(*r) for r in rows]
+
+    def next_try(self) -> Optional[float]:
+        """When the next queued message is due (None if nothing is queued)."""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_try) FROM outbox WHERE state='queued'").fetchone()
+        return row[0]
+
+    def sent(self, item_id: int):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM outbox WHERE id=?", (item_id,))
+
+    def failed(self, item_id: int, error: str, retry_at: Optional[float] = None) -> Optional[OutboxItem]:
+        """Record a failed try: queue it again at `retry_at`, or dead-letter it if that's None."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE outbox SET attempts=attempts+1, last_error=?, next_try=?, state=? WHERE id=?",
+                (error, retry_at if retry_at is not None else time.time(),
+                 "queued" if retry_at is not None else "dead", item_id))
+        return self.get(item_id)
+
+    def retry(self) -> int:
+        """Requeue dead messages, and ones waiting out a backoff, for sending now; returns how many."""
+        now = time.time()
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "UPDATE outbox SET attempts=CASE WHEN state='dead' THEN 0 ELSE attempts END,"
+                " state='queued', next_try=? WHERE state='dead' OR next_try>?", (now, now))
+        return cur.rowcount
+
+    def items(self) -> List[OutboxItem]:
+        """Everything in the outbox, queued before dead, oldest first."""
+        with self._lock:
+            rows = self._db.execute(f"SELECT {_COLUMNS} FROM outbox ORDER BY state DESC, id").fetchall()
+        return [OutboxItem(*r) for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _spoken_duration(seconds: float) -> str:
+    seconds = max(int(seconds), 0)
+    if seconds < 60:
+        return "under a minute"
+    if seconds < 3600:
+        n = seconds // 60
+        return f"{n} minute{'s' if n > 1 else ''}"
+    n = seconds // 3600
+    return f"{n} hour{'s' if n > 1 else ''}"
+
+
+def outbox_summary(items: List[OutboxItem], now: Optional[float] = None) -> str:
+    """A spoken answer to "what's in my outbox"."""
+    if not items:
+        return "Your outbox is empty. Everything has been sent."
+    now = time.time() if now is None else now
+    queued = [it for it in items if it.state == "queued"]
+    dead = [it for it in items if it.state == "dead"]
+    parts = []
+    if queued:
+        parts.append(f"{len(queued)} message{'s' if len(queued) > 1 else ''} waiting to send.")
+        for it in queued[:5]:
+            line = f"To {it.to}, subject {it.subject or 'no subject'}"
+            if it.attempts:
+                line += f", tried {it.attempts} time{'s' if it.attempts > 1 else ''}, next try in {_spoken_duration(it.next_try - now)}"
+            parts.append(line + ".")
+    if dead:
+        parts.append(f"{len(dead)} message{'s' if len(dead) > 1 else ''} could not be sent.")
+        for it in dead[:5]:
+            parts.append(f"To {it.to}, subject {it.subject or 'no subject'}: {it.last_error or 'unknown error'}.")
+        parts.append("Say retry outbox to try them again.")
+    return " ".join(parts)
+
+
+class OutboxSender(threading.Thread):
+    """
+    Delivers the Outbox in the background, oldest due message first. Everything due
+    goes out as one `mail.send_bulk` batch (up to `batch` messages), so a backlog built
+    up while offline takes one SMTP session and a couple of round trips per message.
+
+    - enqueue() spools a message and wakes the sender; the caller can tell the user it
+      is on its way without waiting for SMTP.
+    - A message counts as sent once any recipient accepted it; the others' refusals are
+      in the "sent" item's last_error. A message nobody accepted is retried after
+      retry_delay(), or dead-lettered on a permanent refusal (5xx) or after
+      `max_attempts` tries. Messages left over from the last run are sent at start.
+    - `on_event(kind, item)` is called from this thread with kind "sent", "retry" or
+      "dead" after each try.
+    """
+
+    def __init__(self, mail: EmailClient, outbox: Outbox,
+                 on_event: Optional[Callable[[str, OutboxItem], None]] = None,
+                 max_attempts: int = MAX_ATTEMPTS, retry_base: float = RETRY_BASE_SECONDS,
+                 retry_max: float = RETRY_MAX_SECONDS, batch: int = SEND_BATCH):
+        super().__init__(daemon=True, name="outbox-sender")
+        self.mail = mail
+        self.outbox = outbox
+        self.on_event = on_event
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.batch = batch
+        self._cond = threading.Condition()
+        self._woken = False
+        self._stopped = False
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> OutboxItem:
+        item = self.outbox.add(to_email, subject, body)
+        self.wake()
+        return item
+
+    def retry_now(self) -> int:
+        n = self.outbox.retry()
+        if n:
+            self.wake()
+        return n
+
+    def wake(self):
+        with self._cond:
+            self._woken = True
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                self._woken = False
+            try:
+                items = self.outbox.due(self.batch)
+            except sqlite3.Error:
+                return  # the outbox was closed under us
+            if items:
+                self._deliver(items)
+                continue
+            due = self.outbox.next_try()
+            with self._cond:
+                if not self._woken and not self._stopped:
+                    self._cond.wait(None if due is None else max(due - time.time(), 0.05))
+
+    def _deliver(self, items: List[OutboxItem]):
+        try:
+            deliveries = self.mail.send_bulk(SendJob(it.to, it.subject, it.body, it.message_id) for it in items)
+        except Exception as e:
+            for it in items:
+                self._failed(it, _error_text(e), _permanent(e))
+            return
+        by_job: Dict[int, List[Delivery]] = {}
+        for d in deliveries:
+            by_job.setdefault(d.job, []).append(d)
+        for n, it in enumerate(items):
+            results = by_job.get(n, [])
+            refused = [d for d in results if not d.ok]
+            if len(refused) < len(results):
+                self.outbox.sent(it.id)
+                self._emit("sent", it._replace(last_error=_refusals_text(refused)))
+            else:
+                self._failed(it, _refusals_text(refused, named=len(results) > 1) or "no recipients",
+                             not results or _refusals_permanent(refused))
+
+    def _failed(self, item: OutboxItem, error: str, permanent: bool):
+        tries = item.attempts + 1
+        if permanent or tries >= self.max_attempts:
+            retry_at = None
+        else:
+            retry_at = time.time() + retry_delay(tries, self.retry_base, self.retry_max)
+        item = self.outbox.failed(item.id, error, retry_at) or item
+        self._emit("retry" if retry_at is not None else "dead", item)
+
+    def _emit(self, kind: str, item: OutboxItem):
+        if self.on_event is not None:
+            try:
+                self.on_event(kind, item)
+            except Exception:
+                pass
@@ -0,0 +1,110 @@
+from typing import List, Optional, Tuple
+
+from email_client import EmailClient
+from message_summary import SummaryList
+
+# Messages per page for "next page" / scroll-to-load.
+PAGE_SIZE = 10
+
+# A `before` meaning "start again from the newest message" (list_page's None).
+_FROM_NEWEST = 0
+
+
+class Pager:
+    """
+    "Next page" / "previous page" over a listing, starting from a first page the caller
+    already has (a list_unread or search result).
+
+    - Later pages continue below the oldest UID shown so far (EmailClient.list_page),
+      with the same Primary filter. A first page made only of unread mail continues
+      through unread mail; once that runs out, all mail follows, newest first,
+      without the unread messages already shown.
+    - Search results are ranked, not newest first, so a search pager asks search()
+      for the next `page_size` results instead (fuzzy ones for a spoken search).
+    - Pages already fetched are kept, so going back and forth costs no round trips.
+    - Page numbers restart at 1 on every page, matching "read number N".
+    """
+
+    def __init__(self, mail: EmailClient, first: SummaryList, query: Optional[str] = None,
+                 primary_only: bool = True, page_size: int = PAGE_SIZE, mailbox: str = "INBOX",
+                 fuzzy: bool = False):
+        self.mail = mail
+        self.query = query
+        self.fuzzy = fuzzy
+        self.primary_only = primary_only
+        self.page_size = page_size
+        self.mailbox = mailbox
+        self.unseen_only = bool(first) and query is None and all(first.unread)
+        self._shown = set(first.uids) if self.unseen_only else set()  # unread mail already paged through
+        self._pages: List[SummaryList] = [first]
+        # `before` (a search: the result offset) for the page after each cached one; None: that page was the last
+        if query is not None:
+            nxt = len(first) if len(first) >= page_size else None
+        else:
+            nxt = min(u.uid for u in first.uids) if first else None
+        self._next: List[Optional[int]] = [nxt]
+        self.page = 0
+
+    @property
+    def current(self) -> SummaryList:
+        return self._pages[self.page]
+
+    @property
+    def has_next(self) -> bool:
+        return self.page + 1 < len(self._pages) or self._next[self.page] is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.page > 0
+
+    def next_page(self) -> Optional[SummaryList]:
+        """The following page (fetched on first visit), or None at the end."""
+        if self.page + 1 == len(self._pages):
+            before = self._next[self.page]
+            items = SummaryList()
+            if self.query is not None:
+                if before is not None:
+                    items = self.mail.search(self.query, self.page_size, offset=before, fuzzy=self.fuzzy)
+                    before = before + len(items) if len(items) >= self.page_size else None
+            else:
+                items, before = self._list_next(before)
+            if not items:
+                self._next[self.page] = None
+                return None
+            self._pages.append(items)
+            self._next.append(before)
+        self.page += 1
+        return self.current
+
+    def _list_next(self, before: Optional[int]) -> Tuple[SummaryList, Optional[int]]:
+        items = SummaryList()
+        while len(items) < self.page_size:
+            if before is None:
+                if not self.unseen_only:
+                    break
+                # the unread mail has run out: go on through all of it, from the newest
+                self.unseen_only = False
+                before = _FROM_NEWEST
+            # a short or empty page with a `before` means a long filtered-out run; keep going
+            page, before = self.mail.list_page(None if before == _FROM_NEWEST else before,
+                                               self.page_size - len(items), self.primary_only,
+                                               self.unseen_only, None, self.mailbox)
+            if self.unseen_only:
+                self._shown.update(page.uids)
+            elif self._shown:
+                page = self._without_shown(page)
+            items.extend(page)
+        return items, before
+
+    def _without_shown(self, page: SummaryList) -> SummaryList:
+        out = SummaryList()
+        for s in page:
+            if s.uid not in self._shown:
+                out.append(s.uid, s.sender, s.subject, s.date, s.unread, s.snippet)
+        return out
+
+    def previous_page(self) -> Optional[SummaryList]:
+        if not self.page:
+            return None
+        self.page -= 1
+        return self.current
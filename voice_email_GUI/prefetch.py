@@ -0,0 +1,63 @@
+import threading
+from itertools import islice
+from typing import Iterable, List
+
+from email_client import EmailClient
+from message_summary import MessageSummary
+
+# Quiet time required after interactive IMAP work before the next prefetch starts.
+IDLE_GAP_SECONDS = 0.3
+
+
+class BodyPrefetcher(threading.Thread):
+    """
+    Warms EmailClient's body cache for the top of whatever list the user is looking at.
+
+    - schedule(items) replaces the queue with the first `depth` items, in list order
+      (item 1 is read next, then "read next" walks down); call it whenever the list or
+      the reading position changes.
+    - Work already queued for an older list is dropped; a fetch already on the wire
+      finishes, but only ever into the cache.
+    - One message at a time, and only after interactive IMAP work has been quiet for
+      `idle_gap` seconds, so user commands never wait behind a prefetch.
+    """
+
+    def __init__(self, mail: EmailClient, depth: int = 3, idle_gap: float = IDLE_GAP_SECONDS):
+        super().__init__(daemon=True, name="body-prefetch")
+        self.mail = mail
+        self.depth = depth
+        self.idle_gap = idle_gap
+        self._queue: List = []
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def schedule(self, items: Iterable[MessageSummary]):
+        with self._cond:
+            self._queue = [it.uid for it in islice(items, self.depth)]
+            self._cond.notify()
+
+    def cancel(self):
+        self.schedule([])
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._queue = []
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                # throttle: wait (re-checking the queue) until the client has been quiet a while
+                if self.mail.is_busy(within=self.idle_gap):
+                    self._cond.wait(self.idle_gap / 3)
+                    continue
+                ident = self._queue.pop(0)
+            try:
+                self.mail.prefetch_message(ident)
+            except Exception:
+                pass  # a prefetch failing is harmless; the real read will retry
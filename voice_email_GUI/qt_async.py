@@ -0,0 +1,62 @@
+import asyncio, threading
+from concurrent.futures import Future
+from typing import Callable, Coroutine, Optional
+
+try:
+    import qasync  # optional: runs asyncio on top of the Qt event loop
+except ImportError:
+    qasync = None
+
+
+def install_qt_loop(app) -> Optional[asyncio.AbstractEventLoop]:
+    """
+    Make Qt's event loop the asyncio loop (qasync), so coroutines run on the GUI thread
+    between Qt events. Returns the loop, or None when qasync isn't installed; the caller
+    then runs it with `loop.run_forever()` instead of `app.exec()`.
+    """
+    if qasync is None:
+        return None
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+class AsyncBridge:
+    """
+    Runs coroutines for Qt code.
+
+    - With a qasync loop (see install_qt_loop) coroutines run on the GUI thread and
+      completion callbacks fire there too.
+    - Without one, a private asyncio loop runs in a daemon thread; callbacks then fire
+      on that thread, so callers should deliver results through Qt signals (which are
+      queued across threads automatically).
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._thread = None
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, daemon=True, name="asyncio-bridge")
+            self._thread.start()
+        self.loop = loop
+
+    def submit(self, coro: Coroutine, on_done: Callable[[Future], None] = None) -> Future:
+        """Schedule `coro` on the bridge loop from any thread; `on_done(future)` runs when it finishes."""
+        fut = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if on_done is not None:
+            fut.add_done_callback(on_done)
+        return fut
+
+    def close(self, cleanup: Optional[Coroutine] = None, timeout: float = 5):
+        """Run `cleanup` (e.g. client.close()) and stop the private loop, if there is one."""
+        if cleanup is not None:
+            try:
+                if self._thread is None:
+                    asyncio.ensure_future(cleanup, loop=self.loop)
+                else:
+                    self.submit(cleanup).result(timeout)
+            except Exception:
+                pass
+        if self._thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
@@ -0,0 +1,230 @@
+import re, sqlite3, threading, time
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from fuzzy_terms import TermDictionary
+
+# Decoded body text kept per message; enough for every word a search would find in a
+# normal email, without a newsletter's HTML dump bloating the index.
+INDEX_BODY_CHARS = 20000
+
+# Oldest the fuzzy-search vocabulary may get while new mail keeps arriving.
+TERMS_MAX_AGE = 60.0
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# bm25 column weights: a word in the subject or the sender says more than one in the body
+_RANK = "bm25(search_fts, 4.0, 2.0, 8.0, 1.0)"
+
+
+class SearchHit(NamedTuple):
+    uidvalidity: int
+    uid: int
+    sender: str
+    subject: str
+    date: str
+    snippet: str  # a few words of body around the match ("" when no body is indexed)
+
+
+class SearchIndex:
+    """
+    Local full-text index (SQLite FTS5) over sender, recipients, subject and decoded
+    body text, keyed by (mailbox, UIDVALIDITY, UID) like HeaderStore.
+
+    - Headers go in whenever the client parses them (listings, sync catch-up); bodies
+      when they are read, prefetched or fetched by the background indexer.
+    - search() ranks with bm25, matches word prefixes ("invo" finds "invoice") and
+      returns a snippet per hit, all without touching the network; search(fuzzy=True)
+      also finds words that sound alike or are misspelled, for spoken queries.
+    - A mailbox counts as complete() once every UID it held was indexed at least once;
+      until then callers should prefer a server search.
+
+    Raises sqlite3.OperationalError when the SQLite build has no FTS5.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # bumped on every change, so terms() knows when its vocabulary is out of date
+        self._generation = 0
+        self._terms: Optional[TermDictionary] = None
+        self._terms_gen = -1
+        self._terms_at = 0.0
+        self._terms_lock = threading.Lock()
+        with self._lock, self._db:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_docs ("
+                " id INTEGER PRIMARY KEY, mailbox TEXT NOT NULL, uidvalidity INTEGER NOT NULL,"
+                " uid INTEGER NOT NULL, sender TEXT NOT NULL, subject TEXT NOT NULL, date TEXT NOT NULL,"
+                " body_len INTEGER NOT NULL DEFAULT 0, UNIQUE (mailbox, uidvalidity, uid))"
+            )
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+                " sender, recipients, subject, body,"
+                " tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_mailboxes ("
+                " mailbox TEXT PRIMARY KEY, uidvalidity INTEGER NOT NULL, complete INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_vocab USING fts5vocab(search_fts, 'row')")
+
+    # ---------- writing ----------
+    def add_headers(self, mailbox: str, uidvalidity: int,
+                    items: Iterable[Tuple[int, str, str, str, str]]):
+        """Index (uid, sender, recipients, subject, date) rows; UIDs already indexed are skipped."""
+        with self._lock, self._db:
+            self._generation += 1
+            self._note_epoch(mailbox, uidvalidity)
+            for uid, sender, recipients, subject, date in items:
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO search_docs (mailbox, uidvalidity, uid, sender, subject, date)"
+                    " VALUES (?, ?, ?, ?, ?, ?)", (mailbox, uidvalidity, uid, sender, subject, date))
+                if cur.rowcount:
+                    self._db.execute(
+                        "INSERT INTO search_fts (rowid, sender, recipients, subject, body) VALUES (?, ?, ?, ?, '')",
+                        (cur.lastrowid, sender, recipients, subject))
+
+    def add_body(self, mailbox: str, uidvalidity: int, uid: int, text: str):
+        """Index the body text of an already indexed message (kept if a longer one is stored)."""
+        text = (text or "")[:INDEX_BODY_CHARS]
+        if not text:
+            return
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT id, body_len FROM search_docs WHERE mailbox=? AND uidvalidity=? AND uid=?",
+                (mailbox, uidvalidity, uid)).fetchone()
+            if row is None or row[1] >= len(text):
+                return
+            self._generation += 1
+            self._db.execute("UPDATE search_fts SET body=? WHERE rowid=?", (text, row[0]))
+            self._db.execute("UPDATE search_docs SET body_len=? WHERE id=?", (len(text), row[0]))
+
+    def remove(self, mailbox: str, uidvalidity: int, uids: Iterable[int]):
+        uids = list(uids)
+        with self._lock, self._db:
+            self._generation += 1
+            for i in range(0, len(uids), 500):
+                chunk = uids[i:i + 500]
+                where = "mailbox=? AND uidvalidity=? AND uid IN (%s)" % ",".join("?" * len(chunk))
+                args = (mailbox, uidvalidity, *chunk)
+                self._db.execute("DELETE FROM search_fts WHERE rowid IN (SELECT id FROM search_docs WHERE %s)"
+                                 % where, args)
+                self._db.execute("DELETE FROM search_docs WHERE " + where, args)
+
+    def forget_other_epochs(self, mailbox: str, uidvalidity: int):
+        """Drop everything indexed for `mailbox` under a different UIDVALIDITY."""
+        with self._lock, self._db:
+            self._note_epoch(mailbox, uidvalidity)
+
+    def _note_epoch(self, mailbox: str, uidvalidity: int):
+        row = self._db.execute("SELECT uidvalidity FROM search_mailboxes WHERE mailbox=?", (mailbox,)).fetchone()
+        if row is not None and row[0] == uidvalidity:
+            return
+        self._generation += 1
+        self._db.execute("DELETE FROM search_fts WHERE rowid IN"
+                         " (SELECT id FROM search_docs WHERE mailbox=? AND uidvalidity<>?)", (mailbox, uidvalidity))
+        self._db.execute("DELETE FROM search_docs WHERE mailbox=? AND uidvalidity<>?", (mailbox, uidvalidity))
+        self._db.execute("INSERT OR REPLACE INTO search_mailboxes (mailbox, uidvalidity, complete) VALUES (?, ?, 0)",
+                         (mailbox, uidvalidity))
+
+    def mark_complete(self, mailbox: str, uidvalidity: int):
+        with self._lock, self._db:
+            self._db.execute("UPDATE search_mailboxes SET complete=1 WHERE mailbox=? AND uidvalidity=?",
+                             (mailbox, uidvalidity))
+
+    # ---------- reading ----------
+    def complete(self, mailbox: str) -> Optional[int]:
+        """UIDVALIDITY of `mailbox` if it has been fully indexed, else None."""
+        with self._lock:
+            row = self._db.execute("SELECT uidvalidity, complete FROM search_mailboxes WHERE mailbox=?",
+                                   (mailbox,)).fetchone()
+        return row[0] if row and row[1] else None
+
+    def indexed_uids(self, mailbox: str, uidvalidity: int, with_body: bool = False) -> Set[int]:
+        q = "SELECT uid FROM search_docs WHERE mailbox=? AND uidvalidity=?"
+        if with_body:
+            q += " AND body_len>0"
+        with self._lock:
+            return {r[0] for r in self._db.execute(q, (mailbox, uidvalidity))}
+
+    def search(self, query: str, mailbox: str = "INBOX", limit: int = 10, offset: int = 0,
+               fuzzy: bool = False) -> List[SearchHit]:
+        """
+        Best matches for the words of `query`, each also matching as a prefix. Messages
+        with all the words come first; if none has them all, any word will do (speech
+        recognition likes to add a stray "the" or "about").
+
+        With `fuzzy`, messages whose words only sound like or are spelled close to the
+        query's (see TermDictionary) follow the exact matches.
+        """
+        words = _WORD_RE.findall(query.lower())
+        if not words:
+            return []
+        # the exact word scores on top of its prefix match, so "4" ranks "number 4" above "number 41"
+        groups = [['"%s"' % w, '"%s"*' % w] for w in words]
+        if fuzzy:
+            terms = self.terms()
+            alts = [['"%s"' % t for t, _ in terms.candidates(w) if t != w] for w in words]
+        else:
+            alts = []
+        tiers = [" AND ".join("(%s)" % " OR ".join(g) for g in groups)]
+        if any(alts):
+            groups = [g + a for g, a in zip(groups, alts)]
+            tiers.append(" AND ".join("(%s)" % " OR ".join(g) for g in groups))
+        hits = self._tiers(tiers, mailbox, limit, offset)
+        if not hits and len(words) > 1 and (not offset or not self._tiers(tiers, mailbox, 1, 0)):
+            hits = self._match(" OR ".join("(%s)" % " OR ".join(g) for g in groups), mailbox, limit, offset)
+        return hits
+
+    def _tiers(self, exprs: List[str], mailbox: str, limit: int, offset: int) -> List[SearchHit]:
+        """Hits of each expression in turn, leaving out ones an earlier expression found."""
+        if len(exprs) == 1:
+            return self._match(exprs[0], mailbox, limit, offset)
+        want = offset + limit
+        hits: List[SearchHit] = []
+        seen = set()
+        for expr in exprs:
+            for h in self._match(expr, mailbox, want + len(hits), 0):
+                if (h.uidvalidity, h.uid) not in seen:
+                    seen.add((h.uidvalidity, h.uid))
+                    hits.append(h)
+            if len(hits) >= want:
+                break
+        return hits[offset:want]
+
+    def terms(self) -> TermDictionary:
+        """
+        The indexed vocabulary for fuzzy search. Rebuilt after the index changed, at most
+        every TERMS_MAX_AGE seconds, since that takes a while on a big mailbox; call it from
+        background work (SearchIndexer does) so searches find it ready.
+        """
+        with self._terms_lock:
+            stale = self._terms_gen != self._generation and time.monotonic() - self._terms_at > TERMS_MAX_AGE
+            if self._terms is None or stale:
+                gen = self._generation
+                with self._lock:
+                    vocab = self._db.execute("SELECT term, doc FROM search_vocab").fetchall()
+                self._terms = TermDictionary(vocab)
+                self._terms_gen, self._terms_at = gen, time.monotonic()
+            return self._terms
+
+    def _match(self, expr: str, mailbox: str, limit: int, offset: int) -> List[SearchHit]:
+        q = ("SELECT d.uidvalidity, d.uid, d.sender, d.subject, d.date,"
+             " snippet(search_fts, 3, '', '', '…', 12)"
+             " FROM search_fts JOIN search_docs d ON d.id = search_fts.rowid"
+             " JOIN search_mailboxes m ON m.mailbox = d.mailbox AND m.uidvalidity = d.uidvalidity"
+             " WHERE search_fts MATCH ? AND d.mailbox=?"
+             f" ORDER BY {_RANK}, d.uid DESC LIMIT ? OFFSET ?")
+        with self._lock:
+            try:
+                rows = self._db.execute(q, (expr, mailbox, limit, offset)).fetchall()
+            except sqlite3.OperationalError:
+                return []  # a query FTS5 can't parse finds nothing rather than failing the command
+        return [SearchHit(*r) for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,293 @@
+import copy, io, re, smtplib, threading, time
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+from email.utils import getaddresses
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# Keep the session open this long after the last send (seconds).
+SMTP_IDLE_SECONDS = 60.0
+# A session unused for longer than this is NOOP-checked before the next send.
+SMTP_CHECK_AFTER = 5.0
+
+_CRLF = b"\r\n"
+_LEADING_DOT = re.compile(br'(?m)^\.')
+
+
+class Delivery(NamedTuple):
+    """What the server said about one recipient of one message in a batch."""
+    job: int        # index of the message in the batch
+    recipient: str
+    code: int       # 250 once the server took the message for this recipient, else the refusal
+    reply: str
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.code < 300
+
+
+class _Envelope(NamedTuple):
+    sender: str
+    recipients: List[str]
+    data: bytes  # flattened with CRLF line ends, Bcc removed, not yet dot-stuffed
+
+
+def _envelope(msg: EmailMessage) -> _Envelope:
+    """Sender, recipients and wire form of `msg`, the way smtplib.send_message derives them."""
+    sender = getaddresses([msg["Sender"] or msg["From"] or ""])
+    rcpts = [addr for _, addr in getaddresses([str(v) for f in ("To", "Cc", "Bcc") for v in msg.get_all(f, [])])
+             if addr]
+    wire = copy.copy(msg)
+    del wire["Bcc"]
+    del wire["Resent-Bcc"]
+    with io.BytesIO() as buf:
+        BytesGenerator(buf).flatten(wire, linesep="\r\n")
+        data = buf.getvalue()
+    return _Envelope(sender[0][1] if sender else "", rcpts, data)
+
+
+def _text(reply: bytes) -> str:
+    return reply.decode("utf-8", "replace") if isinstance(reply, bytes) else str(reply)
+
+
+def _dropped(exc: BaseException) -> bool:
+    """
+    True if `exc` means the session is gone: a closed or broken connection, or a 421
+    "service closing" reply. Other SMTP errors (SMTPException is an OSError too) are
+    answers about the message itself.
+    """
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code == 421
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return bool(exc.recipients) and all(code == 421 for code, _ in exc.recipients.values())
+    return isinstance(exc, (smtplib.SMTPServerDisconnected, EOFError)) or (
+        isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException))
+
+
+class SmtpSession:
+    """
+    One authenticated SMTP connection kept warm between sends, so a reply right after
+    a send skips the TCP/TLS handshake and AUTH.
+
+    - `connect()` must return a logged-in smtplib.SMTP/SMTP_SSL.
+    - Sends are serialized on the connection (SMTP runs one transaction at a time).
+    - A session idle for more than `check_after` seconds is NOOP-checked first; after
+      a refused transaction it is RSET so the next one starts clean.
+    - A dropped connection or a 421 reply reconnects and retries the send once. Both
+      show up at MAIL FROM on a stale session, before the server has taken anything.
+    - The connection is closed (QUIT) after `idle_timeout` seconds without a send;
+      0 closes it after every send, like a plain SMTP_SSL block.
+    """
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP], idle_timeout: float = SMTP_IDLE_SECONDS,
+                 check_after: float = SMTP_CHECK_AFTER):
+        self._connect = connect
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        self.connects = 0  # handshakes done so far (for stats and benchmarks)
+
+    def send_message(self, msg: EmailMessage) -> Dict[str, Tuple[int, bytes]]:
+        """smtplib.SMTP.send_message on the warm connection; returns the refused recipients."""
+        with self._lock:
+            self._cancel_timer()
+            try:
+                for attempt in range(2):
+                    server = self._session()
+                    try:
+                        return server.send_message(msg)
+                    except (OSError, EOFError) as e:
+                        if not _dropped(e):
+                            self._reset()
+                            raise
+                        self._drop()
+                        if attempt:
+                            raise
+            finally:
+                self._last_used = time.monotonic()
+                self._schedule_close()
+
+    def send_batch(self, messages: Sequence[EmailMessage]) -> List[Delivery]:
+        """
+        Send several messages on the warm connection and report every recipient's result.
+
+        With ESMTP PIPELINING (RFC 2920) the MAIL FROM, RCPT TOs and DATA of a message
+        go out in one write, and each message's text goes out together with the next
+        message's commands, so a batch costs about two round trips per message instead
+        of three plus one per recipient. Without it the messages are sent one by one.
+
+        Refused recipients and messages don't stop the batch. If the connection drops
+        it is reopened once for the messages that hadn't been answered yet; those still
+        unanswered after that get code 421 (if none was answered at all, the error is raised).
+        """
+        envelopes = [_envelope(m) for m in messages]
+        results: Dict[int, List[Delivery]] = {}
+        with self._lock:
+            self._cancel_timer()
+            try:
+                for attempt in range(2):
+                    todo = [i for i in range(len(messages)) if i not in results]
+                    if not todo:
+                        break
+                    try:
+                        server = self._session()
+                        if server.has_extn("pipelining") and all(self._ascii(envelopes[i]) for i in todo):
+                            self._pipeline(server, envelopes, todo, results)
+                        else:
+                            self._one_by_one(server, messages, envelopes, todo, results)
+                    except (OSError, EOFError) as e:
+                        if attempt == 0 and not results and not _dropped(e):
+                            raise  # couldn't connect or log in: nothing was sent
+                        self._drop()
+                        if attempt:
+                            if not results:
+                                raise
+                            for i in todo:
+                                if i not in results:
+                                    results[i] = [Delivery(i, r, 421, str(e) or type(e).__name__)
+                                                  for r in envelopes[i].recipients]
+            finally:
+                self._last_used = time.monotonic()
+                self._schedule_close()
+        # each message's recipients in the order they were addressed
+        order = [{r: n for n, r in enumerate(env.recipients)} for env in envelopes]
+        return [d for i in sorted(results) for d in sorted(results[i], key=lambda d: order[d.job].get(d.recipient, 0))]
+
+    def close(self):
+        """QUIT the connection if one is open; the next send opens a new one."""
+        with self._lock:
+            self._cancel_timer()
+            self._drop(quit=True)
+
+    # ---------- internals ----------
+    def _session(self) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > self.check_after:
+            try:
+                ok = self._server.noop()[0] == 250
+            except (OSError, EOFError):
+                ok = False
+            if not ok:
+                self._drop()
+        if self._server is None:
+            self._server = self._connect()
+            self.connects += 1
+        return self._server
+
+    @staticmethod
+    def _ascii(env: _Envelope) -> bool:
+        return all(a.isascii() for a in (env.sender, *env.recipients))
+
+    def _pipeline(self, server: smtplib.SMTP, envelopes: List[_Envelope], todo: List[int],
+                  results: Dict[int, List[Delivery]]):
+        carry = b""   # written in front of the next command group: a message's text, or RSET
+        owed = []     # what the replies to `carry` are for: (job, accepted, refused), or None for RSET
+        for i in todo:
+            env = envelopes[i]
+            group = [b"MAIL FROM:<%s>" % env.sender.encode("ascii")]
+            group += [b"RCPT TO:<%s>" % r.encode("ascii") for r in env.recipients]
+            group.append(b"DATA")
+            server.send(carry + b"".join(c + _CRLF for c in group))
+            self._collect(server, owed, results)
+            mail = self._reply(server)
+            rcpt = [self._reply(server) for _ in env.recipients]
+            data = self._reply(server)
+            if mail[0] != 250:
+                rcpt = [mail] * len(env.recipients)  # the RCPTs only got "503 need MAIL" back
+            accepted = [r for r, (code, _) in zip(env.recipients, rcpt) if code in (250, 251)]
+            refused = [Delivery(i, r, code, _text(msg)) for r, (code, msg) in zip(env.recipients, rcpt)
+                       if code not in (250, 251)]
+            if data[0] == 354:
+                # nothing accepted: the server still wants a message, so send an empty one (RFC 2920)
+                body = _LEADING_DOT.sub(b"..", env.data) if accepted else b""
+                if body and not body.endswith(_CRLF):
+                    body += _CRLF
+                carry, owed = body + b"." + _CRLF, [(i, accepted, refused)]
+            else:
+                refused += [Delivery(i, r, data[0], _text(data[1])) for r in accepted]
+                results[i] = refused
+                carry, owed = (b"RSET" + _CRLF, [None]) if mail[0] == 250 else (b"", [])
+        if carry:
+            server.send(carry)
+            self._collect(server, owed, results)
+
+    def _collect(self, server: smtplib.SMTP, owed: list, results: Dict[int, List[Delivery]]):
+        for entry in owed:
+            code, msg = self._reply(server)
+            if entry is None:
+                continue
+            job, accepted, refused = entry
+            results[job] = [Delivery(job, r, code, _text(msg)) for r in accepted] + refused
+
+    @staticmethod
+    def _reply(server: smtplib.SMTP) -> Tuple[int, bytes]:
+        code, msg = server.getreply()
+        if code == 421:
+            raise smtplib.SMTPResponseException(code, msg)
+        return code, msg
+
+    def _one_by_one(self, server: smtplib.SMTP, messages: Sequence[EmailMessage], envelopes: List[_Envelope],
+                    todo: List[int], results: Dict[int, List[Delivery]]):
+        for i in todo:
+            rcpts = envelopes[i].recipients
+            try:
+                refused = server.send_message(messages[i])
+            except smtplib.SMTPRecipientsRefused as e:
+                if _dropped(e):
+                    raise
+                refused = e.recipients
+                self._reset()
+            except smtplib.SMTPResponseException as e:
+                if _dropped(e):
+                    raise
+                refused = {r: (e.smtp_code, e.smtp_error) for r in rcpts}
+                self._reset()
+            results[i] = [Delivery(i, r, refused[r][0], _text(refused[r][1])) if r in refused
+                          else Delivery(i, r, 250, "") for r in rcpts]
+            server = self._server
+            if server is None:
+                raise smtplib.SMTPServerDisconnected("connection lost after RSET")
+
+    def _reset(self):
+        """RSET after a refused transaction; a session that can't even do that is dropped."""
+        if self._server is None:
+            return
+        try:
+            if self._server.rset()[0] != 250:
+                self._drop()
+        except (OSError, EOFError):
+            self._drop()
+
+    def _drop(self, quit: bool = False):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            if quit:
+                server.quit()
+            else:
+                server.close()
+        except Exception:
+            pass
+
+    def _schedule_close(self):
+        if self._server is None:
+            return
+        if self.idle_timeout <= 0:
+            self._drop(quit=True)
+            return
+        self._timer = threading.Timer(self.idle_timeout, self._close_if_idle)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _close_if_idle(self):
+        with self._lock:
+            if self._server is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+                self._timer = None
+                self._drop(quit=True)
@@ -1,5 +1,5 @@
 import os, time
-from typing import Optional
+from typing import Iterable, Optional
 
 # --- Speech-to-Text (mic) ---
 try:
@@ -68,6 +68,21 @@ class VoiceIO:
         finally:
             self._last_spoke_at = time.time()
 
+    def speak_stream(self, sentences: Iterable[str], max_chars: Optional[int] = None) -> int:
+        """
+        Speak sentences as they arrive (e.g. from EmailClient.stream_message), so speech
+        starts before the rest has been downloaded. Stops once `max_chars` were spoken.
+        """
+        spoken = 0
+        for sentence in sentences:
+            if max_chars is not None:
+                if spoken >= max_chars:
+                    break
+                sentence = sentence[: max_chars - spoken]
+            self.speak(sentence)
+            spoken += len(sentence)
+        return spoken
+
     def stop(self):
         try:
             if self._engine is not None: